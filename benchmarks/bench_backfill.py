@@ -0,0 +1,152 @@
+"""
+End-to-end benchmark of the backfill and polling against the local upstream stand-in (src/mock_upstream.py),
+served in-process with configurable latency, rate limits and result caps. Reports backfill throughput,
+upstream call counts and poll latency as JSON. Run with:
+PYTHONPATH=src python benchmarks/bench_backfill.py --blocks 20000 --latency 0.05 --rate-limit 5
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import time
+from typing import Dict, Any
+
+import numpy as np
+from aiohttp.test_utils import TestServer
+
+from bench_suite import git_commit, latency_summary
+from mock_upstream import create_mock_upstream_app
+from transaction_fee_tracker import TransactionFeeTracker
+
+START_BLOCK = 12376729
+
+
+async def bench_backfill(args) -> Dict[str, Any]:
+    mock_config = {
+        "seed": args.seed,
+        "start_block": START_BLOCK,
+        "initial_blocks": args.blocks,
+        "block_time": args.block_time,
+        "transfers_per_block": args.transfers_per_block,
+        "latency": args.latency,
+        "jitter": args.jitter,
+        "error_rate": args.error_rate,
+        "max_results": args.max_results,
+    }
+    if args.server_rate_limit is not None:
+        mock_config["rate_limit"] = args.server_rate_limit
+        mock_config["burst"] = args.server_burst
+    web_app = create_mock_upstream_app(mock_config)
+    mock_upstream = web_app["mock_upstream"]
+    async with TestServer(web_app) as server:
+        etherscan_config = {"url": str(server.make_url("/api"))}
+        if args.rate_limit is not None:
+            etherscan_config.update(rate_limit=args.rate_limit, burst=args.burst)
+        tracker = TransactionFeeTracker(
+            "bench",
+            config={
+                "backfill": {
+                    "start_block": START_BLOCK,
+                    "chunk_size": args.chunk_size,
+                    "concurrency": args.concurrency,
+                    "max_results": args.max_results,
+                },
+                "streaming": {"enabled": args.streaming},
+                # Prices of the whole synthetic chain, in hourly candles to keep them to a few requests
+                "prices": {
+                    "interval": "1h",
+                    "start_time": (
+                        datetime.datetime.utcnow()
+                        - datetime.timedelta(
+                            seconds=(args.blocks + 1) * args.block_time + 3600
+                        )
+                    ).isoformat(),
+                },
+                "upstreams": {
+                    "etherscan": etherscan_config,
+                    "binance": {"url": str(server.make_url("/api/v3/klines"))},
+                },
+            },
+        )
+        await tracker.start()
+        try:
+            start_time = time.perf_counter()
+            await tracker.startup_polling()
+            backfill_seconds = time.perf_counter() - start_time
+            backfill_requests = dict(mock_upstream.requests)
+            poll_latencies = []
+            for _ in range(args.polls):
+                # Let the chain advance by a block before every poll
+                await asyncio.sleep(args.block_time)
+                start_time = time.perf_counter()
+                await tracker.poll_transactions()
+                poll_latencies.append(time.perf_counter() - start_time)
+        finally:
+            await tracker.close()
+    blocks = tracker._latest_block_seen - START_BLOCK + 1
+    backfill = {
+        "blocks": blocks,
+        "entries": len(tracker._fee_store),
+        "seconds": backfill_seconds,
+        "blocks_per_second": blocks / backfill_seconds,
+        "entries_per_second": len(tracker._fee_store) / backfill_seconds,
+        "upstream_requests": backfill_requests,
+    }
+    poll = {"polls": args.polls}
+    if poll_latencies:
+        poll.update(latency_summary(np.array(poll_latencies)))
+    return {"backfill": backfill, "poll": poll}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--blocks", type=int, default=20000)
+    parser.add_argument("--block-time", type=int, default=12)
+    parser.add_argument("--transfers-per-block", type=float, default=20)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--max-results", type=int, default=10000)
+    parser.add_argument("--streaming", action="store_true")
+    parser.add_argument(
+        "--rate-limit", type=float, help="client side Etherscan calls/sec"
+    )
+    parser.add_argument("--burst", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0, help="seconds per request")
+    parser.add_argument("--jitter", type=float, default=0)
+    parser.add_argument(
+        "--error-rate", type=float, default=0, help="share of rate limit errors"
+    )
+    parser.add_argument(
+        "--server-rate-limit", type=float, help="server side calls/sec before rejecting"
+    )
+    parser.add_argument("--server-burst", type=int, default=5)
+    parser.add_argument(
+        "--polls", type=int, default=0, help="polls after the backfill, one per block"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--output", help="file to write the results to (default stdout)"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    results = {
+        "meta": {
+            "time": datetime.datetime.utcnow().isoformat(),
+            "git_commit": git_commit(),
+            **{key: value for key, value in vars(args).items() if key != "output"},
+        },
+        **asyncio.run(bench_backfill(args)),
+    }
+    output = json.dumps(results, indent=2)
+    if args.output is None:
+        print(output)
+    else:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""
+Micro-benchmark of building the JSON responses of the HTTP endpoints with each JSON backend, against
+aiohttp's web.json_response. Run with: PYTHONPATH=src python benchmarks/bench_json_response.py
+"""
+
+import timeit
+
+from aiohttp import web
+
+from serialization import create_json_serializer, orjson
+
+NUMBER = 100000
+
+PAYLOADS = {
+    "transaction_fee": {"message": 12.345678901234},
+    "transaction_fees": {"message": [12.345678901234, None] * 50},
+}
+
+
+def main():
+    serializers = [create_json_serializer("json")]
+    if orjson is not None:
+        serializers.append(create_json_serializer("orjson"))
+    for name, payload in PAYLOADS.items():
+        baseline = timeit.timeit(lambda: web.json_response(payload), number=NUMBER)
+        print(f"{name} web.json_response: {baseline / NUMBER * 1e6:.2f}us/request")
+        for serializer in serializers:
+            elapsed = timeit.timeit(lambda: serializer.response(payload), number=NUMBER)
+            print(
+                f"{name} {serializer.name}: {elapsed / NUMBER * 1e6:.2f}us/request "
+                f"(saves {(baseline - elapsed) / NUMBER * 1e6:.2f}us)"
+            )
+
+
+if __name__ == "__main__":
+    main()
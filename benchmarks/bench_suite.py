@@ -0,0 +1,239 @@
+"""
+Benchmark suite of the hot paths on a synthetic dataset of Uniswap-style transfers:
+- ingest: _parse_historical_transactions throughput over tokentx sized pages
+- memory: bytes per fee store entry (store estimate and process RSS growth)
+- lookup: get_transaction_fee latency over a hit/miss mix
+- handler: transaction_fee_handler QPS and latency through aiohttp's test client
+Results are written as JSON so runs can be compared between releases. Run with:
+PYTHONPATH=src python benchmarks/bench_suite.py --entries 1000000 --output results.json
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from typing import Optional, List, Dict, Any
+
+import numpy as np
+from aiohttp.test_utils import TestClient, TestServer
+
+from app import create_app
+from synthetic import SyntheticChain, random_hashes
+from transaction_fee_tracker import TransactionFeeTracker
+
+
+def rss_bytes() -> Optional[int]:
+    """
+    :return: resident set size of the process, or None where /proc is not available
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return
+
+
+def latency_summary(latencies_s: np.ndarray) -> Dict[str, float]:
+    """
+    :param latencies_s: latencies in seconds
+    :return: mean and percentiles in microseconds
+    """
+    p50, p99, p999 = np.percentile(latencies_s, [50, 99, 99.9]) * 1e6
+    return {
+        "mean_us": float(latencies_s.mean() * 1e6),
+        "p50_us": float(p50),
+        "p99_us": float(p99),
+        "p999_us": float(p999),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return
+
+
+def bench_ingest(
+    tracker: TransactionFeeTracker, chain: SyntheticChain, args
+) -> Dict[str, Any]:
+    """
+    Ingest the synthetic dataset page by page, timing only _parse_historical_transactions.
+    A sample of the ingested hashes is kept for the lookup benchmarks
+    """
+    rng = random.Random(args.seed)
+    samples_per_page = max(1, args.lookups * args.page_size // args.entries)
+    hits = []
+    elapsed = 0.0
+    latest_block = 0
+    for page in chain.pages(args.entries, args.page_size):
+        start_time = time.perf_counter()
+        tracker._parse_historical_transactions(page)
+        elapsed += time.perf_counter() - start_time
+        hits.extend(
+            transfer.txn_hash
+            for transfer in rng.sample(page, min(len(page), samples_per_page))
+        )
+        latest_block = page[-1].block_number
+    tracker._latest_block_seen = latest_block
+    return {
+        "entries": args.entries,
+        "page_size": args.page_size,
+        "seconds": elapsed,
+        "rows_per_second": args.entries / elapsed,
+        "hits": hits,
+    }
+
+
+def bench_lookup(
+    tracker: TransactionFeeTracker, hashes: List[str], args
+) -> Dict[str, Any]:
+    """
+    Time every get_transaction_fee call of a hit/miss mix, after a warm up pass over the same hashes
+    """
+    get_transaction_fee = tracker.get_transaction_fee
+    for txn_hash in hashes[: min(len(hashes), 10000)]:
+        get_transaction_fee(txn_hash)
+    latencies = np.empty(len(hashes), dtype=np.float64)
+    perf_counter = time.perf_counter
+    start_time = perf_counter()
+    for i, txn_hash in enumerate(hashes):
+        call_start = perf_counter()
+        get_transaction_fee(txn_hash)
+        latencies[i] = perf_counter() - call_start
+    elapsed = perf_counter() - start_time
+    return {
+        "lookups": len(hashes),
+        "hit_ratio": args.hit_ratio,
+        "lookups_per_second": len(hashes) / elapsed,
+        **latency_summary(latencies),
+    }
+
+
+async def bench_handler(
+    tracker: TransactionFeeTracker, hashes: List[str], args
+) -> Dict[str, Any]:
+    """
+    Drive GET /transaction_fee through aiohttp's test client with a fixed number of concurrent clients
+    """
+    web_app = create_app()
+    web_app.on_startup.clear()
+    web_app.on_shutdown.clear()
+    web_app["transaction_fee_tracker"] = tracker
+    web_app["max_batch_size"] = 10000
+    latencies = []
+    errors = 0
+
+    async with TestClient(TestServer(web_app)) as client:
+
+        async def worker(worker_hashes: List[str]):
+            nonlocal errors
+            for txn_hash in worker_hashes:
+                start_time = time.perf_counter()
+                async with client.get(
+                    "/transaction_fee", params={"txn_hash": txn_hash}
+                ) as response:
+                    await response.read()
+                    if response.status >= 500:
+                        errors += 1
+                latencies.append(time.perf_counter() - start_time)
+
+        requests = hashes[: args.requests]
+        start_time = time.perf_counter()
+        await asyncio.gather(
+            *(worker(requests[i :: args.concurrency]) for i in range(args.concurrency))
+        )
+        elapsed = time.perf_counter() - start_time
+    return {
+        "requests": len(requests),
+        "concurrency": args.concurrency,
+        "errors": errors,
+        "requests_per_second": len(requests) / elapsed,
+        **latency_summary(np.array(latencies)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, default=1000000)
+    parser.add_argument("--page-size", type=int, default=10000)
+    parser.add_argument("--lookups", type=int, default=200000)
+    parser.add_argument("--hit-ratio", type=float, default=0.9)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--store", choices=("memory", "sqlite"), default="memory")
+    parser.add_argument("--sqlite-path", default="bench_fees.sqlite")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--output", help="file to write the results to (default stdout)"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    store_config = {"backend": args.store}
+    if args.store == "sqlite":
+        if os.path.exists(args.sqlite_path):
+            os.remove(args.sqlite_path)
+        store_config["path"] = args.sqlite_path
+    rss_before = rss_bytes()
+    tracker = TransactionFeeTracker("bench", config={"store": store_config})
+    chain = SyntheticChain(seed=args.seed)
+    # Cover every synthetic timestamp with a candle so that every hit is priced
+    tracker._price_table.extend([(10**13, 2000.0)])
+
+    ingest = bench_ingest(tracker, chain, args)
+    hits = ingest.pop("hits")
+    rss_after = rss_bytes()
+    memory = {
+        "entries": len(tracker._fee_store),
+        "store_bytes_per_entry": tracker._fee_store.bytes_per_entry(),
+        "rss_bytes_per_entry": (
+            None
+            if rss_before is None
+            else (rss_after - rss_before) / max(1, len(tracker._fee_store))
+        ),
+    }
+
+    rng = random.Random(args.seed)
+    num_hits = int(args.lookups * args.hit_ratio)
+    hashes = [rng.choice(hits) for _ in range(num_hits)] + random_hashes(
+        args.lookups - num_hits, args.seed
+    )
+    rng.shuffle(hashes)
+    lookup = bench_lookup(tracker, hashes, args)
+    handler = asyncio.run(bench_handler(tracker, hashes, args))
+    tracker._fee_store.close()
+
+    results = {
+        "meta": {
+            "time": datetime.datetime.utcnow().isoformat(),
+            "git_commit": git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "store": args.store,
+            "seed": args.seed,
+        },
+        "ingest": ingest,
+        "memory": memory,
+        "lookup": lookup,
+        "handler": handler,
+    }
+    output = json.dumps(results, indent=2)
+    if args.output is None:
+        print(output)
+    else:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+"""
+HTTP load generator for a running server: drives GET /transaction_fee or POST /transaction_fees at a target rate
+(open loop, --rps) or with a fixed number of clients (closed loop, --concurrency), over a hit/miss mix of hashes.
+Hits are sampled from the server's own store through /transaction_fees/export, misses are random hashes.
+Reports latency percentiles, throughput and error rates as JSON. Run with:
+PYTHONPATH=src python benchmarks/loadgen.py --url http://127.0.0.1:5000 --rps 2000 --duration 30
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import random
+import time
+from typing import Optional, List, Dict, Tuple, Any
+
+import aiohttp
+import numpy as np
+
+from bench_suite import git_commit, latency_summary
+from synthetic import random_hashes
+
+
+async def sample_store_hashes(
+    session: aiohttp.ClientSession,
+    url: str,
+    sample_size: int,
+    from_block: int,
+    rng: random.Random,
+) -> List[str]:
+    """
+    Reservoir sample of the hashes in the server's store, read from the streamed export
+    :param session: HTTP session
+    :param url: base url of the server
+    :param sample_size: number of hashes to sample
+    :param from_block: first block of the export
+    :param rng: random generator
+    :return: list of at most sample_size hashes
+    """
+    sample = []
+    num_seen = 0
+    async with session.get(
+        f"{url}/transaction_fees/export", params={"from_block": str(from_block)}
+    ) as response:
+        response.raise_for_status()
+        async for line in response.content:
+            if not line.strip():
+                continue
+            txn_hash = json.loads(line)["txn_hash"]
+            if num_seen < sample_size:
+                sample.append(txn_hash)
+            else:
+                i = rng.randrange(num_seen + 1)
+                if i < sample_size:
+                    sample[i] = txn_hash
+            num_seen += 1
+    return sample
+
+
+class LoadGenerator:
+    """
+    Sends the requests and records one latency and outcome per request. In open loop mode, latencies are measured
+    from the time each request was scheduled, so a slow server is not hidden by requests queueing up behind it
+    """
+
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        url: str,
+        hits: List[str],
+        hit_ratio: float,
+        batch_size: Optional[int],
+        seed: int,
+    ):
+        self._session = session
+        self._url = url
+        self._hits = hits
+        self._hit_ratio = hit_ratio if hits else 0.0
+        self._batch_size = batch_size
+        self._rng = random.Random(seed)
+        self._misses = random_hashes(10000, seed)
+        self.latencies: List[float] = []
+        self.statuses: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.unexpected_misses = 0
+
+    def _next_hash(self) -> Tuple[str, bool]:
+        if self._rng.random() < self._hit_ratio:
+            return self._rng.choice(self._hits), True
+        return self._rng.choice(self._misses), False
+
+    def _count(self, status: str):
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    async def request(self, start_time: Optional[float] = None, record: bool = True):
+        """
+        Send one request (one hash, or one batch of batch_size hashes)
+        :param start_time: perf_counter time the request was scheduled at, defaults to now
+        :param record: whether to record the outcome (False during the warm up)
+        :return: None
+        """
+        if start_time is None:
+            start_time = time.perf_counter()
+        try:
+            if self._batch_size is None:
+                txn_hash, expected = self._next_hash()
+                async with self._session.get(
+                    f"{self._url}/transaction_fee", params={"txn_hash": txn_hash}
+                ) as response:
+                    await response.read()
+                    status = response.status
+                # Unknown hashes are answered with 400
+                found = [status == 200]
+                expected = [expected]
+                failed = status not in (200, 400)
+            else:
+                txn_hashes, expected = zip(
+                    *(self._next_hash() for _ in range(self._batch_size))
+                )
+                async with self._session.post(
+                    f"{self._url}/transaction_fees", json=list(txn_hashes)
+                ) as response:
+                    body = await response.read()
+                    status = response.status
+                failed = status != 200
+                found = (
+                    []
+                    if failed
+                    else [
+                        txn_fee is not None for txn_fee in json.loads(body)["message"]
+                    ]
+                )
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if record:
+                self._count(type(e).__name__)
+            return
+        if not record:
+            return
+        self.latencies.append(time.perf_counter() - start_time)
+        self._count(str(status))
+        if failed:
+            return
+        for is_found, is_expected in zip(found, expected):
+            if is_found:
+                self.hits += 1
+            else:
+                self.misses += 1
+                self.unexpected_misses += is_expected
+
+    async def run_closed_loop(self, concurrency: int, deadline: float, warmup: float):
+        warmup_deadline = time.perf_counter() + warmup
+
+        async def worker():
+            while time.perf_counter() < deadline:
+                await self.request(record=time.perf_counter() >= warmup_deadline)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    async def run_open_loop(self, rps: float, deadline: float, warmup: float):
+        start_time = time.perf_counter()
+        warmup_deadline = start_time + warmup
+        tasks = set()
+        i = 0
+        while True:
+            scheduled_time = start_time + i / rps
+            if scheduled_time >= deadline:
+                break
+            delay = scheduled_time - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            task = asyncio.ensure_future(
+                self.request(scheduled_time, scheduled_time >= warmup_deadline)
+            )
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            i += 1
+        if tasks:
+            await asyncio.gather(*tasks)
+
+
+async def run(args) -> Dict[str, Any]:
+    url = args.url.rstrip("/")
+    rng = random.Random(args.seed)
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    connector = aiohttp.TCPConnector(limit=args.max_connections)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        if args.hashes_file is not None:
+            with open(args.hashes_file) as f:
+                hits = [line.strip() for line in f if line.strip()]
+        elif args.hit_ratio > 0:
+            hits = await sample_store_hashes(
+                session, url, args.sample_size, args.from_block, rng
+            )
+        else:
+            hits = []
+        if args.hit_ratio > 0 and not hits:
+            logging.warning("No hashes found in the store, every request is a miss")
+        batch_size = args.batch_size if args.endpoint == "transaction_fees" else None
+        load_generator = LoadGenerator(
+            session, url, hits, args.hit_ratio, batch_size, args.seed
+        )
+        start_time = time.perf_counter()
+        deadline = start_time + args.warmup + args.duration
+        if args.rps is not None:
+            await load_generator.run_open_loop(args.rps, deadline, args.warmup)
+        else:
+            await load_generator.run_closed_loop(
+                args.concurrency, deadline, args.warmup
+            )
+        elapsed = time.perf_counter() - start_time - args.warmup
+
+    num_requests = sum(load_generator.statuses.values())
+    num_errors = sum(
+        count
+        for status, count in load_generator.statuses.items()
+        if status != "200" and not (status == "400" and batch_size is None)
+    )
+    num_lookups = load_generator.hits + load_generator.misses
+    results = {
+        "requests": num_requests,
+        "seconds": elapsed,
+        "requests_per_second": num_requests / elapsed,
+        "lookups_per_second": num_lookups / elapsed,
+        "statuses": load_generator.statuses,
+        "errors": num_errors,
+        "error_rate": num_errors / max(1, num_requests),
+        "sampled_hits": len(hits),
+        "hit_ratio": load_generator.hits / max(1, num_lookups),
+        "unexpected_misses": load_generator.unexpected_misses,
+    }
+    if load_generator.latencies:
+        latencies = np.array(load_generator.latencies)
+        results.update(latency_summary(latencies))
+        results["max_us"] = float(latencies.max() * 1e6)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument(
+        "--endpoint",
+        choices=("transaction_fee", "transaction_fees"),
+        default="transaction_fee",
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=100, help="hashes per /transaction_fees"
+    )
+    parser.add_argument(
+        "--rps",
+        type=float,
+        help="target requests/sec (open loop, overrides --concurrency)",
+    )
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument(
+        "--warmup", type=float, default=2, help="seconds before recording"
+    )
+    parser.add_argument("--hit-ratio", type=float, default=0.9)
+    parser.add_argument("--sample-size", type=int, default=100000)
+    parser.add_argument(
+        "--from-block", type=int, default=0, help="first block to sample hits from"
+    )
+    parser.add_argument(
+        "--hashes-file", help="file of hits, one hash per line, instead of the export"
+    )
+    parser.add_argument("--max-connections", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=10, help="seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--output", help="file to write the results to (default stdout)"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    results = {
+        "meta": {
+            "time": datetime.datetime.utcnow().isoformat(),
+            "git_commit": git_commit(),
+            **{key: value for key, value in vars(args).items() if key != "output"},
+        },
+        "load": asyncio.run(run(args)),
+    }
+    output = json.dumps(results, indent=2)
+    if args.output is None:
+        print(output)
+    else:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,13 @@
 import asyncio
 import logging
 import os
+import time
 
 import yaml
 from aiohttp import web
 
+from metrics import MetricsRegistry, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from serialization import create_json_serializer
 from transaction_fee_tracker import TransactionFeeTracker
 
 
@@ -14,20 +17,134 @@ async def transaction_fee_handler(req: web.Request):
     :param req: Request object from aiohttp specifying user request
     :return: A web response specifying the results of the request
     """
+    json_serializer = req.app["json_serializer"]
     txn_hash = req.query.get("txn_hash", None)
     if txn_hash is None:
-        return web.json_response({"error": "Missing parameter txn_hash"}, status=400)
+        return json_serializer.response(
+            {"error": "Missing parameter txn_hash"}, status=400
+        )
 
     transaction_fee_tracker = req.app["transaction_fee_tracker"]
-    txn_fee = transaction_fee_tracker.get_transaction_fee(txn_hash)
+    txn_fee = await transaction_fee_tracker.lookup_transaction_fee(txn_hash)
     if txn_fee is None:
-        return web.json_response(
+        return json_serializer.response(
             {
                 "error": f"txn_hash={txn_hash} not found. This is not a valid transaction."
             },
             status=400,
         )
-    return web.json_response({"message": txn_fee}, status=200)
+    return json_serializer.response({"message": txn_fee}, status=200)
+
+
+async def transaction_fees_handler(req: web.Request):
+    """
+    Handle batch transaction fee endpoint (POST request). Body must be a JSON array of transaction hashes.
+    :param req: Request object from aiohttp specifying user request
+    :return: A web response with a list of transaction fees parallel to the request, null for hashes not found
+    """
+    json_serializer = req.app["json_serializer"]
+    try:
+        txn_hashes = await req.json(loads=json_serializer.loads)
+    except ValueError:
+        return json_serializer.response(
+            {"error": "Body must be valid JSON"}, status=400
+        )
+    if not isinstance(txn_hashes, list) or not all(
+        isinstance(txn_hash, str) for txn_hash in txn_hashes
+    ):
+        return json_serializer.response(
+            {"error": "Body must be a JSON array of txn_hash strings"}, status=400
+        )
+    max_batch_size = req.app["max_batch_size"]
+    if len(txn_hashes) > max_batch_size:
+        return json_serializer.response(
+            {"error": f"At most {max_batch_size} txn_hashes can be queried at once"},
+            status=400,
+        )
+
+    transaction_fee_tracker = req.app["transaction_fee_tracker"]
+    txn_fees = transaction_fee_tracker.get_transaction_fees(txn_hashes)
+    return json_serializer.response({"message": txn_fees}, status=200)
+
+
+async def transaction_fees_export_handler(req: web.Request):
+    """
+    Handle transaction fee export endpoint (GET request). Streams every stored fee in an inclusive block range
+    (from_block, to_block) and/or timestamp range (from_timestamp, to_timestamp) as NDJSON.
+    At least one of the query params must be provided.
+    :param req: Request object from aiohttp specifying user request
+    :return: A streamed web response with one JSON object per line
+    """
+    json_serializer = req.app["json_serializer"]
+    bounds = {}
+    for param in ("from_block", "to_block", "from_timestamp", "to_timestamp"):
+        value = req.query.get(param, None)
+        if value is None:
+            continue
+        try:
+            bounds[param] = int(value)
+        except ValueError:
+            return json_serializer.response(
+                {"error": f"Parameter {param} must be an integer"}, status=400
+            )
+    if not bounds:
+        return json_serializer.response(
+            {
+                "error": "Missing parameters, provide from_block/to_block and/or from_timestamp/to_timestamp"
+            },
+            status=400,
+        )
+
+    transaction_fee_tracker = req.app["transaction_fee_tracker"]
+    response = web.StreamResponse(
+        status=200, headers={"Content-Type": "application/x-ndjson"}
+    )
+    await response.prepare(req)
+    for transaction_fees in transaction_fee_tracker.iter_transaction_fees(**bounds):
+        await response.write(json_serializer.dumps_lines(transaction_fees))
+    await response.write_eof()
+    return response
+
+
+async def metrics_handler(req: web.Request):
+    """
+    Handle metrics endpoint (GET request), exposing every metric in the Prometheus text format
+    :param req: Request object from aiohttp specifying user request
+    :return: A web response with the metrics
+    """
+    return web.Response(
+        body=req.app["metrics"].render().encode(),
+        headers={"Content-Type": METRICS_CONTENT_TYPE},
+    )
+
+
+def create_metrics_middleware(metrics: MetricsRegistry):
+    """
+    Build the middleware recording the latency of every request by route. The histogram series of each route
+    is resolved once and cached, so a request only pays for two clock reads and a bucket search
+    :param metrics: registry to register the latency histogram in
+    :return: aiohttp middleware
+    """
+    request_seconds = metrics.histogram(
+        "txfee_http_request_seconds", "Latency of HTTP requests by route", ("route",)
+    )
+    route_series = {}
+
+    @web.middleware
+    async def metrics_middleware(req: web.Request, handler):
+        start_time = time.perf_counter()
+        try:
+            return await handler(req)
+        finally:
+            resource = req.match_info.route.resource
+            series = route_series.get(resource)
+            if series is None:
+                series = route_series[resource] = request_seconds.labels(
+                    "unmatched" if resource is None else resource.canonical
+                )
+            series.observe(time.perf_counter() - start_time)
+
+    return metrics_middleware
 
 
 async def startup(app: web.Application) -> None:
@@ -42,25 +159,82 @@ async def startup(app: web.Application) -> None:
     with open(config_file, "r") as f:
         config = yaml.load(f, Loader=yaml.Loader)
 
-    transaction_fee_tracker = TransactionFeeTracker(config.get("api_key"))
-    if config.get("do_backfill", False):
-        await transaction_fee_tracker.startup_polling()
+    transaction_fee_tracker = TransactionFeeTracker(
+        config.get("api_key"), config=config, metrics=app["metrics"]
+    )
+    await transaction_fee_tracker.start()
     app["transaction_fee_tracker"] = transaction_fee_tracker
-    tasks = []
-    for coro in transaction_fee_tracker.coros():
-        tasks.append(asyncio.create_task(coro))
-    app["background_tasks"] = tasks
+    http_config = config.get("http") or {}
+    app["max_batch_size"] = int(http_config.get("max_batch_size", 10000))
+    app["json_serializer"] = create_json_serializer(
+        http_config.get("json_backend", "auto")
+    )
+    # The server listens as soon as the fee store is loaded, answering queries from it while the backfill runs
+    app["background_tasks"] = [
+        asyncio.create_task(
+            run_tracker(app, transaction_fee_tracker, config.get("do_backfill", False))
+        )
+    ]
+
+
+async def run_tracker(
+    app: web.Application,
+    transaction_fee_tracker: TransactionFeeTracker,
+    do_backfill: bool,
+) -> None:
+    """
+    Background task running the backfill, if enabled, and then the periodic tasks of the tracker.
+    Polling only starts once the backfill is done, since both advance the latest block seen
+    :param app: app object from aiohttp
+    :param transaction_fee_tracker: tracker to run
+    :param do_backfill: whether to backfill first
+    :return: None
+    """
+    if do_backfill:
+        try:
+            await transaction_fee_tracker.startup_polling()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Polling still catches up from the latest block seen and fetches the missing prices
+            app["logger"].error(f"Backfill failed due to {e}")
+    await asyncio.gather(*transaction_fee_tracker.coros())
 
 
 async def on_shutdown(app) -> None:
     """
-    Shutdown coroutine to kill background tasks
+    Shutdown coroutine to kill background tasks and close upstream sessions
     :param app: app object from aiohttp
     :return:
     """
     app["logger"].info("Shutting down")
     for task in app["background_tasks"]:
         task.cancel()
+    await app["transaction_fee_tracker"].close()
+
+
+def create_app() -> web.Application:
+    """
+    Build the aiohttp application with all routes and startup/shutdown hooks
+    :return: app object from aiohttp
+    """
+    metrics = MetricsRegistry()
+    web_app = web.Application(middlewares=[create_metrics_middleware(metrics)])
+    web_app["logger"] = logging.getLogger("HTTP-SERVER")
+    web_app["metrics"] = metrics
+    web_app["json_serializer"] = create_json_serializer()
+    web_app.add_routes(
+        [
+            web.get("/transaction_fee", transaction_fee_handler),
+            web.post("/transaction_fees", transaction_fees_handler),
+            web.get("/transaction_fees/export", transaction_fees_export_handler),
+            web.get("/metrics", metrics_handler),
+        ]
+    )
+
+    web_app.on_startup.append(startup)
+    web_app.on_shutdown.append(on_shutdown)
+    return web_app
 
 
 def main():
@@ -68,13 +242,7 @@ def main():
         level=logging.INFO,
         format="%(asctime)s - %(levelname)s - [ %(name)s ] - %(message)s",
     )
-    web_app = web.Application()
-    web_app["logger"] = logging.getLogger("HTTP-SERVER")
-    web_app.add_routes([web.get("/transaction_fee", transaction_fee_handler)])
-
-    web_app.on_startup.append(startup)
-    web_app.on_shutdown.append(on_shutdown)
-    web.run_app(web_app, host="0.0.0.0", port=5000)
+    web.run_app(create_app(), host="0.0.0.0", port=5000)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,162 @@
+import asyncio
+import inspect
+import logging
+from typing import Optional, List, Any, Callable, Awaitable, Tuple, Union
+
+BlockRange = Tuple[int, int]
+
+
+def partition_block_range(
+    start_block: int, end_block: int, chunk_size: int
+) -> List[BlockRange]:
+    """
+    Split an inclusive block range into consecutive inclusive chunks of at most chunk_size blocks
+    :param start_block: first block of the range
+    :param end_block: last block of the range
+    :param chunk_size: maximum number of blocks per chunk
+    :return: list of (start_block, end_block) tuples
+    """
+    if chunk_size <= 0:
+        raise ValueError(f"chunk_size must be positive, got chunk_size={chunk_size}")
+    return [
+        (chunk_start, min(chunk_start + chunk_size - 1, end_block))
+        for chunk_start in range(start_block, end_block + 1, chunk_size)
+    ]
+
+
+class Backfiller:
+    """
+    Backfill engine which splits a block range into chunks and fetches them concurrently.
+    Results are handed to the ingest callback as soon as each chunk arrives, after which on_range_done is called
+    with the chunk's block range (and awaited if it returns an awaitable, e.g. to save a checkpoint off the loop). Chunks which hit the upstream result cap are split in half and re-queued.
+    Failed chunks are retried after an exponential backoff (retry_backoff, doubling on every attempt), so a rate
+    limit error does not use up every retry at once, and chunks which keep failing are given up on without stopping
+    the rest of the backfill.
+    If ingest is None, fetch is expected to ingest the transactions itself as they stream in and return
+    how many there were. If max_results is None, fetch is expected to paginate past the result cap itself.
+    Backfillers sharing a limiter (e.g. one per pool) have at most its value of chunks in flight between them.
+    Request pacing is left to the upstream rate limiters.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[int, int], Awaitable[Union[List[Any], int, None]]],
+        ingest: Optional[Callable[[List[Any]], None]],
+        on_range_done: Optional[
+            Callable[[BlockRange], Optional[Awaitable[None]]]
+        ] = None,
+        chunk_size: int = 5000,
+        concurrency: int = 4,
+        max_results: Optional[int] = 10000,
+        max_retries: int = 3,
+        retry_backoff: float = 1.0,
+        limiter: Optional[asyncio.Semaphore] = None,
+        logger: Optional[logging.Logger] = None,
+    ):
+        self._logger = logger or logging.getLogger(self.__class__.__name__)
+        self._fetch = fetch
+        self._ingest = ingest
+        self._on_range_done = on_range_done
+        self._chunk_size = chunk_size
+        self._concurrency = max(1, concurrency)
+        self._max_results = max_results
+        self._max_retries = max_retries
+        self._retry_backoff = retry_backoff
+        self._limiter = limiter
+
+    async def _fetch_chunk(
+        self, block_range: BlockRange
+    ) -> Tuple[int, Optional[List[Any]]]:
+        transactions = await self._fetch(*block_range)
+        if self._ingest is None and isinstance(transactions, int):
+            return transactions, None
+        if not isinstance(transactions, list):
+            raise Exception(
+                f"Unexpected response for block_range={block_range}: {transactions}"
+            )
+        return len(transactions), transactions
+
+    async def _worker(self, queue: asyncio.Queue, failed: List[BlockRange]):
+        while True:
+            block_range, attempt = await queue.get()
+            try:
+                if self._limiter is None:
+                    num_transactions, transactions = await self._fetch_chunk(
+                        block_range
+                    )
+                else:
+                    async with self._limiter:
+                        num_transactions, transactions = await self._fetch_chunk(
+                            block_range
+                        )
+                start_block, end_block = block_range
+                if (
+                    self._max_results is not None
+                    and num_transactions >= self._max_results
+                    and start_block < end_block
+                ):
+                    mid_block = (start_block + end_block) // 2
+                    self._logger.info(
+                        f"Result cap hit for block_range={block_range}, splitting at {mid_block}"
+                    )
+                    queue.put_nowait(((start_block, mid_block), 0))
+                    queue.put_nowait(((mid_block + 1, end_block), 0))
+                else:
+                    if transactions is not None:
+                        self._ingest(transactions)
+                    if self._on_range_done is not None:
+                        done = self._on_range_done(block_range)
+                        if inspect.isawaitable(done):
+                            await done
+            except Exception as e:
+                if attempt < self._max_retries:
+                    delay = self._retry_backoff * 2**attempt
+                    self._logger.warning(
+                        f"Retrying block_range={block_range} attempt={attempt + 1} in {delay}s due to {e}"
+                    )
+                    # Sleep outside of the limiter, so other chunks (and backfillers) keep fetching meanwhile
+                    await asyncio.sleep(delay)
+                    queue.put_nowait((block_range, attempt + 1))
+                else:
+                    self._logger.error(
+                        f"Giving up on block_range={block_range} due to {e}"
+                    )
+                    failed.append(block_range)
+            finally:
+                queue.task_done()
+
+    async def run(self, start_block: int, end_block: int) -> List[BlockRange]:
+        """
+        Backfill every block in the inclusive range [start_block, end_block]
+        :param start_block: first block to backfill
+        :param end_block: last block to backfill
+        :return: list of block ranges which could not be fetched
+        """
+        return await self.run_ranges([(start_block, end_block)])
+
+    async def run_ranges(self, block_ranges: List[BlockRange]) -> List[BlockRange]:
+        """
+        Backfill every block in a list of inclusive block ranges
+        :param block_ranges: list of (start_block, end_block) tuples
+        :return: list of block ranges which could not be fetched
+        """
+        queue = asyncio.Queue()
+        for start_block, end_block in block_ranges:
+            if start_block > end_block:
+                continue
+            for block_range in partition_block_range(
+                start_block, end_block, self._chunk_size
+            ):
+                queue.put_nowait((block_range, 0))
+        failed = []
+        workers = [
+            asyncio.create_task(self._worker(queue, failed))
+            for _ in range(self._concurrency)
+        ]
+        try:
+            await queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        return sorted(failed)
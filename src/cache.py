@@ -0,0 +1,147 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Optional, Any, Dict, Hashable, Callable, Awaitable, Tuple
+
+
+class LRUCache:
+    """
+    Bounded mapping which evicts the least recently used entry once max_size is reached
+    """
+
+    def __init__(self, max_size: int):
+        if max_size <= 0:
+            raise ValueError(f"max_size must be positive, got max_size={max_size}")
+        self._max_size = max_size
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        :param key: key to look up
+        :return: cached value (marking it as most recently used), or None if not cached
+        """
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        """
+        Cache a value, evicting the least recently used entry if the cache is full
+        :param key: key to cache
+        :param value: value to cache. Must not be None
+        :return: None
+        """
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class NegativeCache:
+    """
+    Bounded cache of keys known to be missing, so repeated lookups of unknown keys can be answered without
+    walking the full lookup path. Entries expire after ttl seconds, and entries recorded with a
+    valid_until_block stop being valid once the latest block seen moves past that block
+    (i.e. once the key could have appeared). The oldest entry is evicted once max_size is reached.
+    hits counts lookups answered by the cache and misses counts keys recorded as missing
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        if max_size <= 0:
+            raise ValueError(f"max_size must be positive, got max_size={max_size}")
+        self._max_size = max_size
+        self._ttl = ttl
+        # key -> (expiry time, valid until block)
+        self._entries: "OrderedDict[Hashable, Tuple[float, Optional[int]]]" = (
+            OrderedDict()
+        )
+        self.hits = 0
+        self.misses = 0
+
+    def contains(self, key: Hashable, current_block: int) -> bool:
+        """
+        :param key: key to look up
+        :param current_block: latest block seen
+        :return: whether key is known to be missing
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return False
+        expires_at, valid_until_block = entry
+        if time.monotonic() < expires_at and (
+            valid_until_block is None or current_block <= valid_until_block
+        ):
+            self.hits += 1
+            return True
+        del self._entries[key]
+        return False
+
+    def put(self, key: Hashable, valid_until_block: Optional[int] = None):
+        """
+        Record a key as missing
+        :param key: key which is missing
+        :param valid_until_block: last block for which key is known to be missing, None if it can never appear
+        :return: None
+        """
+        self.misses += 1
+        self._entries[key] = (time.monotonic() + self._ttl, valid_until_block)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, current_block: int):
+        """
+        Drop every entry which is no longer valid at current_block
+        :param current_block: latest block seen
+        :return: None
+        """
+        for key in [
+            key
+            for key, (_, valid_until_block) in self._entries.items()
+            if valid_until_block is not None and valid_until_block < current_block
+        ]:
+            del self._entries[key]
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        :return: share of lookups for missing keys which were answered by the cache
+        """
+        total = self.hits + self.misses
+        if total == 0:
+            return 0
+        return self.hits / total
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent calls: while a call for a key is in flight, further calls for the same key wait
+    for and share its result instead of starting their own
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        :param key: key identifying the call
+        :param fn: function returning the awaitable to run if no call for key is in flight
+        :return: result of the (possibly shared) call
+        """
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self._in_flight[key] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # Shield so a cancelled waiter does not cancel the call shared with other waiters
+        return await asyncio.shield(future)
+
+    def __len__(self) -> int:
+        return len(self._in_flight)
@@ -0,0 +1,111 @@
+import json
+import os
+from typing import Optional, List
+
+from backfill import BlockRange
+
+CHECKPOINT_VERSION = 1
+
+
+class BackfillCheckpoint:
+    """
+    Durable record of backfill progress: the block ranges completed so far and the latest block seen.
+    Saved atomically as JSON so a restarted backfill can resume where it left off instead of starting from scratch
+    """
+
+    def __init__(
+        self,
+        path: str,
+        start_block: int,
+        latest_block_seen: int = 0,
+        completed_ranges: Optional[List[BlockRange]] = None,
+    ):
+        self.path = path
+        self.start_block = start_block
+        self.latest_block_seen = latest_block_seen
+        self._completed_ranges: List[BlockRange] = []
+        for block_range in completed_ranges or []:
+            self.mark_completed(block_range)
+
+    @property
+    def completed_ranges(self) -> List[BlockRange]:
+        return list(self._completed_ranges)
+
+    def mark_completed(self, block_range: BlockRange):
+        """
+        Record a block range as completed, coalescing it with adjacent or overlapping completed ranges
+        :param block_range: inclusive (start_block, end_block)
+        :return: None
+        """
+        merged = []
+        start_block, end_block = block_range
+        for completed_start, completed_end in self._completed_ranges:
+            if completed_end + 1 < start_block or end_block + 1 < completed_start:
+                merged.append((completed_start, completed_end))
+            else:
+                start_block = min(start_block, completed_start)
+                end_block = max(end_block, completed_end)
+        merged.append((start_block, end_block))
+        self._completed_ranges = sorted(merged)
+
+    def remaining(self, end_block: int) -> List[BlockRange]:
+        """
+        :param end_block: last block which should be backfilled
+        :return: block ranges in [start_block, end_block] which have not been completed yet
+        """
+        ret = []
+        cur_block = self.start_block
+        for completed_start, completed_end in self._completed_ranges:
+            if completed_start > end_block:
+                break
+            if completed_start > cur_block:
+                ret.append((cur_block, completed_start - 1))
+            cur_block = max(cur_block, completed_end + 1)
+        if cur_block <= end_block:
+            ret.append((cur_block, end_block))
+        return ret
+
+    def save(self):
+        """
+        Atomically write the checkpoint to its path
+        :return: None
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(
+                {
+                    "version": CHECKPOINT_VERSION,
+                    "start_block": self.start_block,
+                    "latest_block_seen": self.latest_block_seen,
+                    "completed_ranges": self._completed_ranges,
+                },
+                f,
+            )
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["BackfillCheckpoint"]:
+        """
+        Load a checkpoint from its path
+        :param path: path of the checkpoint file
+        :return: BackfillCheckpoint, or None if there is no checkpoint at path
+        """
+        if not os.path.exists(path):
+            return
+        with open(path, "r") as f:
+            data = json.load(f)
+        if data.get("version") != CHECKPOINT_VERSION:
+            raise Exception(
+                f"Unsupported checkpoint version={data.get('version')} in {path}"
+            )
+        return cls(
+            path,
+            data["start_block"],
+            data["latest_block_seen"],
+            [tuple(block_range) for block_range in data["completed_ranges"]],
+        )
@@ -0,0 +1,810 @@
+import asyncio
+import concurrent.futures
+import logging
+import os
+import sqlite3
+import sys
+from typing import Optional, Dict, Any, Iterable, Iterator, Tuple, List
+
+import numpy as np
+
+from snapshot import read_snapshot, write_snapshot
+
+# First snapshot version storing gas costs in wei rather than USD fees
+GAS_COST_SNAPSHOT_VERSION = 3
+
+HASH_KEY_SIZE = 32
+HASH_KEY_DTYPE = np.dtype(f"S{HASH_KEY_SIZE}")
+
+# (32 byte transaction hash key, gas cost in wei, block number, timestamp in seconds)
+FeeRecord = Tuple[bytes, float, Optional[int], Optional[int]]
+# (gas cost in wei, timestamp in seconds)
+FeeEntry = Tuple[float, int]
+# Sorted segment of the in-memory store: (hashes, gas costs, block numbers, timestamps)
+Segment = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+
+def hash_to_key(txn_hash: str) -> Optional[bytes]:
+    """
+    Normalise a hex transaction hash (any case, with or without 0x) into its raw 32 byte digest.
+    Only full length hashes are accepted, so truncated or empty hashes never reach the stores or the upstreams
+    :param txn_hash: hex transaction hash
+    :return: 32 byte key, or None if the hash is not exactly 64 hex digits
+    """
+    if txn_hash[:2] in ("0x", "0X"):
+        txn_hash = txn_hash[2:]
+    if len(txn_hash) != 2 * HASH_KEY_SIZE:
+        return
+    try:
+        key = bytes.fromhex(txn_hash)
+    except ValueError:
+        # e.g. non hex digits
+        return
+    # fromhex skips whitespace between byte pairs, so e.g. 62 digits padded with spaces decode to 31 bytes
+    if len(key) != HASH_KEY_SIZE:
+        return
+    return key
+
+
+def keys_to_bytes(keys: np.ndarray) -> List[bytes]:
+    """
+    Convert an array of 32 byte keys into a list of bytes objects, keeping trailing null bytes
+    (which numpy strips when converting fixed width bytes)
+    :param keys: array of 32 byte keys
+    :return: list of 32 byte keys
+    """
+    raw = np.ascontiguousarray(keys, dtype=HASH_KEY_DTYPE).tobytes()
+    return [raw[i : i + HASH_KEY_SIZE] for i in range(0, len(raw), HASH_KEY_SIZE)]
+
+
+def key_to_hash(key: bytes) -> str:
+    """
+    Inverse of hash_to_key
+    :param key: 32 byte key
+    :return: lowercased 0x prefixed hex transaction hash
+    """
+    return "0x" + key.hex()
+
+
+class FeeStore:
+    """
+    Interface for storing transaction gas costs keyed by 32 byte transaction hash keys (see hash_to_key).
+    Gas costs are kept in wei (as float64, which is exact below 2**53 wei) together with the transaction
+    timestamp, so fees can be priced in USD at lookup time against whichever price table is loaded
+    """
+
+    def get(self, key: bytes) -> Optional[FeeEntry]:
+        """
+        Look up the gas cost of a transaction
+        :param key: 32 byte transaction hash key
+        :return: tuple of (gas cost in wei, timestamp), or None if not stored
+        """
+        raise NotImplementedError
+
+    def get_many(self, keys: List[Optional[bytes]]) -> List[Optional[FeeEntry]]:
+        """
+        Look up the gas costs of a batch of transactions
+        :param keys: list of 32 byte transaction hash keys. None keys are never found
+        :return: list of (gas cost in wei, timestamp) tuples parallel to keys, with None for keys not stored
+        """
+        return [None if key is None else self.get(key) for key in keys]
+
+    def put_many(self, records: Iterable[FeeRecord]):
+        """
+        Store a batch of fee records, overwriting existing records with the same key
+        :param records: iterable of (transaction hash key, gas cost in wei, block number, timestamp)
+        :return: None
+        """
+        raise NotImplementedError
+
+    def put_columns(
+        self,
+        keys: np.ndarray,
+        gas_costs: np.ndarray,
+        blocks: np.ndarray,
+        timestamps: np.ndarray,
+    ):
+        """
+        Columnar version of put_many, storing a batch of records given as parallel arrays
+        :param keys: array of 32 byte transaction hash keys
+        :param gas_costs: gas costs in wei parallel to keys
+        :param blocks: block numbers parallel to keys
+        :param timestamps: timestamps in seconds parallel to keys
+        :return: None
+        """
+        self.put_many(
+            zip(
+                keys_to_bytes(keys),
+                gas_costs.tolist(),
+                blocks.tolist(),
+                timestamps.tolist(),
+            )
+        )
+
+    def iter_range(
+        self,
+        from_block: Optional[int] = None,
+        to_block: Optional[int] = None,
+        from_timestamp: Optional[int] = None,
+        to_timestamp: Optional[int] = None,
+        batch_size: int = 10000,
+    ) -> Iterator[List[FeeRecord]]:
+        """
+        Iterate over every stored record in an inclusive block and/or timestamp range, in batches,
+        so memory stays flat no matter how large the range is. Records are not in any particular order
+        :param from_block: first block, unbounded if None
+        :param to_block: last block, unbounded if None
+        :param from_timestamp: first timestamp in seconds, unbounded if None
+        :param to_timestamp: last timestamp in seconds, unbounded if None
+        :param batch_size: maximum number of records per batch
+        :return: iterator of lists of records
+        """
+        raise NotImplementedError
+
+    def memory_usage(self) -> int:
+        """
+        :return: estimated number of bytes used by the stored entries
+        """
+        raise NotImplementedError
+
+    def bytes_per_entry(self) -> float:
+        """
+        :return: estimated number of bytes used per stored entry, or 0 if the store is empty
+        """
+        num_entries = len(self)
+        if num_entries == 0:
+            return 0
+        return self.memory_usage() / num_entries
+
+    def latest_block(self) -> int:
+        """
+        :return: last block recorded by persist, or 0 if the store was never persisted. Every block up to it is
+        stored, unlike the highest block stored, which concurrent backfill chunks can reach while leaving
+        holes below it
+        """
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    @property
+    def is_persistent(self) -> bool:
+        """
+        :return: whether records survive a restart once persist has been called
+        """
+        return False
+
+    async def persist_async(self, last_block: int):
+        """
+        Awaitable version of persist for callers on the event loop. Backends with a slow persist do the work off the
+        event loop, so lookups keep being served meanwhile
+        :param last_block: last block up to which every block has been ingested, returned by latest_block
+        :return: None
+        """
+        self.persist(last_block)
+
+    def persist(self, last_block: int):
+        """
+        Make everything stored so far durable
+        :param last_block: last block up to which every block has been ingested, returned by latest_block
+        :return: None
+        """
+        pass
+
+    def close(self):
+        pass
+
+
+def merge_into_segment(
+    segment: Segment, delta: Dict[bytes, Tuple[float, int, int]]
+) -> Segment:
+    """
+    Merge delta records into a sorted segment, delta records overwriting segment records with the same key.
+    The input arrays are never written to, so this can run on a worker thread while they are being read
+    :param segment: sorted segment arrays
+    :param delta: key -> (gas cost, block number, timestamp)
+    :return: new sorted segment arrays
+    """
+    hashes, gas_costs, blocks, timestamps = segment
+    keys = np.array(list(delta.keys()), dtype=HASH_KEY_DTYPE)
+    values = np.array(
+        list(delta.values()),
+        dtype=[
+            ("gas_cost", np.float64),
+            ("block", np.int64),
+            ("timestamp", np.int64),
+        ],
+    )
+    order = np.argsort(keys)
+    keys, values = keys[order], values[order]
+
+    positions = np.searchsorted(hashes, keys)
+    exists = np.zeros(len(keys), dtype=bool)
+    in_range = positions < len(hashes)
+    exists[in_range] = hashes[positions[in_range]] == keys[in_range]
+    new = ~exists
+
+    columns = []
+    for segment_column, field in (
+        (gas_costs, "gas_cost"),
+        (blocks, "block"),
+        (timestamps, "timestamp"),
+    ):
+        segment_column = segment_column.copy()
+        segment_column[positions[exists]] = values[field][exists]
+        columns.append(np.insert(segment_column, positions[new], values[field][new]))
+    return (np.insert(hashes, positions[new], keys[new]), *columns)
+
+
+class InMemoryFeeStore(FeeStore):
+    """
+    In-memory fee store made of an immutable segment and a mutable delta layer.
+    The segment is a sorted array of 32 byte keys with parallel arrays of gas costs, block numbers and timestamps,
+    searched with
+    np.searchsorted. New records land in a small dictionary delta which is merged into the segment once it grows
+    past delta_max_entries. If a snapshot path is given, the segment is memory mapped from the snapshot on startup
+    and written back to it on persist.
+    When called from a running event loop, the merge (a full copy of the segment) runs on a worker thread: the full
+    delta is frozen and still searched while new records go to a fresh delta, and the merged arrays are swapped in
+    on the event loop once ready, so lookups are never blocked on a merge
+    """
+
+    def __init__(
+        self, delta_max_entries: int = 100000, snapshot_path: Optional[str] = None
+    ):
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self._delta_max_entries = delta_max_entries
+        self._snapshot_path = snapshot_path
+        self._hashes = np.empty(0, dtype=HASH_KEY_DTYPE)
+        self._gas_costs = np.empty(0, dtype=np.float64)
+        self._blocks = np.empty(0, dtype=np.int64)
+        self._timestamps = np.empty(0, dtype=np.int64)
+        # key -> (gas cost, block number, timestamp)
+        self._delta: Dict[bytes, Tuple[float, int, int]] = {}
+        # Delta being merged into the segment by a background compaction, searched until the merge is swapped in
+        self._frozen_delta: Dict[bytes, Tuple[float, int, int]] = {}
+        self._compaction: Optional[concurrent.futures.Future] = None
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        # Keys of the delta (and of the frozen delta) which are in neither the frozen delta nor the segment,
+        # counted on put so that len() is O(1)
+        self._num_new_delta_keys = 0
+        self._num_new_frozen_keys = 0
+        self._latest_block = 0
+        if snapshot_path is not None and os.path.exists(snapshot_path):
+            self._load_snapshot(snapshot_path)
+
+    def _load_snapshot(self, path: str):
+        snapshot = read_snapshot(path)
+        if snapshot.version < GAS_COST_SNAPSHOT_VERSION:
+            self._logger.warning(
+                f"Ignoring snapshot path={path} version={snapshot.version} as it stores USD fees "
+                f"instead of gas costs"
+            )
+            return
+        self._hashes = snapshot.hashes
+        self._gas_costs = snapshot.gas_costs
+        self._blocks = snapshot.blocks
+        self._timestamps = snapshot.timestamps
+        self._latest_block = snapshot.last_block
+        self._logger.info(
+            f"Mapped snapshot path={path} entries={len(self._hashes)} last_block={snapshot.last_block}"
+        )
+
+    def _segment_index(self, key: bytes) -> int:
+        """
+        :return: index of key in the segment, or -1 if not found
+        """
+        idx = int(np.searchsorted(self._hashes, key))
+        # numpy strips trailing null bytes of fixed width bytes, so compare stripped keys
+        if idx < len(self._hashes) and self._hashes[idx] == key.rstrip(b"\0"):
+            return idx
+        return -1
+
+    def get(self, key: bytes) -> Optional[FeeEntry]:
+        delta_record = self._delta.get(key)
+        if delta_record is None and self._frozen_delta:
+            delta_record = self._frozen_delta.get(key)
+        if delta_record is not None:
+            return delta_record[0], delta_record[2]
+        idx = self._segment_index(key)
+        if idx < 0:
+            return
+        return float(self._gas_costs[idx]), int(self._timestamps[idx])
+
+    def get_many(self, keys: List[Optional[bytes]]) -> List[Optional[FeeEntry]]:
+        valid = np.array([key is not None for key in keys], dtype=bool)
+        query = np.array(
+            [key if key is not None else b"" for key in keys], dtype=HASH_KEY_DTYPE
+        )
+        positions = np.searchsorted(self._hashes, query)
+        found = valid & (positions < len(self._hashes))
+        found[found] = self._hashes[positions[found]] == query[found]
+        gas_costs = np.zeros(len(keys))
+        gas_costs[found] = self._gas_costs[positions[found]]
+        timestamps = np.zeros(len(keys), dtype=np.int64)
+        timestamps[found] = self._timestamps[positions[found]]
+        ret = [
+            (gas_cost, timestamp) if is_found else None
+            for gas_cost, timestamp, is_found in zip(
+                gas_costs.tolist(), timestamps.tolist(), found
+            )
+        ]
+        # The frozen delta is older than the delta, so it is applied first
+        for delta in (self._frozen_delta, self._delta):
+            if not delta:
+                continue
+            for i, key in enumerate(keys):
+                delta_record = delta.get(key)
+                if delta_record is not None:
+                    ret[i] = delta_record[0], delta_record[2]
+        return ret
+
+    def _count_new_keys(self, keys: List[bytes]) -> int:
+        """
+        :param keys: distinct keys which are not in the delta yet
+        :return: number of keys in neither the frozen delta nor the segment
+        """
+        if self._frozen_delta:
+            keys = [key for key in keys if key not in self._frozen_delta]
+        if not keys or len(self._hashes) == 0:
+            return len(keys)
+        query = np.array(keys, dtype=HASH_KEY_DTYPE)
+        positions = np.searchsorted(self._hashes, query)
+        found = positions < len(self._hashes)
+        found[found] = self._hashes[positions[found]] == query[found]
+        return len(keys) - int(np.count_nonzero(found))
+
+    def put_many(self, records: Iterable[FeeRecord]):
+        new_keys = []
+        for key, gas_cost, block_number, timestamp in records:
+            if block_number is None:
+                block_number = 0
+            if key not in self._delta:
+                new_keys.append(key)
+            self._delta[key] = (gas_cost, block_number, timestamp or 0)
+        self._num_new_delta_keys += self._count_new_keys(new_keys)
+        if len(self._delta) >= self._delta_max_entries:
+            self._start_compaction()
+
+    def put_columns(
+        self,
+        keys: np.ndarray,
+        gas_costs: np.ndarray,
+        blocks: np.ndarray,
+        timestamps: np.ndarray,
+    ):
+        if len(keys) == 0:
+            return
+        keys = keys_to_bytes(keys)
+        new_keys = list(dict.fromkeys(key for key in keys if key not in self._delta))
+        self._delta.update(
+            zip(keys, zip(gas_costs.tolist(), blocks.tolist(), timestamps.tolist()))
+        )
+        self._num_new_delta_keys += self._count_new_keys(new_keys)
+        if len(self._delta) >= self._delta_max_entries:
+            self._start_compaction()
+
+    def _get_executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        """
+        :return: single worker thread running the merges and snapshot writes, one at a time
+        """
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="fee-store-compaction"
+            )
+        return self._executor
+
+    def _segment(self) -> Segment:
+        return self._hashes, self._gas_costs, self._blocks, self._timestamps
+
+    def _install_segment(self, segment: Segment):
+        self._hashes, self._gas_costs, self._blocks, self._timestamps = segment
+
+    def _start_compaction(self):
+        """
+        Merge the delta into the segment on a worker thread if there is a running event loop, or right away otherwise.
+        Does nothing while a background compaction is already running; the delta keeps growing until it is done
+        :return: None
+        """
+        if self._compaction is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.compact()
+            return
+        self._frozen_delta, self._delta = self._delta, {}
+        self._num_new_frozen_keys, self._num_new_delta_keys = (
+            self._num_new_delta_keys,
+            0,
+        )
+        compaction = self._get_executor().submit(
+            merge_into_segment, self._segment(), self._frozen_delta
+        )
+        self._compaction = compaction
+        # The merged arrays are swapped in on the event loop, between two lookups
+        compaction.add_done_callback(
+            lambda _: loop.call_soon_threadsafe(self._finish_compaction, compaction)
+        )
+
+    def _finish_compaction(self, compaction: concurrent.futures.Future):
+        """
+        Swap in the segment merged by a background compaction, unless compact already did
+        :param compaction: future of the merged segment
+        :return: None
+        """
+        if compaction is not self._compaction:
+            return
+        self._install_compaction(compaction)
+        if len(self._delta) >= self._delta_max_entries:
+            self._start_compaction()
+
+    def _install_compaction(self, compaction: concurrent.futures.Future):
+        """
+        Swap in the segment merged by a finished background compaction. If it failed, the frozen delta is put back
+        under the delta, to be merged again
+        :param compaction: future of the merged segment
+        :return: None
+        """
+        self._compaction = None
+        try:
+            self._install_segment(compaction.result())
+        except Exception as e:
+            self._logger.error(f"Background compaction failed due to {e}")
+            self._frozen_delta.update(self._delta)
+            self._delta = self._frozen_delta
+            self._num_new_delta_keys += self._num_new_frozen_keys
+        self._frozen_delta = {}
+        self._num_new_frozen_keys = 0
+
+    async def _await_compaction(self, compaction: concurrent.futures.Future):
+        """
+        Wait for a background compaction without blocking the event loop, and swap in its segment
+        :param compaction: future of the merged segment
+        :return: None
+        :raises Exception: if the merge failed
+        """
+        try:
+            await asyncio.wrap_future(compaction)
+        finally:
+            if compaction.done() and compaction is self._compaction:
+                self._install_compaction(compaction)
+
+    def compact(self):
+        """
+        Merge the delta layer into the sorted segment, right away. Delta records overwrite segment records with the
+        same key. A running background compaction is waited for first. The merged segment is always a fresh
+        in-memory array, so a memory mapped segment is never written to
+        :return: None
+        """
+        if self._compaction is not None:
+            self._install_compaction(self._compaction)
+        if not self._delta:
+            return
+        self._install_segment(merge_into_segment(self._segment(), self._delta))
+        self._delta = {}
+        self._num_new_delta_keys = 0
+
+    def iter_range(
+        self,
+        from_block: Optional[int] = None,
+        to_block: Optional[int] = None,
+        from_timestamp: Optional[int] = None,
+        to_timestamp: Optional[int] = None,
+        batch_size: int = 10000,
+    ) -> Iterator[List[FeeRecord]]:
+        # Iterate over the current arrays and a copy of the delta layers instead of compacting, which would block the
+        # event loop. Later puts and compactions do not change what is being iterated
+        hashes, gas_costs, blocks, timestamps = self._segment()
+        delta = dict(self._frozen_delta)
+        delta.update(self._delta)
+        delta_keys = np.array(list(delta.keys()), dtype=HASH_KEY_DTYPE)
+        for start in range(0, len(hashes), batch_size):
+            end = start + batch_size
+            mask = np.ones(min(end, len(hashes)) - start, dtype=bool)
+            if len(delta_keys):
+                # Segment records overwritten by the delta are yielded from the delta
+                mask &= ~np.isin(hashes[start:end], delta_keys)
+            if from_block is not None:
+                mask &= blocks[start:end] >= from_block
+            if to_block is not None:
+                mask &= blocks[start:end] <= to_block
+            if from_timestamp is not None:
+                mask &= timestamps[start:end] >= from_timestamp
+            if to_timestamp is not None:
+                mask &= timestamps[start:end] <= to_timestamp
+            if not mask.any():
+                continue
+            batch_hashes = hashes[start:end].view(np.uint8).reshape(-1, HASH_KEY_SIZE)
+            yield list(
+                zip(
+                    map(bytes, batch_hashes[mask]),
+                    gas_costs[start:end][mask].tolist(),
+                    blocks[start:end][mask].tolist(),
+                    timestamps[start:end][mask].tolist(),
+                )
+            )
+        batch = []
+        for key, (gas_cost, block_number, timestamp) in delta.items():
+            if (
+                (from_block is not None and block_number < from_block)
+                or (to_block is not None and block_number > to_block)
+                or (from_timestamp is not None and timestamp < from_timestamp)
+                or (to_timestamp is not None and timestamp > to_timestamp)
+            ):
+                continue
+            batch.append((key, gas_cost, block_number, timestamp))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    @property
+    def is_persistent(self) -> bool:
+        return self._snapshot_path is not None
+
+    def persist(self, last_block: int):
+        """
+        Compact the store and write it to the snapshot path, if one is configured
+        :param last_block: last block ingested, recorded in the snapshot
+        :return: None
+        """
+        self._latest_block = last_block
+        if self._snapshot_path is None:
+            return
+        self.compact()
+        write_snapshot(
+            self._snapshot_path,
+            self._hashes,
+            self._gas_costs,
+            self._blocks,
+            self._timestamps,
+            last_block,
+        )
+        self._logger.info(
+            f"Wrote snapshot path={self._snapshot_path} entries={len(self._hashes)} last_block={last_block}"
+        )
+
+    async def persist_async(self, last_block: int):
+        """
+        Version of persist which runs the merge and the snapshot write on the compaction worker thread, so lookups
+        keep being served meanwhile. Records put while it runs stay in the delta until the next persist
+        :param last_block: last block ingested, recorded in the snapshot
+        :return: None
+        """
+        self._latest_block = last_block
+        if self._snapshot_path is None:
+            return
+        # First the merge already running, if any, then one of everything put before this call
+        if self._compaction is not None:
+            await self._await_compaction(self._compaction)
+        if self._delta:
+            self._start_compaction()
+            await self._await_compaction(self._compaction)
+        hashes, gas_costs, blocks, timestamps = self._segment()
+        await asyncio.get_running_loop().run_in_executor(
+            self._get_executor(),
+            write_snapshot,
+            self._snapshot_path,
+            hashes,
+            gas_costs,
+            blocks,
+            timestamps,
+            last_block,
+        )
+        self._logger.info(
+            f"Wrote snapshot path={self._snapshot_path} entries={len(hashes)} last_block={last_block}"
+        )
+
+    def latest_block(self) -> int:
+        return self._latest_block
+
+    def __len__(self) -> int:
+        return len(self._hashes) + self._num_new_frozen_keys + self._num_new_delta_keys
+
+    def memory_usage(self) -> int:
+        # Every delta key is a 32 byte bytes object and every value a tuple of a float and two ints
+        delta_entry_size = (
+            sys.getsizeof(bytes(HASH_KEY_SIZE))
+            + sys.getsizeof((0.0, 0, 0))
+            + sys.getsizeof(0.0)
+            + 2 * sys.getsizeof(2**40)
+        )
+        return (
+            self._hashes.nbytes
+            + self._gas_costs.nbytes
+            + self._blocks.nbytes
+            + self._timestamps.nbytes
+            + sys.getsizeof(self._delta)
+            + sys.getsizeof(self._frozen_delta)
+            + delta_entry_size * (len(self._delta) + len(self._frozen_delta))
+        )
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+class SqliteFeeStore(FeeStore):
+    """
+    Persistent fee store backed by SQLite in WAL mode. Each put_many call is written in a single transaction,
+    and lookups reuse one cached prepared statement against the primary key.
+    """
+
+    # Gas costs live in their own table, as the transaction_fees table of older versions held USD fees
+    _CREATE_TABLE_SQL = (
+        "CREATE TABLE IF NOT EXISTS transaction_gas_costs ("
+        "txn_hash BLOB PRIMARY KEY, gas_cost REAL NOT NULL, block_number INTEGER, timestamp INTEGER"
+        ") WITHOUT ROWID"
+    )
+    _CREATE_INDEXES_SQL = (
+        "CREATE INDEX IF NOT EXISTS transaction_gas_costs_block_number "
+        "ON transaction_gas_costs (block_number)",
+        "CREATE INDEX IF NOT EXISTS transaction_gas_costs_timestamp "
+        "ON transaction_gas_costs (timestamp)",
+    )
+    # Last block recorded by persist, as the highest block stored may be above holes left by a backfill
+    _CREATE_METADATA_TABLE_SQL = (
+        "CREATE TABLE IF NOT EXISTS fee_store_metadata ("
+        "name TEXT PRIMARY KEY, value INTEGER NOT NULL"
+        ")"
+    )
+    _GET_METADATA_SQL = "SELECT value FROM fee_store_metadata WHERE name = ?"
+    _PUT_METADATA_SQL = (
+        "INSERT OR REPLACE INTO fee_store_metadata (name, value) VALUES (?, ?)"
+    )
+    _GET_FEE_SQL = (
+        "SELECT gas_cost, timestamp FROM transaction_gas_costs WHERE txn_hash = ?"
+    )
+    _GET_FEES_SQL = (
+        "SELECT txn_hash, gas_cost, timestamp FROM transaction_gas_costs "
+        "WHERE txn_hash IN ({})"
+    )
+    # Stay below SQLITE_MAX_VARIABLE_NUMBER of older SQLite builds
+    _GET_FEES_BATCH_SIZE = 500
+    _PUT_FEE_SQL = (
+        "INSERT OR REPLACE INTO transaction_gas_costs "
+        "(txn_hash, gas_cost, block_number, timestamp) VALUES (?, ?, ?, ?)"
+    )
+    _ITER_RANGE_SQL = (
+        "SELECT txn_hash, gas_cost, block_number, timestamp FROM transaction_gas_costs"
+    )
+    _COUNT_SQL = "SELECT COUNT(*) FROM transaction_gas_costs"
+    _COUNT_KEYS_SQL = (
+        "SELECT COUNT(*) FROM transaction_gas_costs WHERE txn_hash IN ({})"
+    )
+    _PAGE_SIZE_SQL = "PRAGMA page_size"
+    _PAGE_COUNT_SQL = "PRAGMA page_count"
+
+    def __init__(self, path: str, logger: Optional[logging.Logger] = None):
+        self._logger = logger or logging.getLogger(self.__class__.__name__)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(self._CREATE_TABLE_SQL)
+        self._conn.execute(self._CREATE_METADATA_TABLE_SQL)
+        for create_index_sql in self._CREATE_INDEXES_SQL:
+            self._conn.execute(create_index_sql)
+        self._conn.commit()
+        # Row count, counted once on the first len() and then kept up to date by put_many
+        self._num_entries: Optional[int] = None
+        self._logger.info(f"Opened SQLite fee store at path={path}")
+
+    @property
+    def is_persistent(self) -> bool:
+        return True
+
+    def get(self, key: bytes) -> Optional[FeeEntry]:
+        row = self._conn.execute(self._GET_FEE_SQL, (key,)).fetchone()
+        if row is None:
+            return
+        return row[0], row[1] or 0
+
+    def get_many(self, keys: List[Optional[bytes]]) -> List[Optional[FeeEntry]]:
+        unique_keys = list({key for key in keys if key is not None})
+        key_to_entry = {}
+        for i in range(0, len(unique_keys), self._GET_FEES_BATCH_SIZE):
+            batch = unique_keys[i : i + self._GET_FEES_BATCH_SIZE]
+            sql = self._GET_FEES_SQL.format(",".join("?" * len(batch)))
+            for key, gas_cost, timestamp in self._conn.execute(sql, batch):
+                key_to_entry[key] = (gas_cost, timestamp or 0)
+        return [key_to_entry.get(key) for key in keys]
+
+    def put_many(self, records: Iterable[FeeRecord]):
+        if self._num_entries is None:
+            with self._conn:
+                self._conn.executemany(self._PUT_FEE_SQL, records)
+            return
+        records = list(records)
+        unique_keys = list({record[0] for record in records})
+        num_existing = 0
+        with self._conn:
+            for i in range(0, len(unique_keys), self._GET_FEES_BATCH_SIZE):
+                batch = unique_keys[i : i + self._GET_FEES_BATCH_SIZE]
+                sql = self._COUNT_KEYS_SQL.format(",".join("?" * len(batch)))
+                num_existing += self._conn.execute(sql, batch).fetchone()[0]
+            self._conn.executemany(self._PUT_FEE_SQL, records)
+        self._num_entries += len(unique_keys) - num_existing
+
+    def iter_range(
+        self,
+        from_block: Optional[int] = None,
+        to_block: Optional[int] = None,
+        from_timestamp: Optional[int] = None,
+        to_timestamp: Optional[int] = None,
+        batch_size: int = 10000,
+    ) -> Iterator[List[FeeRecord]]:
+        conditions = []
+        params = []
+        for condition, value in (
+            ("block_number >= ?", from_block),
+            ("block_number <= ?", to_block),
+            ("timestamp >= ?", from_timestamp),
+            ("timestamp <= ?", to_timestamp),
+        ):
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+        sql = self._ITER_RANGE_SQL
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        # A separate read connection sees a consistent WAL snapshot while writes carry on
+        conn = sqlite3.connect(self._path, check_same_thread=False)
+        try:
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            conn.close()
+
+    def persist(self, last_block: int):
+        """
+        Writes are committed as they happen, so only the last block is recorded
+        :param last_block: last block ingested
+        :return: None
+        """
+        with self._conn:
+            self._conn.execute(self._PUT_METADATA_SQL, ("last_block", last_block))
+
+    def latest_block(self) -> int:
+        row = self._conn.execute(self._GET_METADATA_SQL, ("last_block",)).fetchone()
+        return 0 if row is None else row[0]
+
+    def __len__(self) -> int:
+        if self._num_entries is None:
+            self._num_entries = self._conn.execute(self._COUNT_SQL).fetchone()[0]
+        return self._num_entries
+
+    def memory_usage(self) -> int:
+        page_size = self._conn.execute(self._PAGE_SIZE_SQL).fetchone()[0]
+        page_count = self._conn.execute(self._PAGE_COUNT_SQL).fetchone()[0]
+        return page_size * page_count
+
+    def close(self):
+        self._conn.close()
+
+
+def create_fee_store(config: Optional[Dict[str, Any]]) -> FeeStore:
+    """
+    Build the fee store backend from the store section of the config
+    :param config: store config section
+    :return: FeeStore
+    """
+    config = config or {}
+    backend = config.get("backend", "memory")
+    if backend == "memory":
+        return InMemoryFeeStore(
+            int(config.get("delta_max_entries", 100000)), config.get("snapshot_path")
+        )
+    if backend == "sqlite":
+        return SqliteFeeStore(config.get("path", "data/fees.sqlite"))
+    raise Exception(f"Unknown fee store backend={backend}")
@@ -0,0 +1,70 @@
+from typing import List, Any, NamedTuple
+
+import numpy as np
+
+from fee_store import hash_to_key, HASH_KEY_SIZE, HASH_KEY_DTYPE
+from records import TokenTransfer
+
+
+class TransactionColumns(NamedTuple):
+    """
+    Columnar view of a page of Etherscan transfers
+    """
+
+    keys: np.ndarray
+    gas_costs: np.ndarray
+    timestamps: np.ndarray
+    blocks: np.ndarray
+
+
+def hashes_to_keys(txn_hashes: List[Any]) -> np.ndarray:
+    """
+    Convert a list of hex transaction hashes into an array of 32 byte keys (see hash_to_key).
+    Full length 0x prefixed hashes, as returned by Etherscan, are decoded in a single call
+    :param txn_hashes: list of hex transaction hashes
+    :return: array of 32 byte keys
+    """
+    if all(
+        isinstance(txn_hash, str) and len(txn_hash) == 2 + 2 * HASH_KEY_SIZE
+        for txn_hash in txn_hashes
+    ):
+        try:
+            digests = bytes.fromhex("".join(txn_hash[2:] for txn_hash in txn_hashes))
+        except ValueError:
+            digests = b""
+        if len(digests) == HASH_KEY_SIZE * len(txn_hashes):
+            return np.frombuffer(digests, dtype=HASH_KEY_DTYPE)
+    keys = []
+    for txn_hash in txn_hashes:
+        if txn_hash is None:
+            raise Exception("Transaction hash found to be None")
+        key = hash_to_key(str(txn_hash))
+        if key is None:
+            raise Exception(f"Invalid transaction hash {txn_hash}")
+        keys.append(key)
+    return np.array(keys, dtype=HASH_KEY_DTYPE)
+
+
+def transfers_to_columns(transfers: List[TokenTransfer]) -> TransactionColumns:
+    """
+    Convert a page of decoded transfers into columnar arrays.
+    Gas prices and gas used are converted to float64, which is exact for any realistic value (below 2**53),
+    and multiplied into gas costs in wei
+    :param transfers: list of transfers taken from get_historical_transactions
+    :return: TransactionColumns
+    """
+    num_transfers = len(transfers)
+    keys = hashes_to_keys([transfer.txn_hash for transfer in transfers])
+    gas_prices = np.fromiter(
+        (transfer.gas_price for transfer in transfers), np.float64, num_transfers
+    )
+    gas_used = np.fromiter(
+        (transfer.gas_used for transfer in transfers), np.float64, num_transfers
+    )
+    timestamps = np.fromiter(
+        (transfer.timestamp for transfer in transfers), np.int64, num_transfers
+    )
+    blocks = np.fromiter(
+        (transfer.block_number for transfer in transfers), np.int64, num_transfers
+    )
+    return TransactionColumns(keys, gas_prices * gas_used, timestamps, blocks)
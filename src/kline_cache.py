@@ -0,0 +1,112 @@
+import logging
+import os
+import struct
+from typing import Optional, Tuple
+
+import numpy as np
+
+KLINE_CACHE_MAGIC = b"TXKLINES"
+KLINE_CACHE_VERSION = 1
+# magic, version, reserved, interval in milliseconds
+_HEADER = struct.Struct("<8sIIQ")
+
+KLINE_DTYPE = np.dtype([("time", "<i8"), ("price", "<f8")])
+
+
+class KlineCache:
+    """
+    Append-only local file of klines for a single symbol and interval: a fixed header followed by
+    (open time in milliseconds, price) records in open time order. Only closed klines should be appended,
+    so records never change once written. A partially written trailing record (e.g. after a crash) is dropped
+    on load
+    """
+
+    def __init__(
+        self, path: str, interval_ms: int, logger: Optional[logging.Logger] = None
+    ):
+        self._logger = logger or logging.getLogger(self.__class__.__name__)
+        self._path = path
+        self._interval_ms = interval_ms
+        self._last_time: Optional[int] = None
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def last_time(self) -> Optional[int]:
+        """
+        :return: open time in milliseconds of the last cached kline, or None if nothing is cached
+        """
+        return self._last_time
+
+    def load(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Read every cached kline
+        :return: tuple of (open times in milliseconds, prices) arrays
+        """
+        if not os.path.exists(self._path):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        with open(self._path, "rb") as f:
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                raise ValueError(f"Kline cache {self._path} is truncated")
+            magic, version, _, interval_ms = _HEADER.unpack(header)
+            if magic != KLINE_CACHE_MAGIC:
+                raise ValueError(f"{self._path} is not a kline cache file")
+            if version != KLINE_CACHE_VERSION:
+                raise ValueError(
+                    f"Unsupported kline cache version={version} in {self._path}"
+                )
+            if interval_ms != self._interval_ms:
+                raise ValueError(
+                    f"Kline cache {self._path} has interval_ms={interval_ms}, expected {self._interval_ms}"
+                )
+            data = f.read()
+        num_records = len(data) // KLINE_DTYPE.itemsize
+        if num_records * KLINE_DTYPE.itemsize != len(data):
+            self._logger.warning(
+                f"Dropping partially written kline in cache path={self._path}"
+            )
+            self._truncate(num_records)
+        records = np.frombuffer(data, KLINE_DTYPE, num_records)
+        times = records["time"].copy()
+        prices = records["price"].copy()
+        if num_records > 0:
+            self._last_time = int(times.max())
+        return times, prices
+
+    def _truncate(self, num_records: int):
+        with open(self._path, "r+b") as f:
+            f.truncate(_HEADER.size + num_records * KLINE_DTYPE.itemsize)
+
+    def append(self, times: np.ndarray, prices: np.ndarray):
+        """
+        Append klines to the cache. Klines opening at or before the last cached kline are skipped,
+        so load should be called first when the cache file already exists
+        :param times: open times in milliseconds, sorted
+        :param prices: prices parallel to times
+        :return: None
+        """
+        if self._last_time is not None:
+            keep = times > self._last_time
+            times, prices = times[keep], prices[keep]
+        if len(times) == 0:
+            return
+        records = np.empty(len(times), dtype=KLINE_DTYPE)
+        records["time"] = times
+        records["price"] = prices
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self._path, "ab") as f:
+            if f.tell() == 0:
+                f.write(
+                    _HEADER.pack(
+                        KLINE_CACHE_MAGIC, KLINE_CACHE_VERSION, 0, self._interval_ms
+                    )
+                )
+            f.write(records.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        self._last_time = int(times[-1])
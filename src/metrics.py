@@ -0,0 +1,282 @@
+import bisect
+import math
+from typing import Optional, List, Dict, Tuple, Callable, Sequence
+
+# Default histogram buckets in seconds, from 10us (in-memory lookups) up to 10s (upstream calls)
+DEFAULT_BUCKETS = (
+    0.00001,
+    0.000025,
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (
+            name,
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class CounterValue:
+    """
+    Single counter time series. Plain attribute updates, so incrementing costs well under a microsecond
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class GaugeValue:
+    """
+    Single gauge time series
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class HistogramValue:
+    """
+    Single histogram time series. Observations are counted in their bucket only, and made cumulative on render
+    """
+
+    __slots__ = ("_upper_bounds", "bucket_counts", "sum", "count")
+
+    def __init__(self, upper_bounds: Tuple[float, ...]):
+        self._upper_bounds = upper_bounds
+        # One extra bucket for observations above the last bound (+Inf)
+        self.bucket_counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.bucket_counts[bisect.bisect_left(self._upper_bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metric:
+    """
+    Metric family: one time series per combination of label values. Series are created on first use
+    and should be resolved once with labels() and kept for hot paths
+    """
+
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _new_value(self):
+        raise NotImplementedError
+
+    def labels(self, *labelvalues: str):
+        """
+        :param labelvalues: one value per label name, in order
+        :return: time series of the label values
+        """
+        if len(labelvalues) != len(self.labelnames):
+            raise ValueError(
+                f"Metric {self.name} expects labels {self.labelnames}, got {labelvalues}"
+            )
+        key = tuple(str(value) for value in labelvalues)
+        value = self._values.get(key)
+        if value is None:
+            value = self._values[key] = self._new_value()
+        return value
+
+    def samples(self) -> List[Tuple[str, Sequence[Tuple[str, str]], float]]:
+        """
+        :return: list of (sample name, labels, value)
+        """
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.metric_type}",
+        ]
+        for sample_name, labels, value in self.samples():
+            lines.append(
+                f"{sample_name}{_format_labels(labels)} {_format_value(value)}"
+            )
+        return "\n".join(lines) + "\n"
+
+
+class Counter(Metric):
+    metric_type = "counter"
+
+    def _new_value(self) -> CounterValue:
+        return CounterValue()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def samples(self):
+        return [
+            (f"{self.name}_total", tuple(zip(self.labelnames, key)), value.value)
+            for key, value in self._values.items()
+        ]
+
+
+class Gauge(Metric):
+    metric_type = "gauge"
+
+    def _new_value(self) -> GaugeValue:
+        return GaugeValue()
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def samples(self):
+        return [
+            (self.name, tuple(zip(self.labelnames, key)), value.value)
+            for key, value in self._values.items()
+        ]
+
+
+class Histogram(Metric):
+    metric_type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_value(self) -> HistogramValue:
+        return HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def samples(self):
+        ret = []
+        for key, value in self._values.items():
+            labels = tuple(zip(self.labelnames, key))
+            cumulative = 0
+            for upper_bound, bucket_count in zip(
+                self.buckets + (math.inf,), value.bucket_counts
+            ):
+                cumulative += bucket_count
+                ret.append(
+                    (
+                        f"{self.name}_bucket",
+                        labels + (("le", _format_value(upper_bound)),),
+                        cumulative,
+                    )
+                )
+            ret.append((f"{self.name}_sum", labels, value.sum))
+            ret.append((f"{self.name}_count", labels, value.count))
+        return ret
+
+
+class MetricsRegistry:
+    """
+    Registry of metrics rendered in the Prometheus text exposition format.
+    Values which are cheaper to read at scrape time than to track on every update (e.g. store sizes)
+    are refreshed by collectors, which are called before every render
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def _register(self, metric: Metric) -> Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            if type(existing) is not type(metric) or (
+                existing.labelnames != metric.labelnames
+            ):
+                raise ValueError(f"Metric {metric.name} is already registered")
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], None]):
+        """
+        :param collector: callable refreshing gauges, called before every render
+        :return: None
+        """
+        self._collectors.append(collector)
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """
+        :return: every metric in the Prometheus text exposition format
+        """
+        for collector in self._collectors:
+            collector()
+        return "".join(metric.render() for metric in self._metrics.values())
@@ -0,0 +1,316 @@
+"""
+Local stand-in for the Etherscan and Binance endpoints used by the tracker (getblocknobytime, tokentx and klines),
+serving a synthetic chain with configurable latency, rate limit errors and result caps. Point the tracker at it with
+upstreams.etherscan.url and upstreams.binance.url (see configs/config.mock.yaml). Run with:
+PYTHONPATH=src python src/mock_upstream.py --port 8545
+"""
+
+import argparse
+import asyncio
+import logging
+import math
+import random
+import time
+import zlib
+from typing import Optional, List, Any, Dict
+
+from aiohttp import web
+
+from prices import KLINE_INTERVALS_MS
+from rate_limiter import TokenBucket
+from records import TokenTransfer
+from serialization import create_json_serializer
+from synthetic import SyntheticChain
+
+ETHERSCAN_PATH = "/api"
+BINANCE_KLINES_PATH = "/api/v3/klines"
+BINANCE_KLINES_MAX_LIMIT = 1000
+
+
+def synthetic_price(open_time: int) -> float:
+    """
+    Deterministic ETH price of a candle: a monthly and a daily cycle around 2000
+    :param open_time: candle open time in milliseconds
+    :return: price
+    """
+    days = open_time / KLINE_INTERVALS_MS["1d"]
+    return round(
+        2000
+        + 300 * math.sin(2 * math.pi * days / 30)
+        + 20 * math.sin(2 * math.pi * days),
+        2,
+    )
+
+
+def transfer_to_etherscan(
+    transfer: TokenTransfer, pool_address: str, token_address: str, index: int
+) -> Dict[str, str]:
+    """
+    :param transfer: synthetic transfer
+    :param pool_address: pool the transfer was queried for
+    :param token_address: token the transfer was queried for
+    :param index: index of the transfer in its block
+    :return: transfer in the format of an Etherscan tokentx result, every value a string
+    """
+    return {
+        "blockNumber": str(transfer.block_number),
+        "timeStamp": str(transfer.timestamp),
+        "hash": transfer.txn_hash,
+        "nonce": str(index),
+        "blockHash": "0x" + transfer.txn_hash[2:][::-1],
+        "from": pool_address,
+        "contractAddress": token_address,
+        "to": "0x" + transfer.txn_hash[-40:],
+        "value": str(transfer.gas_used * 10**12),
+        "tokenName": "Wrapped Ether",
+        "tokenSymbol": "WETH",
+        "tokenDecimal": "18",
+        "transactionIndex": str(index),
+        "gas": str(transfer.gas_used * 2),
+        "gasPrice": str(transfer.gas_price),
+        "gasUsed": str(transfer.gas_used),
+        "cumulativeGasUsed": str(transfer.gas_used * (index + 1)),
+        "input": "deprecated",
+        "confirmations": "1",
+    }
+
+
+class MockUpstream:
+    """
+    Request handlers of the stand-in. Every pool (address) gets its own synthetic chain, seeded from the address,
+    and the head block advances in real time by one block every block_time seconds
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        config = config or {}
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self._seed = int(config.get("seed", 0))
+        self._start_block = int(config.get("start_block", 12376729))
+        self._block_time = int(config.get("block_time", 12))
+        self._transfers_per_block = float(config.get("transfers_per_block", 20))
+        # The chain starts initial_blocks blocks before the server, so that there is history to backfill
+        self._start_timestamp = int(
+            config.get(
+                "start_timestamp",
+                time.time()
+                - int(config.get("initial_blocks", 10000)) * self._block_time,
+            )
+        )
+        self._latency = float(config.get("latency", 0))
+        self._jitter = float(config.get("jitter", 0))
+        self._error_rate = float(config.get("error_rate", 0))
+        self._max_results = int(config.get("max_results", 10000))
+        rate_limit = config.get("rate_limit")
+        self._rate_limiter = (
+            None
+            if rate_limit is None
+            else TokenBucket(float(rate_limit), int(config.get("burst", 1)))
+        )
+        self._random = random.Random(self._seed)
+        self._chains: Dict[str, SyntheticChain] = {}
+        self._json_serializer = create_json_serializer(logger=self._logger)
+        self.requests: Dict[str, int] = {}
+
+    def _chain(self, address: str) -> SyntheticChain:
+        address = address.lower()
+        chain = self._chains.get(address)
+        if chain is None:
+            chain = self._chains[address] = SyntheticChain(
+                seed=self._seed ^ zlib.crc32(address.encode()),
+                start_block=self._start_block,
+                start_timestamp=self._start_timestamp,
+                block_time=self._block_time,
+                transfers_per_block=self._transfers_per_block,
+            )
+        return chain
+
+    def head_block(self) -> int:
+        """
+        :return: latest block of the synthetic chains
+        """
+        return self._chain("").block_at(int(time.time()))
+
+    async def _before_request(self, endpoint: str) -> bool:
+        """
+        Count the request, wait for the configured latency and decide whether it is rate limited
+        :param endpoint: name of the endpoint
+        :return: whether the request should fail with a rate limit error
+        """
+        self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+        if self._latency > 0 or self._jitter > 0:
+            await asyncio.sleep(self._latency + self._random.uniform(0, self._jitter))
+        if self._rate_limiter is not None and not self._rate_limiter.try_acquire():
+            return True
+        return self._random.random() < self._error_rate
+
+    def _etherscan_response(
+        self, result: Any, status: str = "1", message: str = "OK"
+    ) -> web.Response:
+        return self._json_serializer.response(
+            {"status": status, "message": message, "result": result}
+        )
+
+    async def etherscan_handler(self, req: web.Request) -> web.Response:
+        action = req.query.get("action")
+        if await self._before_request(action or "etherscan"):
+            return self._etherscan_response(
+                "Max rate limit reached, please use API Key for higher rate limit",
+                "0",
+                "NOTOK",
+            )
+        try:
+            if action == "getblocknobytime":
+                return self._get_block_by_time(req)
+            if action == "tokentx":
+                return self._get_token_transfers(req)
+        except (KeyError, ValueError) as e:
+            return self._etherscan_response(
+                f"Error! Invalid parameter {e}", "0", "NOTOK"
+            )
+        return self._etherscan_response(
+            "Error! Missing Or invalid Action name", "0", "NOTOK"
+        )
+
+    def _get_block_by_time(self, req: web.Request) -> web.Response:
+        timestamp = int(req.query["timestamp"])
+        if timestamp < self._start_timestamp:
+            return self._etherscan_response(
+                "Error! No closest block found", "0", "NOTOK"
+            )
+        return self._etherscan_response(
+            str(min(self._chain("").block_at(timestamp), self.head_block()))
+        )
+
+    def _get_token_transfers(self, req: web.Request) -> web.Response:
+        address = req.query["address"]
+        token_address = req.query.get("contractaddress", "")
+        start_block = max(int(req.query.get("startblock", 0)), self._start_block)
+        end_block = min(int(req.query.get("endblock", 99999999)), self.head_block())
+        page = max(1, int(req.query.get("page", 1)))
+        offset = int(req.query.get("offset", 0))
+        if offset <= 0:
+            page, offset = 1, self._max_results
+        if page * offset > self._max_results:
+            return self._etherscan_response(
+                None,
+                "0",
+                f"Result window is too large, PageNo x Offset size must be less than or equal to {self._max_results}",
+            )
+        # Only generate the blocks needed to fill the requested page
+        chain = self._chain(address)
+        needed = page * offset
+        result: List[Dict[str, str]] = []
+        for block_number in range(start_block, end_block + 1):
+            if len(result) >= needed:
+                break
+            result.extend(
+                transfer_to_etherscan(transfer, address, token_address, index)
+                for index, transfer in enumerate(chain.block_transfers(block_number))
+            )
+        result = result[(page - 1) * offset : needed]
+        if req.query.get("sort") == "desc":
+            result.reverse()
+        if not result:
+            return self._etherscan_response([], "0", "No transactions found")
+        return self._etherscan_response(result)
+
+    async def klines_handler(self, req: web.Request) -> web.Response:
+        if await self._before_request("klines"):
+            return self._json_serializer.response(
+                {"code": -1003, "msg": "Too many requests"}, status=429
+            )
+        interval = req.query.get("interval")
+        if interval not in KLINE_INTERVALS_MS:
+            return self._json_serializer.response(
+                {"code": -1120, "msg": "Invalid interval."}, status=400
+            )
+        interval_ms = KLINE_INTERVALS_MS[interval]
+        now_ms = int(time.time() * 1000)
+        end_time = min(int(req.query.get("endTime", now_ms)), now_ms)
+        limit = min(int(req.query.get("limit", 500)), BINANCE_KLINES_MAX_LIMIT)
+        start_time = int(
+            req.query.get("startTime", end_time - (limit - 1) * interval_ms)
+        )
+        first_open_time = -(-start_time // interval_ms) * interval_ms
+        klines = []
+        for open_time in range(first_open_time, end_time + 1, interval_ms):
+            if len(klines) >= limit:
+                break
+            price = synthetic_price(open_time)
+            klines.append(
+                [
+                    open_time,
+                    f"{price:.2f}",
+                    f"{price * 1.001:.2f}",
+                    f"{price * 0.999:.2f}",
+                    f"{synthetic_price(open_time + interval_ms):.2f}",
+                    "100.0",
+                    open_time + interval_ms - 1,
+                    f"{price * 100:.2f}",
+                    100,
+                    "50.0",
+                    f"{price * 50:.2f}",
+                    "0",
+                ]
+            )
+        return self._json_serializer.response(klines)
+
+    async def stats_handler(self, req: web.Request) -> web.Response:
+        return self._json_serializer.response(
+            {"head_block": self.head_block(), "requests": self.requests}
+        )
+
+
+def create_mock_upstream_app(
+    config: Optional[Dict[str, Any]] = None,
+) -> web.Application:
+    """
+    Build the stand-in application, serving Etherscan at /api, Binance klines at /api/v3/klines
+    and request counts at /stats
+    :param config: settings of the synthetic chain and of the failure injection (see MockUpstream)
+    :return: app object from aiohttp
+    """
+    mock_upstream = MockUpstream(config)
+    web_app = web.Application()
+    web_app["mock_upstream"] = mock_upstream
+    web_app.add_routes(
+        [
+            web.get(ETHERSCAN_PATH, mock_upstream.etherscan_handler),
+            web.get(BINANCE_KLINES_PATH, mock_upstream.klines_handler),
+            web.get("/stats", mock_upstream.stats_handler),
+        ]
+    )
+    return web_app
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Local stand-in for the Etherscan and Binance endpoints"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8545)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--initial-blocks", type=int, default=10000)
+    parser.add_argument("--block-time", type=int, default=12)
+    parser.add_argument("--transfers-per-block", type=float, default=20)
+    parser.add_argument("--latency", type=float, default=0, help="seconds per request")
+    parser.add_argument("--jitter", type=float, default=0, help="extra random latency")
+    parser.add_argument(
+        "--error-rate", type=float, default=0, help="share of rate limit errors"
+    )
+    parser.add_argument("--rate-limit", type=float, help="calls/sec before rejecting")
+    parser.add_argument("--burst", type=int, default=1)
+    parser.add_argument("--max-results", type=int, default=10000)
+    args = parser.parse_args()
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - [ %(name)s ] - %(message)s",
+    )
+    config = {
+        key: value for key, value in vars(args).items() if key not in ("host", "port")
+    }
+    web.run_app(create_mock_upstream_app(config), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
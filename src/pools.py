@@ -0,0 +1,51 @@
+from typing import Optional, List, Any, Dict, NamedTuple
+
+
+class Pool(NamedTuple):
+    """
+    Pool tracked by the fee tracker: transfers of token_address to or from address (e.g. WETH in a Uniswap pool)
+    """
+
+    name: str
+    address: str
+    token_address: str
+    # First block to backfill, e.g. the block the pool was created in
+    start_block: int = 0
+
+
+# Uniswap v3 USDC/ETH 0.05% pool, tracked when no pools are configured
+DEFAULT_POOL = Pool(
+    "usdc_eth_005",
+    "0x88e6A0c2dDD26FEEb64F039a2c41296FcB3f5640",
+    "0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2",
+)
+
+
+def pools_from_config(
+    pool_configs: Optional[List[Dict[str, Any]]], default_start_block: int = 0
+) -> List[Pool]:
+    """
+    Build the pools from the pools section of the config
+    :param pool_configs: list of dicts with name, address, token_address and optionally start_block
+    :param default_start_block: start block of pools which do not set their own
+    :return: list of Pool, or just DEFAULT_POOL if no pools are configured
+    """
+    if not pool_configs:
+        return [DEFAULT_POOL._replace(start_block=default_start_block)]
+    pools = []
+    for pool_config in pool_configs:
+        for field in ("name", "address", "token_address"):
+            if not pool_config.get(field):
+                raise Exception(f"Pool config {pool_config} is missing {field}")
+        pools.append(
+            Pool(
+                str(pool_config["name"]),
+                str(pool_config["address"]),
+                str(pool_config["token_address"]),
+                int(pool_config.get("start_block", default_start_block)),
+            )
+        )
+    names = [pool.name for pool in pools]
+    if len(set(names)) != len(names):
+        raise Exception(f"Pool names must be unique, got {names}")
+    return pools
@@ -0,0 +1,142 @@
+from typing import Optional, List, Tuple
+
+import numpy as np
+
+WEI_PER_ETH = 10**18
+
+# (candle open time in milliseconds, ETH price)
+Candle = Tuple[int, float]
+
+# Length in milliseconds of the Binance kline intervals
+KLINE_INTERVALS_MS = {
+    "1m": 60 * 1000,
+    "3m": 3 * 60 * 1000,
+    "5m": 5 * 60 * 1000,
+    "15m": 15 * 60 * 1000,
+    "30m": 30 * 60 * 1000,
+    "1h": 60 * 60 * 1000,
+    "2h": 2 * 60 * 60 * 1000,
+    "4h": 4 * 60 * 60 * 1000,
+    "6h": 6 * 60 * 60 * 1000,
+    "8h": 8 * 60 * 60 * 1000,
+    "12h": 12 * 60 * 60 * 1000,
+    "1d": 24 * 60 * 60 * 1000,
+}
+
+
+def candles_to_arrays(candles: List[Candle]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    :param candles: list of (open time in milliseconds, price)
+    :return: tuple of (open times, prices) arrays
+    """
+    times = np.fromiter(
+        (candle[0] for candle in candles), dtype=np.int64, count=len(candles)
+    )
+    prices = np.fromiter(
+        (candle[1] for candle in candles), dtype=np.float64, count=len(candles)
+    )
+    return times, prices
+
+
+class PriceTable:
+    """
+    In-memory table of ETH prices, held as a sorted array of candle open times (milliseconds) with a parallel
+    array of prices (16 bytes per candle, so about 46MB for every 1m candle since May 2021).
+    A transaction is priced against the first candle opening at or after it, or the last candle
+    for transactions after every candle
+    """
+
+    def __init__(self, candles: Optional[List[Candle]] = None):
+        self._times = np.empty(0, dtype=np.int64)
+        self._prices = np.empty(0, dtype=np.float64)
+        if candles:
+            self.extend(candles)
+
+    def extend(self, candles: List[Candle]):
+        """
+        Add candles to the table. Existing candles opening at or after the first new candle are replaced,
+        so a candle which was still open when it was last fetched gets updated
+        :param candles: list of (open time in milliseconds, price) sorted by open time
+        :return: None
+        """
+        self.extend_arrays(*candles_to_arrays(candles))
+
+    def extend_arrays(self, times: np.ndarray, prices: np.ndarray):
+        """
+        Array version of extend. Candles may be unsorted or repeated (e.g. from overlapping fetch windows),
+        in which case they are sorted and only the last price of each open time is kept
+        :param times: candle open times in milliseconds
+        :param prices: candle prices parallel to times
+        :return: None
+        """
+        if len(times) == 0:
+            return
+        if np.any(times[1:] <= times[:-1]):
+            # np.unique keeps the first occurrence, so search the reversed arrays to keep the last
+            times, idx = np.unique(times[::-1], return_index=True)
+            prices = prices[::-1][idx]
+        keep = int(np.searchsorted(self._times, times[0], side="left"))
+        self._times = np.concatenate((self._times[:keep], times))
+        self._prices = np.concatenate((self._prices[:keep], prices))
+
+    def price_at(self, timestamp: int) -> Optional[float]:
+        """
+        :param timestamp: transaction timestamp in seconds
+        :return: ETH price for the transaction, or None if the table is empty
+        """
+        if len(self._times) == 0:
+            return
+        idx = int(np.searchsorted(self._times, timestamp * 1000, side="left"))
+        return float(self._prices[min(idx, len(self._prices) - 1)])
+
+    def prices_at(self, timestamps: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Vectorised version of price_at, pricing a batch of transactions in one search
+        :param timestamps: transaction timestamps in seconds
+        :return: ETH price for each transaction, or None if the table is empty
+        """
+        if len(self._times) == 0:
+            return
+        idx = np.searchsorted(self._times, timestamps * 1000, side="left")
+        return self._prices[np.minimum(idx, len(self._prices) - 1)]
+
+    def candles_between(
+        self, after_time: Optional[int], until_time: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :param after_time: exclusive lower bound on the open time in milliseconds, unbounded if None
+        :param until_time: inclusive upper bound on the open time in milliseconds
+        :return: tuple of (open times, prices) arrays of the candles in range
+        """
+        start = 0
+        if after_time is not None:
+            start = int(np.searchsorted(self._times, after_time, side="right"))
+        end = int(np.searchsorted(self._times, until_time, side="right"))
+        return self._times[start:end], self._prices[start:end]
+
+    @property
+    def last_time(self) -> Optional[int]:
+        """
+        :return: open time in milliseconds of the last candle, or None if the table is empty
+        """
+        if len(self._times) == 0:
+            return
+        return int(self._times[-1])
+
+    @property
+    def last_price(self) -> Optional[float]:
+        """
+        :return: price of the last candle, or None if the table is empty
+        """
+        if len(self._prices) == 0:
+            return
+        return float(self._prices[-1])
+
+    def memory_usage(self) -> int:
+        """
+        :return: number of bytes used by the table
+        """
+        return self._times.nbytes + self._prices.nbytes
+
+    def __len__(self) -> int:
+        return len(self._times)
@@ -0,0 +1,77 @@
+import asyncio
+import time
+from typing import Optional, Dict, Any
+
+
+class TokenBucket:
+    """
+    Async token bucket rate limiter. Tokens refill continuously at `rate` per second up to `burst`,
+    and every call to acquire consumes one token (waiting for it if none are available).
+    Waiters are served in FIFO order.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0:
+            raise ValueError(f"rate must be positive, got rate={rate}")
+        self._rate = float(rate)
+        self._burst = max(1, int(burst))
+        self._tokens = float(self._burst)
+        self._last_refill = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+
+    @property
+    def rate(self) -> float:
+        return self._rate
+
+    @property
+    def burst(self) -> int:
+        return self._burst
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(
+            self._burst, self._tokens + (now - self._last_refill) * self._rate
+        )
+        self._last_refill = now
+
+    async def acquire(self) -> float:
+        """
+        Wait until a token is available and consume it
+        :return: number of seconds spent waiting for the token
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        waited = 0.0
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                wait = (1 - self._tokens) / self._rate
+                await asyncio.sleep(wait)
+                waited += wait
+                self._refill()
+            self._tokens -= 1
+        return waited
+
+    def try_acquire(self) -> bool:
+        """
+        Consume a token if one is available, without waiting
+        :return: whether a token was consumed
+        """
+        self._refill()
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+
+def token_bucket_from_config(config: Optional[Dict[str, Any]]) -> Optional[TokenBucket]:
+    """
+    Build a token bucket from an upstream config section (rate_limit in calls/sec, burst in calls)
+    :param config: upstream config section
+    :return: TokenBucket, or None if no rate limit is configured
+    """
+    config = config or {}
+    rate = config.get("rate_limit")
+    if rate is None:
+        return None
+    return TokenBucket(float(rate), int(config.get("burst", 1)))
@@ -0,0 +1,70 @@
+from typing import List, Any, Dict
+
+from prices import Candle
+
+
+class TokenTransfer:
+    """
+    Typed record of an Etherscan tokentx transfer, keeping only the fields needed to compute its fee
+    """
+
+    __slots__ = ("txn_hash", "block_number", "timestamp", "gas_price", "gas_used")
+
+    def __init__(
+        self,
+        txn_hash: str,
+        block_number: int,
+        timestamp: int,
+        gas_price: int,
+        gas_used: int,
+    ):
+        self.txn_hash = txn_hash
+        self.block_number = block_number
+        self.timestamp = timestamp
+        self.gas_price = gas_price
+        self.gas_used = gas_used
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, TokenTransfer) and all(
+            getattr(self, field) == getattr(other, field) for field in self.__slots__
+        )
+
+    def __repr__(self) -> str:
+        fields = " ".join(f"{field}={getattr(self, field)}" for field in self.__slots__)
+        return f"TokenTransfer({fields})"
+
+
+def decode_token_transfer(transfer: Dict[str, Any]) -> TokenTransfer:
+    """
+    Decode a transfer from an Etherscan tokentx response, converting its numeric fields
+    :param transfer: transfer from the result of a tokentx response
+    :return: TokenTransfer
+    """
+    txn_hash = transfer["hash"]
+    if txn_hash is None:
+        raise Exception("Transaction hash found to be None")
+    block_number = transfer.get("blockNumber")
+    return TokenTransfer(
+        str(txn_hash),
+        0 if block_number is None else int(block_number),
+        int(transfer["timeStamp"]),
+        int(transfer["gasPrice"]),
+        int(transfer["gasUsed"]),
+    )
+
+
+def decode_token_transfers(transfers: List[Dict[str, Any]]) -> List[TokenTransfer]:
+    """
+    :param transfers: result of an Etherscan tokentx response
+    :return: list of TokenTransfer
+    """
+    return [decode_token_transfer(transfer) for transfer in transfers]
+
+
+def decode_klines(klines: List[List[Any]]) -> List[Candle]:
+    """
+    Decode a Binance klines response, keeping only the open time and open price of each kline
+    :param klines: Binance klines response
+    :return: list of (open time in milliseconds, price)
+    """
+    return [(int(kline[0]), float(kline[1])) for kline in klines]
@@ -0,0 +1,73 @@
+import json
+import logging
+from typing import Any, Callable
+
+from aiohttp import web
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_BACKENDS = ("auto", "orjson", "json")
+
+
+def _stdlib_dumps(obj: Any) -> bytes:
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+class JsonSerializer:
+    """
+    JSON encoder/decoder used for every HTTP request and response body. The orjson backend skips the
+    str round trip of the stdlib json module and encodes straight to bytes
+    """
+
+    def __init__(
+        self,
+        name: str,
+        dumps: Callable[[Any], bytes],
+        loads: Callable[[Any], Any],
+    ):
+        self.name = name
+        self.dumps = dumps
+        self.loads = loads
+
+    def response(self, data: Any, status: int = 200) -> web.Response:
+        """
+        Drop in replacement of web.json_response
+        :param data: object to encode as the response body
+        :param status: HTTP status of the response
+        :return: web response with a JSON body
+        """
+        return web.Response(
+            body=self.dumps(data), status=status, content_type="application/json"
+        )
+
+    def dumps_lines(self, objs: Any) -> bytes:
+        """
+        :param objs: iterable of objects to encode
+        :return: the objects encoded as newline delimited JSON
+        """
+        return b"".join(self.dumps(obj) + b"\n" for obj in objs)
+
+
+def create_json_serializer(
+    backend: str = "auto", logger: logging.Logger = None
+) -> JsonSerializer:
+    """
+    Build the JSON serializer for a backend
+    :param backend: orjson, json (stdlib), or auto to use orjson when it is installed and json otherwise
+    :param logger: logger to report the backend picked
+    :return: JsonSerializer
+    """
+    logger = logger or logging.getLogger("JsonSerializer")
+    if backend not in JSON_BACKENDS:
+        raise Exception(f"Unknown JSON backend={backend}")
+    if backend == "orjson" and orjson is None:
+        raise Exception("JSON backend=orjson requested but orjson is not installed")
+    if backend != "json" and orjson is not None:
+        serializer = JsonSerializer("orjson", orjson.dumps, orjson.loads)
+    else:
+        serializer = JsonSerializer("json", _stdlib_dumps, json.loads)
+    logger.info(f"Using JSON backend={serializer.name}")
+    return serializer
@@ -0,0 +1,104 @@
+import mmap
+import os
+import struct
+from typing import NamedTuple
+
+import numpy as np
+
+SNAPSHOT_MAGIC = b"TXFEESNP"
+SNAPSHOT_VERSION = 3
+# Version 1 snapshots have no timestamp column, and versions 1 and 2 store USD fees instead of gas costs in wei
+SUPPORTED_SNAPSHOT_VERSIONS = (1, 2, 3)
+# magic, version, reserved, number of entries, last ingested block
+_HEADER = struct.Struct("<8sIIQQ")
+
+HASH_DTYPE = np.dtype("S32")
+GAS_COST_DTYPE = np.dtype("<f8")
+BLOCK_DTYPE = np.dtype("<i8")
+TIMESTAMP_DTYPE = np.dtype("<i8")
+
+
+class Snapshot(NamedTuple):
+    hashes: np.ndarray
+    gas_costs: np.ndarray
+    blocks: np.ndarray
+    timestamps: np.ndarray
+    last_block: int
+    version: int
+
+
+def write_snapshot(
+    path: str,
+    hashes: np.ndarray,
+    gas_costs: np.ndarray,
+    blocks: np.ndarray,
+    timestamps: np.ndarray,
+    last_block: int,
+):
+    """
+    Write a snapshot file: a fixed header followed by the sorted hash, gas cost, block number and timestamp
+    columns.
+    The file is written to a temporary path first and atomically moved into place
+    :param path: path of the snapshot file
+    :param hashes: sorted array of 32 byte hash keys
+    :param gas_costs: gas costs in wei parallel to hashes
+    :param blocks: block numbers parallel to hashes
+    :param timestamps: transaction timestamps (seconds) parallel to hashes
+    :param last_block: last block ingested when the snapshot was taken
+    :return: None
+    """
+    if not len(hashes) == len(gas_costs) == len(blocks) == len(timestamps):
+        raise ValueError("Snapshot columns must all have the same length")
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(
+            _HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, 0, len(hashes), last_block)
+        )
+        f.write(np.ascontiguousarray(hashes, dtype=HASH_DTYPE).tobytes())
+        f.write(np.ascontiguousarray(gas_costs, dtype=GAS_COST_DTYPE).tobytes())
+        f.write(np.ascontiguousarray(blocks, dtype=BLOCK_DTYPE).tobytes())
+        f.write(np.ascontiguousarray(timestamps, dtype=TIMESTAMP_DTYPE).tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path: str) -> Snapshot:
+    """
+    Memory map a snapshot file. The returned arrays are read-only views onto the mapping,
+    so nothing is read from disk until it is accessed
+    :param path: path of the snapshot file
+    :return: Snapshot
+    """
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(buffer) < _HEADER.size:
+        raise ValueError(f"Snapshot {path} is truncated")
+    magic, version, _, num_entries, last_block = _HEADER.unpack_from(buffer)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError(f"{path} is not a snapshot file")
+    if version not in SUPPORTED_SNAPSHOT_VERSIONS:
+        raise ValueError(f"Unsupported snapshot version={version} in {path}")
+    entry_size = HASH_DTYPE.itemsize + GAS_COST_DTYPE.itemsize + BLOCK_DTYPE.itemsize
+    if version >= 2:
+        entry_size += TIMESTAMP_DTYPE.itemsize
+    expected_size = _HEADER.size + num_entries * entry_size
+    if len(buffer) != expected_size:
+        raise ValueError(
+            f"Snapshot {path} has size={len(buffer)}, expected {expected_size}"
+        )
+    offset = _HEADER.size
+    hashes = np.frombuffer(buffer, HASH_DTYPE, num_entries, offset)
+    offset += hashes.nbytes
+    gas_costs = np.frombuffer(buffer, GAS_COST_DTYPE, num_entries, offset)
+    offset += gas_costs.nbytes
+    blocks = np.frombuffer(buffer, BLOCK_DTYPE, num_entries, offset)
+    offset += blocks.nbytes
+    if version >= 2:
+        timestamps = np.frombuffer(buffer, TIMESTAMP_DTYPE, num_entries, offset)
+    else:
+        timestamps = np.zeros(num_entries, dtype=TIMESTAMP_DTYPE)
+    return Snapshot(hashes, gas_costs, blocks, timestamps, last_block, version)
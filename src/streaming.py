@@ -0,0 +1,129 @@
+import json
+import re
+from typing import Optional, List, Any, Callable
+
+_WHITESPACE = b" \t\r\n"
+# End of an object element followed by the array separator or the end of the array
+_ELEMENT_END = re.compile(rb"}\s*([,\]])")
+
+
+class JsonArrayStreamDecoder:
+    """
+    Incremental decoder for the array of objects under a top-level key of a JSON object (e.g. the result
+    of an Etherscan response), fed one chunk of the body at a time. Every complete element is decoded as soon as
+    its bytes have arrived and the bytes consumed so far are dropped, so memory is bounded by the largest element
+    rather than the whole body. Element boundaries are found by searching for "}," or "}]" and confirmed by
+    decoding the element, so a brace inside a string only costs a failed decode.
+    If the value under the key is not an array (e.g. an error message), the rest of the body is buffered and
+    decoded in full on close
+    """
+
+    def __init__(self, key: str, loads: Callable[[bytes], Any] = json.loads):
+        self._key_pattern = re.compile(rb'"' + re.escape(key.encode()) + rb'"\s*:\s*')
+        self._loads = loads
+        self._buffer = bytearray()
+        # Body read before the key, kept to decode non-array values
+        self._prefix = bytearray()
+        self._found_key = False
+        self._is_array: Optional[bool] = None
+        self._element_start: Optional[int] = None
+        self._search_from = 0
+        self._done = False
+        self.value: Any = None
+
+    @property
+    def is_array(self) -> Optional[bool]:
+        """
+        :return: whether the value under the key is an array, or None if it has not been reached yet
+        """
+        return self._is_array
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        """
+        :param chunk: next chunk of the body
+        :return: list of the elements completed by this chunk
+        """
+        self._buffer += chunk
+        if self._done or self._is_array is False:
+            return []
+        if not self._found_key and not self._find_key():
+            return []
+        if self._is_array is None and not self._find_array_start():
+            return []
+        if not self._is_array:
+            return []
+        return self._decode_elements()
+
+    def _find_key(self) -> bool:
+        match = self._key_pattern.search(self._buffer)
+        if match is None:
+            return False
+        self._found_key = True
+        self._prefix = self._buffer[: match.start()]
+        del self._buffer[: match.end()]
+        return True
+
+    def _find_array_start(self) -> bool:
+        stripped = self._buffer.lstrip(_WHITESPACE)
+        if not stripped:
+            return False
+        self._is_array = stripped[:1] == b"["
+        if self._is_array:
+            self._buffer = bytearray(stripped[1:])
+            self._element_start = None
+        return True
+
+    def _decode_elements(self) -> List[Any]:
+        elements = []
+        # Offset of the first byte not consumed yet
+        consumed = 0
+        while not self._done:
+            if self._element_start is None:
+                start = consumed
+                while start < len(self._buffer) and self._buffer[start] in _WHITESPACE:
+                    start += 1
+                if start == len(self._buffer):
+                    break
+                if self._buffer[start] == ord("]"):
+                    self._done = True
+                    break
+                self._element_start = start
+                self._search_from = start
+            match = _ELEMENT_END.search(self._buffer, self._search_from)
+            if match is None:
+                break
+            try:
+                element = self._loads(
+                    self._buffer[self._element_start : match.start() + 1]
+                )
+            except ValueError:
+                # The candidate end was inside a string, so keep searching past it
+                self._search_from = match.start() + 1
+                continue
+            elements.append(element)
+            if match.group(1) == b"]":
+                self._done = True
+            self._element_start = None
+            consumed = match.end()
+        # Drop the consumed bytes once per chunk rather than once per element
+        if self._element_start is not None:
+            consumed = self._element_start
+            self._search_from -= consumed
+            self._element_start = 0
+        del self._buffer[:consumed]
+        return elements
+
+    def close(self):
+        """
+        Finish decoding once the whole body has been fed. For non-array values, the full body is decoded
+        and its value under the key is kept in value
+        :return: None
+        """
+        if self._is_array:
+            if not self._done:
+                raise ValueError("JSON body ended before the end of the array")
+            return
+        if not self._found_key:
+            raise ValueError("JSON body has no value under the key")
+        body = self._loads(bytes(self._prefix) + b'"key":' + bytes(self._buffer))
+        self.value = body.get("key") if isinstance(body, dict) else None
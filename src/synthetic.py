@@ -0,0 +1,112 @@
+from typing import List, Iterator
+
+import numpy as np
+
+from records import TokenTransfer
+
+
+class SyntheticChain:
+    """
+    Deterministic synthetic chain of Uniswap-style transfers for benchmarks and local upstream stand-ins.
+    Every block is generated on its own from (seed, block number), so any block range can be produced
+    in any order without keeping the chain in memory
+    """
+
+    def __init__(
+        self,
+        seed: int = 0,
+        start_block: int = 12376729,
+        start_timestamp: int = 1620250931,
+        block_time: int = 12,
+        transfers_per_block: float = 20,
+    ):
+        self.seed = seed
+        self.start_block = start_block
+        self.start_timestamp = start_timestamp
+        self.block_time = block_time
+        self.transfers_per_block = transfers_per_block
+
+    def block_timestamp(self, block_number: int) -> int:
+        """
+        :param block_number: block number
+        :return: timestamp of the block in seconds
+        """
+        return (
+            self.start_timestamp + (block_number - self.start_block) * self.block_time
+        )
+
+    def block_at(self, timestamp: int) -> int:
+        """
+        :param timestamp: timestamp in seconds
+        :return: last block mined at or before the timestamp (the first block for earlier timestamps)
+        """
+        return self.start_block + max(
+            0, (timestamp - self.start_timestamp) // self.block_time
+        )
+
+    def block_transfers(self, block_number: int) -> List[TokenTransfer]:
+        """
+        :param block_number: block number
+        :return: transfers of the block, empty before the start block
+        """
+        if block_number < self.start_block:
+            return []
+        rng = np.random.default_rng([self.seed, block_number])
+        num_transfers = int(rng.poisson(self.transfers_per_block))
+        if num_transfers == 0:
+            return []
+        digests = rng.bytes(32 * num_transfers).hex()
+        gas_prices = rng.integers(5 * 10**9, 200 * 10**9, num_transfers).tolist()
+        gas_used = rng.integers(21000, 500000, num_transfers).tolist()
+        timestamp = self.block_timestamp(block_number)
+        return [
+            TokenTransfer(
+                "0x" + digests[64 * i : 64 * (i + 1)],
+                block_number,
+                timestamp,
+                gas_prices[i],
+                gas_used[i],
+            )
+            for i in range(num_transfers)
+        ]
+
+    def transfers(self, start_block: int, end_block: int) -> Iterator[TokenTransfer]:
+        """
+        :param start_block: first block
+        :param end_block: last block (inclusive)
+        :return: iterator of the transfers of every block in the range, in block order
+        """
+        for block_number in range(start_block, end_block + 1):
+            yield from self.block_transfers(block_number)
+
+    def pages(
+        self, num_transfers: int, page_size: int = 10000
+    ) -> Iterator[List[TokenTransfer]]:
+        """
+        :param num_transfers: number of transfers to generate from the start block
+        :param page_size: number of transfers per page
+        :return: iterator of pages of transfers, like tokentx responses
+        """
+        page = []
+        remaining = num_transfers
+        block_number = self.start_block
+        while remaining > 0:
+            transfers = self.block_transfers(block_number)[:remaining]
+            block_number += 1
+            remaining -= len(transfers)
+            page.extend(transfers)
+            if len(page) >= page_size:
+                yield page
+                page = []
+        if page:
+            yield page
+
+
+def random_hashes(num_hashes: int, seed: int = 0) -> List[str]:
+    """
+    :param num_hashes: number of hashes
+    :param seed: random seed
+    :return: random 0x prefixed transaction hashes, practically never found in a synthetic chain
+    """
+    digests = np.random.default_rng([seed, 2**32]).bytes(32 * num_hashes).hex()
+    return ["0x" + digests[64 * i : 64 * (i + 1)] for i in range(num_hashes)]
@@ -1,51 +1,276 @@
 import asyncio
-import bisect
 import datetime
 import logging
-from typing import Optional, List, Any, Dict, Tuple
+import os
+import time
+from typing import Optional, List, Any, Dict, Iterator, Tuple, AsyncIterator, Callable
 
 import aiohttp
+import numpy as np
+
+from backfill import Backfiller, BlockRange
+from cache import LRUCache, NegativeCache, SingleFlight
+from checkpoint import BackfillCheckpoint
+from fee_store import create_fee_store, hash_to_key, key_to_hash
+from ingest import transfers_to_columns
+from kline_cache import KlineCache
+from metrics import MetricsRegistry
+from pools import Pool, pools_from_config
+from records import (
+    TokenTransfer,
+    decode_token_transfer,
+    decode_token_transfers,
+    decode_klines,
+)
+from prices import PriceTable, WEI_PER_ETH, KLINE_INTERVALS_MS, candles_to_arrays
+from streaming import JsonArrayStreamDecoder
+from upstream import UpstreamClient
+
+
+async def gather_or_cancel(*aws) -> List[Any]:
+    """
+    Like asyncio.gather, but if one awaitable fails, the others are cancelled (and awaited) instead of being left
+    running in the background
+    :param aws: awaitables to run concurrently
+    :return: list of their results, in order
+    """
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
 
 
 class TransactionFeeTracker:
     """
-    Main class for managing transaction fees and storing them in a dictionary
+    Main class for managing transaction fees. Gas costs are kept in a fee store (in memory or SQLite) and priced
+    in USD at lookup time against an in-memory ETH price table, so the price source can change without
+    re-ingesting transactions
     """
 
-    def __init__(self, api_key: str, logger: Optional[logging.Logger] = None):
+    # Maximum number of klines Binance returns per request
+    _BINANCE_KLINES_LIMIT = 1000
+
+    def __init__(
+        self,
+        api_key: str,
+        logger: Optional[logging.Logger] = None,
+        config: Optional[Dict[str, Any]] = None,
+        metrics: Optional[MetricsRegistry] = None,
+    ):
         self._logger = logger or logging.getLogger(self.__class__.__name__)
+        self._config = config or {}
         self._api_key = api_key
-        self._transaction_hash_to_fee_map = {}
-        self._latest_block_seen = 0
+        self._fee_store = create_fee_store(self._config.get("store"))
+        self._latest_block_seen = self._fee_store.latest_block()
         self._latest_price = None
         self._latest_price_last_updated = None
-        self._url = "https://api.etherscan.io/api"
-        self._binance_url = "https://api.binance.com/api/v3/klines"
+        self._price_table = PriceTable()
+        prices_config = self._config.get("prices") or {}
+        self._price_interval = prices_config.get("interval", "1m")
+        if self._price_interval not in KLINE_INTERVALS_MS:
+            raise Exception(f"Unknown price interval={self._price_interval}")
+        self._price_concurrency = int(prices_config.get("concurrency", 8))
+        self._price_max_retries = int(prices_config.get("max_retries", 3))
+        self._price_retry_backoff = float(prices_config.get("retry_backoff", 1.0))
+        self._prices_start_time = datetime.datetime.fromisoformat(
+            str(prices_config.get("start_time", "2021-05-01"))
+        )
+        self._kline_cache = None
+        kline_cache_dir = prices_config.get("cache_dir")
+        if kline_cache_dir is not None:
+            self._kline_cache = KlineCache(
+                os.path.join(kline_cache_dir, f"ETHUSDT_{self._price_interval}.klines"),
+                KLINE_INTERVALS_MS[self._price_interval],
+            )
+            self._load_kline_cache()
+        upstream_configs = self._config.get("upstreams") or {}
+        self._url = (upstream_configs.get("etherscan") or {}).get(
+            "url", "https://api.etherscan.io/api"
+        )
+        self._binance_url = (upstream_configs.get("binance") or {}).get(
+            "url", "https://api.binance.com/api/v3/klines"
+        )
+        self._fetch_limiter: Optional[asyncio.Semaphore] = None
+        # Block ranges which a backfill gave up on, by pool name, fetched again by retry_failed_ranges
+        self._failed_ranges: Dict[str, List[BlockRange]] = {}
+        self._checkpoints: Dict[str, BackfillCheckpoint] = {}
+        self._pools = pools_from_config(
+            self._config.get("pools"),
+            int((self._config.get("backfill") or {}).get("start_block", 0)),
+        )
+        # Etherscan returns at most this many transfers per tokentx query
+        self._max_results = int(
+            (self._config.get("backfill") or {}).get("max_results", 10000)
+        )
+        streaming_config = self._config.get("streaming") or {}
+        self._streaming = bool(streaming_config.get("enabled", False))
+        self._stream_batch_size = int(streaming_config.get("batch_size", 1000))
+        self._stream_chunk_size = int(streaming_config.get("chunk_size", 65536))
+        lazy_config = self._config.get("lazy") or {}
+        self._lazy = bool(lazy_config.get("enabled", False))
+        self._lazy_cache = LRUCache(int(lazy_config.get("cache_size", 100000)))
+        self._lazy_single_flight = SingleFlight()
+        negative_cache_config = self._config.get("negative_cache") or {}
+        self._negative_cache = NegativeCache(
+            int(negative_cache_config.get("max_size", 100000)),
+            float(negative_cache_config.get("ttl", 60)),
+        )
+        self._metrics = metrics or MetricsRegistry()
+        self._init_metrics()
+        self._upstreams = {
+            self._url: UpstreamClient(
+                "etherscan",
+                self._url,
+                upstream_configs.get("etherscan"),
+                metrics=self._metrics,
+            ),
+            self._binance_url: UpstreamClient(
+                "binance",
+                self._binance_url,
+                upstream_configs.get("binance"),
+                metrics=self._metrics,
+            ),
+        }
         self._logger.info(
-            f"TransactionFeeTracker created with url={self._url} binance_url={self._binance_url}"
+            f"TransactionFeeTracker created with url={self._url} binance_url={self._binance_url} "
+            f"pools={[pool.name for pool in self._pools]}"
         )
 
+    @property
+    def metrics(self) -> MetricsRegistry:
+        return self._metrics
+
+    def _init_metrics(self):
+        """
+        Register the tracker's metrics. Hot path series are resolved once here, and sizes are only
+        read at scrape time by a collector
+        :return: None
+        """
+        self._head_block: Optional[int] = None
+        self._backfill_start_time: Optional[float] = None
+        self._backfill_end_time: Optional[float] = None
+        lookups = self._metrics.counter(
+            "txfee_lookups", "Transaction fee lookups by result", ("result",)
+        )
+        self._lookup_hits = lookups.labels("hit")
+        self._lookup_misses = lookups.labels("miss")
+        self._backfill_blocks = self._metrics.counter(
+            "txfee_backfill_blocks", "Blocks backfilled"
+        ).labels()
+        store_entries = self._metrics.gauge(
+            "txfee_store_entries", "Transactions in the fee store"
+        )
+        store_bytes = self._metrics.gauge(
+            "txfee_store_bytes", "Estimated bytes used by the fee store"
+        )
+        price_table_bytes = self._metrics.gauge(
+            "txfee_price_table_bytes", "Bytes used by the ETH price table"
+        )
+        latest_block_seen = self._metrics.gauge(
+            "txfee_latest_block_seen", "Latest block ingested for every pool"
+        )
+        head_block = self._metrics.gauge(
+            "txfee_head_block", "Latest block of the chain, as of the last poll"
+        )
+        ingestion_lag = self._metrics.gauge(
+            "txfee_ingestion_lag_blocks", "Head block minus the latest block ingested"
+        )
+        backfill_rate = self._metrics.gauge(
+            "txfee_backfill_blocks_per_second",
+            "Average backfill rate of the running (or last) backfill",
+        )
+        negative_cache_hits = self._metrics.counter(
+            "txfee_negative_cache_hits",
+            "Lookups of missing transactions answered by the negative cache",
+        ).labels()
+        negative_cache_misses = self._metrics.counter(
+            "txfee_negative_cache_misses",
+            "Lookups of missing transactions not in the negative cache yet",
+        ).labels()
+        negative_cache_entries = self._metrics.gauge(
+            "txfee_negative_cache_entries", "Transactions in the negative cache"
+        )
+
+        def collect():
+            num_entries = len(self._fee_store)
+            store_entries.set(num_entries)
+            store_bytes.set(num_entries * self._fee_store.bytes_per_entry())
+            price_table_bytes.set(self._price_table.memory_usage())
+            latest_block_seen.set(self._latest_block_seen)
+            # The negative cache keeps its own counts on the lookup path, copied here at scrape time
+            negative_cache_hits.value = self._negative_cache.hits
+            negative_cache_misses.value = self._negative_cache.misses
+            negative_cache_entries.set(len(self._negative_cache))
+            if self._head_block is not None:
+                head_block.set(self._head_block)
+                ingestion_lag.set(max(0, self._head_block - self._latest_block_seen))
+            if self._backfill_start_time is not None:
+                elapsed = (
+                    self._backfill_end_time or time.monotonic()
+                ) - self._backfill_start_time
+                if elapsed > 0:
+                    backfill_rate.set(self._backfill_blocks.value / elapsed)
+
+        self._metrics.add_collector(collect)
+
+    async def start(self):
+        """
+        Open the pooled upstream sessions. Call once at application startup before polling
+        :return: None
+        """
+        for upstream in self._upstreams.values():
+            await upstream.start()
+
+    async def close(self):
+        """
+        Close the pooled upstream sessions and the fee store. Call once at application shutdown
+        :return: None
+        """
+        for upstream in self._upstreams.values():
+            await upstream.close()
+        await self._fee_store.persist_async(self._get_durable_block())
+        self._fee_store.close()
+
     async def _make_get_request(
         self, url, params: Dict[Any, Any]
     ) -> Optional[Dict[Any, Any]]:
         """
-        Function for making GET requests, given a URL and some params (which can be empty dictionary)
+        Function for making GET requests, given a URL and some params (which can be empty dictionary).
+        Requests go through the pooled session of the upstream that owns the URL
         :param url: URL to send the request
         :param params: params to pass to the query
         :return: Return value of the query
         """
         self._logger.info(f"Making Request: params={params}")
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=params) as response:
-                    return await response.json()
-        except aiohttp.CLientError as e:
+            return await self._upstreams[url].get_json(params)
+        except aiohttp.ClientError as e:
             self._logger.error(
                 f"Unable to get data for url={url} request_params={params}, error={e}"
             )
         except Exception as e:
             self._logger.error(f"Error {e}")
 
+    async def _iter_response_chunks(
+        self, url, params: Dict[Any, Any]
+    ) -> AsyncIterator[bytes]:
+        """
+        Streaming version of _make_get_request, yielding the body of the response as it arrives.
+        Errors are left to the caller, since part of the body may already have been consumed
+        :param url: URL to send the request
+        :param params: params to pass to the query
+        :return: async iterator of body chunks
+        """
+        self._logger.info(f"Making Streaming Request: params={params}")
+        async for chunk in self._upstreams[url].iter_content(
+            params, self._stream_chunk_size
+        ):
+            yield chunk
+
     def _get_latest_block_params(self) -> Dict[str, Any]:
         """
         Hardcoded and fixed params for getting latest blocks
@@ -59,20 +284,25 @@ class TransactionFeeTracker:
         }
 
     def _get_historical_transactions_params(
-        self, start_block: int, end_block: Optional[int] = None
+        self,
+        start_block: int,
+        end_block: Optional[int] = None,
+        pool: Optional[Pool] = None,
     ) -> Dict[str, Any]:
         """
         Hardcoded and fixed params for getting historical transactions
         :param start_block: block number to start searching
         :param end_block: block number to stop searching
+        :param pool: pool to get the transfers of. Defaults to the first configured pool
         :return:
         """
+        pool = pool or self._pools[0]
         ret = {
             "module": "account",
             "action": "tokentx",
-            "contractaddress": "0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2",
-            "address": "0x88e6A0c2dDD26FEEb64F039a2c41296FcB3f5640",
-            "offset": 0,
+            "contractaddress": pool.token_address,
+            "address": pool.address,
+            "offset": self._max_results,
             "page": 1,
             "sort": "asc",
             "startblock": start_block,
@@ -82,21 +312,48 @@ class TransactionFeeTracker:
             ret["endblock"] = end_block
         return ret
 
+    def _get_transaction_receipt_params(self, transaction_hash: str) -> Dict[str, Any]:
+        """
+        Hardcoded and fixed params for getting a transaction receipt
+        :param transaction_hash: transaction hash
+        :return:
+        """
+        return {
+            "module": "proxy",
+            "action": "eth_getTransactionReceipt",
+            "txhash": transaction_hash,
+            "apikey": self._api_key,
+        }
+
+    def _get_block_by_number_params(self, block_number: int) -> Dict[str, Any]:
+        """
+        Hardcoded and fixed params for getting a block (without its transactions)
+        :param block_number: block number
+        :return:
+        """
+        return {
+            "module": "proxy",
+            "action": "eth_getBlockByNumber",
+            "tag": hex(block_number),
+            "boolean": "false",
+            "apikey": self._api_key,
+        }
+
     def _get_binance_pricing_params(
         self, start_time: datetime.datetime, end_time: datetime.datetime
     ):
         """
-        Hardcoded and fixed params for getting binance prices. We get daily prices only
+        Hardcoded and fixed params for getting binance prices, at the configured kline interval
         :param start_time: start time to get prices
         :param end_time: end time to get prices
         :return:
         """
         return {
             "symbol": "ETHUSDT",
-            "interval": "1d",
+            "interval": self._price_interval,
             "startTime": str(int(start_time.timestamp() * 1000)),
             "endTime": str(int(end_time.timestamp() * 1000)),
-            "limit": 1000,
+            "limit": self._BINANCE_KLINES_LIMIT,
         }
 
     async def get_latest_block(self) -> Optional[int]:
@@ -115,19 +372,28 @@ class TransactionFeeTracker:
             return
         self._logger.info(f"Returned latest block message: {response}")
         latest_block = int(response["result"])
+        self._head_block = latest_block
         self._logger.info(f"Latest block: {latest_block}")
         return latest_block
 
     async def get_historical_transactions(
-        self, up_until_block: Optional[int] = None
-    ) -> Optional[List[Any]]:
+        self,
+        up_until_block: Optional[int] = None,
+        start_block: Optional[int] = None,
+        pool: Optional[Pool] = None,
+    ) -> Optional[List[TokenTransfer]]:
         """
-        Function to get historical transactions up until a block (for uniswap v3 USDC/ETH transactions)
+        Function to get historical transactions of a pool up until a block.
+        Transfers are decoded into typed records as soon as the response arrives
         :param up_until_block: which block we want to run till
-        :return: A list of transactions
+        :param start_block: which block we want to start from. Defaults to the latest block seen
+        :param pool: pool to get the transfers of. Defaults to the first configured pool
+        :return: A list of transfers
         """
+        if start_block is None:
+            start_block = self._latest_block_seen
         params = self._get_historical_transactions_params(
-            self._latest_block_seen, up_until_block
+            start_block, up_until_block, pool
         )
         response = await self._make_get_request(self._url, params)
         if (
@@ -137,31 +403,275 @@ class TransactionFeeTracker:
         ):
             return
         transactions = response["result"]
+        if not isinstance(transactions, list):
+            self._logger.error(f"Unexpected tokentx result: {transactions}")
+            return
+        return decode_token_transfers(transactions)
+
+    async def stream_historical_transactions(
+        self,
+        ingest: Callable[[List[TokenTransfer]], None],
+        up_until_block: Optional[int] = None,
+        start_block: Optional[int] = None,
+        pool: Optional[Pool] = None,
+    ) -> Optional[int]:
+        """
+        Streaming version of get_historical_transactions. The result array is decoded incrementally as the
+        response arrives, and transfers are handed to ingest in batches of the configured batch size, so a
+        full page is never held in memory. Batches ingested before a failure are kept, which is harmless
+        since ingestion is idempotent and the block range is fetched again
+        :param ingest: callback receiving each batch of transfers
+        :param up_until_block: which block we want to run till
+        :param start_block: which block we want to start from. Defaults to the latest block seen
+        :param pool: pool to get the transfers of. Defaults to the first configured pool
+        :return: number of transfers ingested, or None if the query failed
+        """
+        if start_block is None:
+            start_block = self._latest_block_seen
+        params = self._get_historical_transactions_params(
+            start_block, up_until_block, pool
+        )
+        decoder = JsonArrayStreamDecoder(
+            "result", self._upstreams[self._url].json_loads
+        )
+        batch = []
+        num_transactions = 0
+        try:
+            async for chunk in self._iter_response_chunks(self._url, params):
+                batch.extend(
+                    decode_token_transfer(transfer) for transfer in decoder.feed(chunk)
+                )
+                if len(batch) >= self._stream_batch_size:
+                    ingest(batch)
+                    num_transactions += len(batch)
+                    batch = []
+            decoder.close()
+        except aiohttp.ClientError as e:
+            self._logger.error(
+                f"Unable to get data for url={self._url} request_params={params}, error={e}"
+            )
+            return
+        except Exception as e:
+            self._logger.error(f"Error {e}")
+            return
+        if not decoder.is_array:
+            self._logger.error(f"Unexpected tokentx result: {decoder.value}")
+            return
+        if batch:
+            ingest(batch)
+            num_transactions += len(batch)
+        return num_transactions
+
+    async def _fetch_transactions_page(
+        self, start_block: int, end_block: int, pool: Optional[Pool] = None
+    ) -> Optional[List[TokenTransfer]]:
+        """
+        Fetch one tokentx page of up to max_results transfers, decoding it incrementally in streaming mode.
+        The whole page is returned, so ingestion uses _stream_ingest_transactions instead in streaming mode
+        :param start_block: first block of the page
+        :param end_block: last block of the page
+        :param pool: pool to get the transfers of. Defaults to the first configured pool
+        :return: list of transfers, or None if the query failed
+        """
+        if not self._streaming:
+            return await self.get_historical_transactions(end_block, start_block, pool)
+        transactions = []
+        num_transactions = await self.stream_historical_transactions(
+            transactions.extend, end_block, start_block, pool
+        )
+        if num_transactions is None:
+            return
         return transactions
 
-    def _parse_historical_transactions(self, transactions: List[Dict[Any, Any]]):
+    async def iter_transaction_pages(
+        self, start_block: int, end_block: int, pool: Optional[Pool] = None
+    ) -> AsyncIterator[List[TokenTransfer]]:
+        """
+        Iterate over every transfer in an inclusive block range, one page at a time. A page which hits the result
+        cap is cut at its last block, and the next page starts from that block, skipping the transfers of it
+        which were already yielded (tokentx results are sorted). The next page is fetched while the current one
+        is being consumed
+        :param start_block: first block of the range
+        :param end_block: last block of the range
+        :param pool: pool to get the transfers of. Defaults to the first configured pool
+        :return: async iterator of lists of transfers, in block order
+        """
+        page_start_block, num_seen = start_block, 0
+        next_page = asyncio.ensure_future(
+            self._fetch_transactions_page(page_start_block, end_block, pool)
+        )
+        try:
+            while next_page is not None:
+                transactions = await next_page
+                next_page = None
+                if transactions is None:
+                    raise Exception(
+                        f"Could not fetch transactions from block={page_start_block} to block={end_block}"
+                        f" for pool={(pool or self._pools[0]).name}"
+                    )
+                page, skip = transactions, num_seen
+                if len(page) >= self._max_results:
+                    last_block = page[-1].block_number
+                    page_start_block, num_seen = self._get_next_page_start(
+                        page_start_block,
+                        last_block,
+                        sum(
+                            1
+                            for transfer in page
+                            if transfer.block_number == last_block
+                        ),
+                    )
+                    if page_start_block <= end_block:
+                        next_page = asyncio.ensure_future(
+                            self._fetch_transactions_page(
+                                page_start_block, end_block, pool
+                            )
+                        )
+                if skip:
+                    page = page[skip:]
+                if page:
+                    yield page
+        finally:
+            if next_page is not None:
+                next_page.cancel()
+
+    def _get_next_page_start(
+        self, page_start_block: int, last_block: int, num_last_block: int
+    ) -> Tuple[int, int]:
+        """
+        Where to resume after a page which hit the result cap: from its last block, which may have been cut,
+        skipping the transfers of it which were already returned
+        :param page_start_block: first block of the page
+        :param last_block: block of the last transfer of the page
+        :param num_last_block: number of transfers of the page in its last block
+        :return: (first block of the next page, number of transfers to skip at the start of it)
+        """
+        if last_block > page_start_block:
+            return last_block, num_last_block
+        self._logger.error(
+            f"Block={last_block} has more than max_results={self._max_results} transfers, "
+            f"skipping the rest of it"
+        )
+        return last_block + 1, 0
+
+    async def iter_transactions(
+        self, start_block: int, end_block: int, pool: Optional[Pool] = None
+    ) -> AsyncIterator[TokenTransfer]:
+        """
+        Iterate over every transfer in an inclusive block range, paginating past the result cap
+        (see iter_transaction_pages)
+        :param start_block: first block of the range
+        :param end_block: last block of the range
+        :param pool: pool to get the transfers of. Defaults to the first configured pool
+        :return: async iterator of transfers, in block order
+        """
+        async for page in self.iter_transaction_pages(start_block, end_block, pool):
+            for transfer in page:
+                yield transfer
+
+    async def _ingest_transactions(
+        self, start_block: int, end_block: int, pool: Optional[Pool] = None
+    ) -> int:
+        """
+        Fetch and ingest every transfer in an inclusive block range, one page at a time
+        :param start_block: first block of the range
+        :param end_block: last block of the range
+        :param pool: pool to get the transfers of. Defaults to the first configured pool
+        :return: number of transfers ingested
         """
-        Function to parse a list of transactions and record the fees of the transaction
-        :param transactions: list of transactions taken from get_historical_transactions
+        if self._streaming:
+            return await self._stream_ingest_transactions(start_block, end_block, pool)
+        num_transactions = 0
+        async for transactions in self.iter_transaction_pages(
+            start_block, end_block, pool
+        ):
+            self._parse_historical_transactions(transactions)
+            num_transactions += len(transactions)
+        return num_transactions
+
+    async def _stream_ingest_transactions(
+        self, start_block: int, end_block: int, pool: Optional[Pool] = None
+    ) -> int:
+        """
+        Streaming version of _ingest_transactions: every batch is ingested as soon as it is decoded, so at most
+        one batch of a page is held in memory. Only the size and the last block of each page are tracked for
+        the result cap, so unlike iter_transaction_pages the next page is not fetched ahead
+        :param start_block: first block of the range
+        :param end_block: last block of the range
+        :param pool: pool to get the transfers of. Defaults to the first configured pool
+        :return: number of transfers ingested
+        """
+        page_start_block, num_seen = start_block, 0
+        num_transactions = 0
+        while page_start_block <= end_block:
+            page_size, last_block, num_last_block, skip = 0, None, 0, num_seen
+
+            def ingest(batch: List[TokenTransfer]):
+                nonlocal page_size, last_block, num_last_block, skip, num_transactions
+                page_size += len(batch)
+                for transfer in batch:
+                    if transfer.block_number == last_block:
+                        num_last_block += 1
+                    else:
+                        last_block, num_last_block = transfer.block_number, 1
+                if skip:
+                    # Transfers of the previous page's last block, already ingested
+                    batch, skip = batch[skip:], max(0, skip - len(batch))
+                if batch:
+                    self._parse_historical_transactions(batch)
+                    num_transactions += len(batch)
+
+            if (
+                await self.stream_historical_transactions(
+                    ingest, end_block, page_start_block, pool
+                )
+                is None
+            ):
+                raise Exception(
+                    f"Could not fetch transactions from block={page_start_block} to block={end_block}"
+                    f" for pool={(pool or self._pools[0]).name}"
+                )
+            if page_size < self._max_results:
+                break
+            page_start_block, num_seen = self._get_next_page_start(
+                page_start_block, last_block, num_last_block
+            )
+        return num_transactions
+
+    def _parse_historical_transactions(self, transactions: List[TokenTransfer]):
+        """
+        Function to parse a list of transfers and record their gas costs. The page is converted into columnar
+        arrays and written to the fee store in one batch
+        :param transactions: list of transfers taken from get_historical_transactions
         :return: None
         """
-        for transaction in transactions:
-            if transaction["hash"] is None:
-                raise Exception("Transaction hash found to be None")
-            txn_hash = str(transaction["hash"]).lower()
-            gas_fee = (
-                int(transaction["gasPrice"]) * int(transaction["gasUsed"]) / 10**18
+        columns = transfers_to_columns(transactions)
+        self._fee_store.put_columns(
+            columns.keys, columns.gas_costs, columns.blocks, columns.timestamps
+        )
+
+    def _get_fetch_limiter(self) -> asyncio.Semaphore:
+        """
+        Shared scheduler of tokentx fetches: polls and backfill chunks of every pool wait on the same semaphore,
+        first come first served, so pools are interleaved rather than one pool starving the others.
+        Request pacing is left to the Etherscan rate limiter, which every pool shares
+        :return: asyncio.Semaphore
+        """
+        if self._fetch_limiter is None:
+            # Created lazily so that it belongs to the running event loop
+            self._fetch_limiter = asyncio.Semaphore(
+                int((self._config.get("backfill") or {}).get("concurrency", 4))
             )
-            if datetime.datetime.fromtimestamp(
-                int(transaction["timeStamp"])
-            ) - self._latest_price_last_updated > datetime.timedelta(days=1):
-                raise Exception("Stale ETH price")
-            txn_fee = gas_fee * self._latest_price
-            self._transaction_hash_to_fee_map[txn_hash] = txn_fee
+        return self._fetch_limiter
 
     async def poll_transactions(self):
         """
-        Function to poll transactions. Main call function in main loop
+        Function to poll transactions. Main call function in main loop.
+        The latest block is fetched once and every pool is polled up to it, never from below the pool's start block.
+        A gap larger than a backfill chunk (e.g. a fresh start without a backfill) is handed to the backfill engine,
+        which fetches it in concurrent chunks with retries and keeps the chunks which still fail aside for
+        retry_failed_ranges. The latest block seen only advances once every pool has been polled, so a failed pool
+        is polled again from the same block
         :return: None
         """
         latest_block = await self.get_latest_block()
@@ -172,64 +682,449 @@ class TransactionFeeTracker:
             self._logger.info(
                 f"Polling transactions... latest_block={latest_block}, latest_block_seen={self._latest_block_seen}"
             )
-            historical_transactions = await self.get_historical_transactions(
-                latest_block
+
+            chunk_size = int(
+                (self._config.get("backfill") or {}).get("chunk_size", 5000)
             )
-            self._parse_historical_transactions(historical_transactions)
+
+            async def poll_pool(pool: Pool):
+                start_block = max(self._latest_block_seen, pool.start_block)
+                if start_block > latest_block:
+                    return
+                if latest_block - start_block + 1 > chunk_size:
+                    failed_ranges = await self._get_backfiller(
+                        self._checkpoints.get(pool.name), pool
+                    ).run_ranges([(start_block, latest_block)])
+                    if failed_ranges:
+                        self._logger.error(
+                            f"Polling failed for pool={pool.name} block ranges: {failed_ranges}, "
+                            f"retrying them after the next polls"
+                        )
+                        self._failed_ranges[pool.name] = sorted(
+                            self._failed_ranges.get(pool.name, []) + failed_ranges
+                        )
+                    return
+                async with self._get_fetch_limiter():
+                    await self._ingest_transactions(start_block, latest_block, pool)
+
+            results = await asyncio.gather(
+                *(poll_pool(pool) for pool in self._pools), return_exceptions=True
+            )
+            errors = {
+                pool.name: result
+                for pool, result in zip(self._pools, results)
+                if isinstance(result, Exception)
+            }
+            if errors:
+                self._logger.error(f"Could not poll transactions due to {errors}")
+                return
             self._latest_block_seen = latest_block
+            self._negative_cache.invalidate(latest_block)
+
+    def _get_backfiller(
+        self,
+        checkpoint: Optional[BackfillCheckpoint] = None,
+        pool: Optional[Pool] = None,
+    ) -> Backfiller:
+        """
+        Build the backfill engine of a pool from the backfill section of the config
+        :param checkpoint: checkpoint to record completed block ranges in, if any
+        :param pool: pool to backfill. Defaults to the first configured pool
+        :return: Backfiller
+        """
+        pool = pool or self._pools[0]
+        backfill_config = self._config.get("backfill") or {}
+        checkpoint_interval = float(backfill_config.get("checkpoint_interval", 60))
+        last_checkpoint_time = time.monotonic()
+
+        async def fetch(start_block: int, end_block: int) -> int:
+            return await self._ingest_transactions(start_block, end_block, pool)
+
+        async def on_range_done(block_range: BlockRange):
+            nonlocal last_checkpoint_time
+            self._backfill_blocks.inc(block_range[1] - block_range[0] + 1)
+            if checkpoint is None:
+                return
+            checkpoint.mark_completed(block_range)
+            if time.monotonic() - last_checkpoint_time >= checkpoint_interval:
+                # Set first, so the other workers do not start saving too meanwhile
+                last_checkpoint_time = time.monotonic()
+                try:
+                    await self._save_checkpoints([checkpoint])
+                except Exception as e:
+                    self._logger.error(f"Unable to save backfill checkpoint due to {e}")
+
+        # Chunks are ingested page by page while they are fetched, paginating past the result cap
+        return Backfiller(
+            fetch,
+            None,
+            on_range_done,
+            chunk_size=int(backfill_config.get("chunk_size", 5000)),
+            concurrency=int(backfill_config.get("concurrency", 4)),
+            max_results=None,
+            max_retries=int(backfill_config.get("max_retries", 3)),
+            retry_backoff=float(backfill_config.get("retry_backoff", 1.0)),
+            limiter=self._get_fetch_limiter(),
+            logger=logging.getLogger(f"Backfiller-{pool.name}"),
+        )
+
+    def _get_checkpoint_path(self, pool: Pool) -> Optional[str]:
+        """
+        :param pool: pool to get the checkpoint path of
+        :return: configured checkpoint path suffixed with the pool name, so adding or removing pools never
+        changes the checkpoint of another pool
+        """
+        checkpoint_path = (self._config.get("backfill") or {}).get("checkpoint_path")
+        if checkpoint_path is None:
+            return
+        root, ext = os.path.splitext(checkpoint_path)
+        return f"{root}_{pool.name}{ext}"
+
+    def _migrate_legacy_checkpoint(self):
+        """
+        Move a checkpoint saved at the unsuffixed checkpoint path (by versions which only suffixed it with several
+        pools) to the checkpoint path of the first pool, the pool it was saved for
+        :return: None
+        """
+        checkpoint_path = (self._config.get("backfill") or {}).get("checkpoint_path")
+        if checkpoint_path is None or not os.path.exists(checkpoint_path):
+            return
+        pool_checkpoint_path = self._get_checkpoint_path(self._pools[0])
+        if os.path.exists(pool_checkpoint_path):
+            return
+        os.replace(checkpoint_path, pool_checkpoint_path)
+        self._logger.info(
+            f"Moved backfill checkpoint path={checkpoint_path} to path={pool_checkpoint_path} "
+            f"of pool={self._pools[0].name}"
+        )
+
+    def _load_checkpoint(
+        self, start_block: int, pool: Optional[Pool] = None
+    ) -> Optional[BackfillCheckpoint]:
+        """
+        Load the backfill checkpoint of a pool, or create a new one starting at start_block.
+        Checkpointing is only enabled when a checkpoint path is configured and the fee store is persistent,
+        since completed ranges are worthless if their fees are lost on restart
+        :param start_block: first block to backfill if there is no checkpoint yet
+        :param pool: pool to load the checkpoint of. Defaults to the first configured pool
+        :return: BackfillCheckpoint, or None if checkpointing is disabled
+        """
+        checkpoint_path = self._get_checkpoint_path(pool or self._pools[0])
+        if checkpoint_path is None:
+            return
+        if not self._fee_store.is_persistent:
+            self._logger.warning(
+                "Backfill checkpointing disabled as the fee store is not persistent"
+            )
+            return
+        checkpoint = BackfillCheckpoint.load(checkpoint_path)
+        if (
+            checkpoint is not None
+            and checkpoint.completed_ranges
+            and len(self._fee_store) == 0
+        ):
+            # e.g. a fee store from an older version which was discarded, so its ranges must be fetched again
+            self._logger.warning(
+                "Discarding backfill checkpoint as the fee store is empty"
+            )
+            checkpoint = None
+        if checkpoint is None:
+            return BackfillCheckpoint(
+                checkpoint_path, start_block, self._latest_block_seen
+            )
+        self._logger.info(
+            f"Resuming backfill from checkpoint path={checkpoint_path}: completed_ranges={checkpoint.completed_ranges} "
+            f"latest_block_seen={checkpoint.latest_block_seen}"
+        )
+        return checkpoint
+
+    def _get_durable_block(self) -> int:
+        """
+        :return: last block up to which every block has been ingested, i.e. the latest block seen unless
+        a backfill gave up on an earlier block range, which must then be fetched again after a restart
+        """
+        durable_block = self._latest_block_seen
+        for block_ranges in self._failed_ranges.values():
+            for start_block, _ in block_ranges:
+                durable_block = min(durable_block, start_block - 1)
+        return durable_block
+
+    async def _save_checkpoints(self, checkpoints: List[BackfillCheckpoint]):
+        """
+        Persist the fee store (off the event loop) and then the checkpoints, so a checkpoint never claims more than
+        what is durable
+        :param checkpoints: checkpoints to save
+        :return: None
+        """
+        durable_block = self._get_durable_block()
+        await self._fee_store.persist_async(durable_block)
+        for checkpoint in checkpoints:
+            checkpoint.latest_block_seen = durable_block
+            checkpoint.save()
 
     async def startup_polling(self):
         """
-        Function to start up the application. Backfills data (with roughly assumed rate limit)
+        Function to start up the application. Backfills every pool concurrently in block range chunks, interleaved
+        by the shared fetch scheduler and paced by the upstream rate limiters. Progress is tracked per pool: each pool
+        resumes from its own backfill checkpoint. A pool without one resumes from the last block durable in the fee
+        store, unless other pools have checkpoints, in which case it was added since and is backfilled from its own
+        start block. ETH prices are loaded into the price table at the same time
         :return: None
         """
         self._logger.info("Startup Polling")
         latest_block = await self.get_latest_block()
-        eth_prices = await self.get_eth_prices(
-            datetime.datetime(2021, 5, 1), datetime.datetime.utcnow()
-        )
-        while self._latest_block_seen < latest_block:
-            historical_transactions = await self.get_historical_transactions()
-            for transaction in historical_transactions:
-                txn_hash = str(transaction["hash"]).lower()
-                gas_fee = (
-                    int(transaction["gasPrice"]) * int(transaction["gasUsed"]) / 10**18
+        if latest_block is None:
+            raise Exception("Unable to get latest block for backfill")
+        latest_block_seen = self._latest_block_seen
+        self._migrate_legacy_checkpoint()
+        has_checkpoint = {
+            pool.name: self._get_checkpoint_path(pool) is not None
+            and os.path.exists(self._get_checkpoint_path(pool))
+            for pool in self._pools
+        }
+        checkpoints = []
+        backfills = []
+        for pool in self._pools:
+            if any(has_checkpoint.values()) and not has_checkpoint[pool.name]:
+                # Newly added pool, none of which is in the fee store yet
+                start_block = pool.start_block
+            else:
+                start_block = max(pool.start_block, self._latest_block_seen)
+            checkpoint = self._load_checkpoint(start_block, pool)
+            if checkpoint is None:
+                block_ranges = [(start_block, latest_block)]
+            else:
+                checkpoints.append(checkpoint)
+                self._checkpoints[pool.name] = checkpoint
+                latest_block_seen = max(latest_block_seen, checkpoint.latest_block_seen)
+                block_ranges = checkpoint.remaining(latest_block)
+            backfills.append(
+                self._get_backfiller(checkpoint, pool).run_ranges(block_ranges)
+            )
+        self._latest_block_seen = latest_block_seen
+        self._backfill_start_time, self._backfill_end_time = time.monotonic(), None
+        try:
+            # e.g. the backfills are cancelled once prices failed for good
+            _, *failed_ranges = await gather_or_cancel(
+                self.load_eth_prices(
+                    self._get_eth_prices_start_time(), datetime.datetime.utcnow()
+                ),
+                *backfills,
+            )
+        except Exception:
+            self._backfill_end_time = time.monotonic()
+            raise
+        for pool, pool_failed_ranges in zip(self._pools, failed_ranges):
+            if pool_failed_ranges:
+                self._logger.error(
+                    f"Backfill failed for pool={pool.name} block ranges: {pool_failed_ranges}, "
+                    f"retrying them after the next polls"
                 )
-                timestamp = int(transaction["timeStamp"]) * 1000
-                idx = bisect.bisect_left(eth_prices, (timestamp, -1))
-                price = eth_prices[idx][1]
-                self._transaction_hash_to_fee_map[txn_hash] = gas_fee * price
-            self._latest_block_seen = int(historical_transactions[-1]["blockNumber"])
-            await asyncio.sleep(1)  # To account for poor rate limits
-        self._latest_price = eth_prices[-1][1]
-        self._latest_price_last_updated = datetime.datetime.fromtimestamp(
-            int(eth_prices[-1][0] / 1000)
+                self._failed_ranges[pool.name] = pool_failed_ranges
+        self._backfill_end_time = time.monotonic()
+        # Polling carries on from the latest block, while failed ranges are kept aside for retry_failed_ranges
+        # and hold back the block recorded as durable
+        self._latest_block_seen = latest_block
+        if checkpoints:
+            await self._save_checkpoints(checkpoints)
+        self._logger.info(
+            f"Backfill done: entries={len(self._fee_store)} "
+            f"bytes_per_entry={self._fee_store.bytes_per_entry():.1f}"
+        )
+        if len(self._price_table) == 0:
+            raise Exception("Unable to get ETH prices")
+
+    async def retry_failed_ranges(self):
+        """
+        Backfill the block ranges which earlier backfills gave up on, keeping whatever fails again for the next call
+        :return: None
+        """
+        if not self._failed_ranges:
+            return
+        pools = [pool for pool in self._pools if self._failed_ranges.get(pool.name)]
+        self._logger.info(
+            f"Retrying failed backfill block ranges: {self._failed_ranges}"
         )
+        failed_ranges = await asyncio.gather(
+            *(
+                self._get_backfiller(self._checkpoints.get(pool.name), pool).run_ranges(
+                    self._failed_ranges[pool.name]
+                )
+                for pool in pools
+            )
+        )
+        for pool, pool_failed_ranges in zip(pools, failed_ranges):
+            if pool_failed_ranges:
+                self._failed_ranges[pool.name] = pool_failed_ranges
+            else:
+                self._failed_ranges.pop(pool.name, None)
+        if self._checkpoints:
+            await self._save_checkpoints(list(self._checkpoints.values()))
+
+    def _get_price_windows(
+        self, start_time: datetime.datetime, end_time: datetime.datetime
+    ) -> List[Tuple[datetime.datetime, datetime.datetime]]:
+        """
+        Split a time range into windows of at most one Binance request each
+        :param start_time: start time of prices
+        :param end_time: end time of prices
+        :return: list of (window start time, window end time)
+        """
+        interval = datetime.timedelta(
+            milliseconds=KLINE_INTERVALS_MS[self._price_interval]
+        )
+        ret = []
+        cur_time = start_time
+        while cur_time < end_time:
+            cur_end_time = min(
+                end_time, cur_time + interval * (self._BINANCE_KLINES_LIMIT - 1)
+            )
+            ret.append((cur_time, cur_end_time))
+            cur_time = cur_end_time + interval
+        return ret
 
     async def get_eth_prices(
         self, start_time: datetime.datetime, end_time: datetime.datetime
     ) -> List[Tuple[int, float]]:
         """
-        Function to get ETH prices from start time to end time (daily data)
+        Function to get ETH prices from start time to end time (at the configured kline interval)
         :param start_time: start time of prices
         :param end_time: end time of prices
         :return: list of tuples (timestamp, price)
+        :raises Exception: if a window could not be fetched, e.g. on a rate limit error payload
         """
         ret_candles = []
-        cur_time = start_time
-        while cur_time < end_time:
-            cur_end_time = min(end_time, cur_time + datetime.timedelta(days=990))
+        for cur_time, cur_end_time in self._get_price_windows(start_time, end_time):
             binance_params = self._get_binance_pricing_params(cur_time, cur_end_time)
             binance_prices = await self._make_get_request(
                 self._binance_url, binance_params
             )
-            binance_prices = [
-                (prices[0], float(prices[1])) for prices in binance_prices
-            ]
-            ret_candles.extend(binance_prices)
-            cur_time = cur_end_time + datetime.timedelta(days=1)
+            if not isinstance(binance_prices, list):
+                # None on a failed request, or an error payload such as {"code": -1003, "msg": ...}
+                raise Exception(
+                    f"Unable to get ETH prices from {cur_time} to {cur_end_time}: {binance_prices}"
+                )
+            ret_candles.extend(decode_klines(binance_prices))
         return ret_candles
 
+    def _load_kline_cache(self):
+        """
+        Load the klines of the local kline cache into the price table
+        :return: None
+        """
+        times, prices = self._kline_cache.load()
+        self._price_table.extend_arrays(times, prices)
+        self._update_latest_price()
+        self._logger.info(
+            f"Loaded kline cache path={self._kline_cache.path} candles={len(times)}"
+        )
+
+    def _save_kline_cache(self):
+        """
+        Append the closed klines of the price table which are not cached yet to the local kline cache
+        :return: None
+        """
+        if self._kline_cache is None:
+            return
+        interval_ms = KLINE_INTERVALS_MS[self._price_interval]
+        # The kline opening one interval ago may still be open, so only klines before it are cached
+        last_closed_time = int(time.time() * 1000) - 2 * interval_ms
+        self._kline_cache.append(
+            *self._price_table.candles_between(
+                self._kline_cache.last_time, last_closed_time
+            )
+        )
+
+    def _get_eth_prices_start_time(self) -> datetime.datetime:
+        """
+        :return: start time of the ETH prices which are not in the price table yet. The last candle of the table
+        may have still been open, so it is fetched again
+        """
+        if self._latest_price_last_updated is None:
+            return self._prices_start_time
+        return self._latest_price_last_updated
+
+    async def load_eth_prices(
+        self, start_time: datetime.datetime, end_time: datetime.datetime
+    ):
+        """
+        Load ETH prices from start time to end time into the price table. Windows are fetched concurrently
+        (paced by the Binance rate limiter) and each is converted to arrays as soon as it arrives,
+        so the full range is never held as Python objects. A failed window is retried up to max_retries times,
+        waiting retry_backoff * 2^attempt seconds before each retry
+        :param start_time: start time of prices
+        :param end_time: end time of prices
+        :return: None
+        :raises Exception: if a window still fails after its retries, in which case nothing is loaded
+        """
+        semaphore = asyncio.Semaphore(self._price_concurrency)
+
+        async def fetch_window(
+            window_start_time: datetime.datetime, window_end_time: datetime.datetime
+        ) -> Tuple[np.ndarray, np.ndarray]:
+            attempt = 0
+            while True:
+                try:
+                    async with semaphore:
+                        candles = await self.get_eth_prices(
+                            window_start_time, window_end_time
+                        )
+                    return candles_to_arrays(candles)
+                except Exception as e:
+                    if attempt >= self._price_max_retries:
+                        raise
+                    self._logger.warning(
+                        f"{e}, retrying ({attempt + 1}/{self._price_max_retries})"
+                    )
+                # Back off outside the semaphore, so other windows keep being fetched
+                await asyncio.sleep(self._price_retry_backoff * 2**attempt)
+                attempt += 1
+
+        # Once a window failed for good, the others are cancelled as their prices would be thrown away
+        windows = await gather_or_cancel(
+            *[
+                fetch_window(window_start_time, window_end_time)
+                for window_start_time, window_end_time in self._get_price_windows(
+                    start_time, end_time
+                )
+            ]
+        )
+        if not windows:
+            return
+        self._price_table.extend_arrays(
+            np.concatenate([times for times, _ in windows]),
+            np.concatenate([prices for _, prices in windows]),
+        )
+        self._update_latest_price()
+        self._save_kline_cache()
+        self._logger.info(
+            f"Loaded ETH prices: interval={self._price_interval} candles={len(self._price_table)} "
+            f"bytes={self._price_table.memory_usage()}"
+        )
+
+    def _update_latest_price(self):
+        """
+        Set the latest price from the last candle of the price table
+        :return: None
+        """
+        if len(self._price_table) == 0:
+            return
+        self._latest_price = self._price_table.last_price
+        self._latest_price_last_updated = datetime.datetime.fromtimestamp(
+            int(self._price_table.last_time / 1000)
+        )
+
+    async def poll_eth_prices(self):
+        """
+        Function to poll ETH prices, fetching every candle since the last one in the price table
+        (which may have still been open, so it is fetched again). Goes through load_eth_prices, so a large gap
+        (e.g. a fresh start without a backfill) is fetched concurrently with retries
+        :return: None
+        """
+        await self.load_eth_prices(
+            self._get_eth_prices_start_time(), datetime.datetime.utcnow()
+        )
+
     async def periodic_poll_transactions(self):
         """
         Main loop for polling transaction. Run this coroutine when using this class
@@ -239,54 +1134,294 @@ class TransactionFeeTracker:
         while True:
             try:
                 await self.poll_transactions()
+                await self.retry_failed_ranges()
             except Exception as e:
                 self._logger.error(f"Unable to poll transactions due to {e}")
             await asyncio.sleep(10)
 
     async def periodic_poll_eth_prices(self):
         """
-        Main loop for polling ETH prices. Run this coroutine when using this class
+        Main loop for polling ETH prices. Run this coroutine when using this class. Polls straight away,
+        so prices are loaded on startup even without a backfill
         :return:
         """
-        self._logger.info("Starting Periodic polling of ETH prices")
+        poll_interval = float(
+            (self._config.get("prices") or {}).get("poll_interval", 60)
+        )
+        self._logger.info(
+            f"Starting Periodic polling of ETH prices every {poll_interval}s"
+        )
         while True:
-            cur_timestamp = datetime.datetime.utcnow()
             try:
-                if (
-                    cur_timestamp
-                    > self._latest_price_last_updated + datetime.timedelta(days=1)
-                ):
-                    eth_prices = await self.get_eth_prices(
-                        start_time=self._latest_price_last_updated,
-                        end_time=cur_timestamp,
-                    )
-                    self._latest_price = eth_prices[-1][1]
-                    self._latest_price_last_updated = cur_timestamp.replace(
-                        hour=0, minute=0, second=0, microsecond=0
-                    )
+                await self.poll_eth_prices()
             except Exception as e:
                 self._logger.error(f"Unable to get ETH prices due to {e}")
+            await asyncio.sleep(poll_interval)
 
-            target = datetime.datetime.utcnow().replace(
-                hour=0, minute=0, second=0, microsecond=0
-            ) + datetime.timedelta(days=1)
-            sleep_duration = (target - cur_timestamp).seconds + 1
-            await asyncio.sleep(sleep_duration)
+    async def periodic_persist(self):
+        """
+        Main loop for persisting the fee store (e.g. writing the snapshot). Run this coroutine when using this class
+        :return:
+        """
+        persist_interval = float(
+            (self._config.get("store") or {}).get("persist_interval", 600)
+        )
+        self._logger.info(
+            f"Starting Periodic persisting of fee store every {persist_interval}s"
+        )
+        while True:
+            await asyncio.sleep(persist_interval)
+            try:
+                await self._fee_store.persist_async(self._get_durable_block())
+            except Exception as e:
+                self._logger.error(f"Unable to persist fee store due to {e}")
 
     def coros(self):
         """
         List of coroutines to run.
         :return:
         """
-        return [self.periodic_poll_transactions(), self.periodic_poll_eth_prices()]
+        return [
+            self.periodic_poll_transactions(),
+            self.periodic_poll_eth_prices(),
+            self.periodic_persist(),
+        ]
+
+    def _price_gas_cost(self, gas_cost: float, timestamp: int) -> Optional[float]:
+        """
+        Convert a gas cost into a USD transaction fee, priced against the price table
+        (or the latest price while the table is empty)
+        :param gas_cost: gas cost in wei
+        :param timestamp: transaction timestamp in seconds
+        :return: Transaction fee. none if there is no ETH price yet
+        """
+        price = self._price_table.price_at(timestamp)
+        if price is None:
+            price = self._latest_price
+        if price is None:
+            return
+        return gas_cost / WEI_PER_ETH * price
+
+    def _price_gas_costs(
+        self, gas_costs: np.ndarray, timestamps: np.ndarray
+    ) -> Optional[np.ndarray]:
+        """
+        Vectorised version of _price_gas_cost
+        :param gas_costs: gas costs in wei
+        :param timestamps: transaction timestamps in seconds parallel to gas_costs
+        :return: Transaction fees parallel to gas_costs. none if there is no ETH price yet
+        """
+        prices = self._price_table.prices_at(timestamps)
+        if prices is None:
+            if self._latest_price is None:
+                return
+            prices = self._latest_price
+        return gas_costs / WEI_PER_ETH * prices
 
     def get_transaction_fee(self, transaction_hash: str) -> Optional[float]:
         """
-        Main exposed function for application to use to query for transaction fee of a transaction hash
+        Main exposed function for application to use to query for transaction fee of a transaction hash.
+        Hashes which were not found are remembered in the negative cache until new blocks are seen
         :param transaction_hash: transaction hash for query
         :return: Transaction fee. none if does not exist
         """
+        txn_fee = self._get_transaction_fee(transaction_hash)
+        (self._lookup_misses if txn_fee is None else self._lookup_hits).inc()
+        return txn_fee
+
+    def _get_transaction_fee(self, transaction_hash: str) -> Optional[float]:
         if self._latest_block_seen == 0 or transaction_hash is None:
             return
-        transaction_hash = transaction_hash.lower()
-        return self._transaction_hash_to_fee_map.get(transaction_hash)
+        key = hash_to_key(transaction_hash)
+        if key is None or self._negative_cache.contains(key, self._latest_block_seen):
+            return
+        entry = self._fee_store.get(key)
+        if entry is None:
+            if not self._lazy:
+                self._negative_cache.put(key, self._latest_block_seen)
+            return
+        return self._price_gas_cost(*entry)
+
+    def get_transaction_fees(
+        self, transaction_hashes: List[str]
+    ) -> List[Optional[float]]:
+        """
+        Bulk version of get_transaction_fee, looking up every hash against the fee store in one batch
+        :param transaction_hashes: transaction hashes for query
+        :return: Transaction fees parallel to transaction_hashes. none for those which do not exist
+        """
+        if self._latest_block_seen == 0:
+            self._lookup_misses.inc(len(transaction_hashes))
+            return [None] * len(transaction_hashes)
+        keys = [
+            None if transaction_hash is None else hash_to_key(transaction_hash)
+            for transaction_hash in transaction_hashes
+        ]
+        entries = self._fee_store.get_many(keys)
+        found = [i for i, entry in enumerate(entries) if entry is not None]
+        ret = [None] * len(entries)
+        if not found:
+            self._lookup_misses.inc(len(entries))
+            return ret
+        txn_fees = self._price_gas_costs(
+            np.array([entries[i][0] for i in found], dtype=np.float64),
+            np.array([entries[i][1] for i in found], dtype=np.int64),
+        )
+        if txn_fees is None:
+            self._lookup_misses.inc(len(entries))
+            return ret
+        self._lookup_hits.inc(len(found))
+        self._lookup_misses.inc(len(entries) - len(found))
+        for i, txn_fee in zip(found, txn_fees.tolist()):
+            ret[i] = txn_fee
+        return ret
+
+    def iter_transaction_fees(
+        self,
+        from_block: Optional[int] = None,
+        to_block: Optional[int] = None,
+        from_timestamp: Optional[int] = None,
+        to_timestamp: Optional[int] = None,
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Iterate in batches over every transaction fee stored in an inclusive block and/or timestamp range
+        :param from_block: first block, unbounded if None
+        :param to_block: last block, unbounded if None
+        :param from_timestamp: first timestamp in seconds, unbounded if None
+        :param to_timestamp: last timestamp in seconds, unbounded if None
+        :return: iterator of lists of dictionaries with txn_hash, transaction_fee, block_number and timestamp
+        """
+        for records in self._fee_store.iter_range(
+            from_block, to_block, from_timestamp, to_timestamp
+        ):
+            keys, gas_costs, block_numbers, timestamps = zip(*records)
+            txn_fees = self._price_gas_costs(
+                np.array(gas_costs, dtype=np.float64),
+                np.array(timestamps, dtype=np.int64),
+            )
+            if txn_fees is None:
+                return
+            yield [
+                {
+                    "txn_hash": key_to_hash(key),
+                    "transaction_fee": txn_fee,
+                    "block_number": block_number,
+                    "timestamp": timestamp,
+                }
+                for key, txn_fee, block_number, timestamp in zip(
+                    keys, txn_fees.tolist(), block_numbers, timestamps
+                )
+            ]
+
+    async def _fetch_transaction_fee(self, transaction_hash: str) -> Optional[float]:
+        """
+        Function to get the fee of a single transaction straight from the upstreams: the transaction receipt,
+        the timestamp of its block and the ETH price of that time
+        :param transaction_hash: lowercased 0x prefixed transaction hash
+        :return: Transaction fee. none if the transaction does not exist or does not involve the pool
+        """
+        response = await self._make_get_request(
+            self._url, self._get_transaction_receipt_params(transaction_hash)
+        )
+        if not isinstance(response, dict) or "result" not in response:
+            return
+        receipt = response["result"]
+        if receipt is None:
+            # Unknown (or still pending) transaction, which may still be mined in a later block
+            self._negative_cache.put(
+                hash_to_key(transaction_hash), self._latest_block_seen
+            )
+            return
+        if not isinstance(receipt, dict):
+            # Error payload, e.g. {"status": "0", "result": "Max rate limit reached"}, so nothing is cached
+            self._logger.error(
+                f"Unable to get receipt of txn_hash={transaction_hash}: {receipt}"
+            )
+            return
+        pool_addresses = {pool.address.lower() for pool in self._pools}
+        if not any(
+            str(log.get("address", "")).lower() in pool_addresses
+            for log in receipt.get("logs") or []
+        ):
+            # Mined transaction which does not involve any pool, so it can never have a fee here
+            self._negative_cache.put(hash_to_key(transaction_hash))
+            return
+        try:
+            gas_fee = (
+                int(receipt["gasUsed"], 16)
+                * int(receipt["effectiveGasPrice"], 16)
+                / 10**18
+            )
+            block_number = int(receipt["blockNumber"], 16)
+        except (KeyError, TypeError, ValueError) as e:
+            self._logger.error(
+                f"Invalid receipt of txn_hash={transaction_hash}: missing or invalid {e}"
+            )
+            return
+
+        response = await self._make_get_request(
+            self._url, self._get_block_by_number_params(block_number)
+        )
+        if not isinstance(response, dict) or not isinstance(
+            response.get("result"), dict
+        ):
+            return
+        try:
+            timestamp = int(response["result"]["timestamp"], 16)
+        except (KeyError, TypeError, ValueError):
+            return
+        last_time = self._price_table.last_time
+        if last_time is not None and timestamp * 1000 <= last_time:
+            return gas_fee * self._price_table.price_at(timestamp)
+        # Same pricing as the price table: the first candle opening at or after the transaction
+        block_time = datetime.datetime.fromtimestamp(timestamp)
+        try:
+            eth_prices = await self.get_eth_prices(
+                block_time,
+                block_time
+                + datetime.timedelta(
+                    milliseconds=KLINE_INTERVALS_MS[self._price_interval]
+                ),
+            )
+        except Exception as e:
+            self._logger.error(f"{e}")
+            return
+        if not eth_prices:
+            return
+        return gas_fee * eth_prices[0][1]
+
+    async def lookup_transaction_fee(self, transaction_hash: str) -> Optional[float]:
+        """
+        Function for application to use to query for transaction fee of a transaction hash, falling back to
+        the upstreams on a miss when lazy mode is enabled. Lazily fetched fees are kept in a bounded LRU cache,
+        and concurrent misses for the same hash share a single upstream fetch
+        :param transaction_hash: transaction hash for query
+        :return: Transaction fee. none if does not exist
+        """
+        if not self._lazy:
+            return self.get_transaction_fee(transaction_hash)
+        txn_fee = await self._lookup_transaction_fee_lazy(transaction_hash)
+        (self._lookup_misses if txn_fee is None else self._lookup_hits).inc()
+        return txn_fee
+
+    async def _lookup_transaction_fee_lazy(
+        self, transaction_hash: str
+    ) -> Optional[float]:
+        if transaction_hash is None:
+            return
+        key = hash_to_key(transaction_hash)
+        if key is None or self._negative_cache.contains(key, self._latest_block_seen):
+            return
+        if self._latest_block_seen != 0:
+            entry = self._fee_store.get(key)
+            if entry is not None:
+                return self._price_gas_cost(*entry)
+        txn_fee = self._lazy_cache.get(key)
+        if txn_fee is not None:
+            return txn_fee
+        txn_fee = await self._lazy_single_flight.do(
+            key, lambda: self._fetch_transaction_fee(key_to_hash(key))
+        )
+        if txn_fee is not None:
+            self._lazy_cache.put(key, txn_fee)
+        return txn_fee
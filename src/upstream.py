@@ -0,0 +1,153 @@
+import logging
+import time
+from typing import Optional, Dict, Any, AsyncIterator, Callable
+
+import aiohttp
+from yarl import URL
+
+from metrics import MetricsRegistry
+from rate_limiter import token_bucket_from_config
+from serialization import create_json_serializer
+
+
+class UpstreamClient:
+    """
+    Long-lived, pooled HTTP client for a single upstream (e.g. Etherscan or Binance).
+    One session (and therefore one connection pool) is kept for the lifetime of the client, so keep-alive
+    connections and cached DNS lookups are shared across every request made to the upstream.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        url: str,
+        config: Optional[Dict[str, Any]] = None,
+        logger: Optional[logging.Logger] = None,
+        metrics: Optional[MetricsRegistry] = None,
+    ):
+        config = config or {}
+        self._logger = logger or logging.getLogger(f"{self.__class__.__name__}-{name}")
+        self.name = name
+        self.url = url
+        self._limit_per_host = int(config.get("limit_per_host", 10))
+        self._keepalive_timeout = float(config.get("keepalive_timeout", 30))
+        self._dns_cache_ttl = int(config.get("dns_cache_ttl", 300))
+        self._timeout = aiohttp.ClientTimeout(
+            total=float(config.get("total_timeout", 30)),
+            connect=float(config.get("connect_timeout", 10)),
+        )
+        self._rate_limiter = token_bucket_from_config(config)
+        self._json_loads = create_json_serializer(
+            config.get("json_backend", "auto"), self._logger
+        ).loads
+        self._session: Optional[aiohttp.ClientSession] = None
+        metrics = metrics or MetricsRegistry()
+        host = URL(url).host or name
+        self._request_seconds = metrics.histogram(
+            "txfee_upstream_request_seconds",
+            "Latency of upstream requests",
+            ("host",),
+        ).labels(host)
+        self._errors = metrics.counter(
+            "txfee_upstream_errors", "Failed upstream requests", ("host",)
+        ).labels(host)
+        self._rate_limit_waits = metrics.counter(
+            "txfee_upstream_rate_limit_waits",
+            "Upstream requests which waited on the rate limiter",
+            ("host",),
+        ).labels(host)
+        self._rate_limit_wait_seconds = metrics.counter(
+            "txfee_upstream_rate_limit_wait_seconds",
+            "Time spent waiting on the upstream rate limiter",
+            ("host",),
+        ).labels(host)
+
+    @property
+    def started(self) -> bool:
+        return self._session is not None and not self._session.closed
+
+    async def start(self):
+        """
+        Create the pooled session. Must be called from within the running event loop
+        :return: None
+        """
+        if self.started:
+            return
+        connector = aiohttp.TCPConnector(
+            limit_per_host=self._limit_per_host,
+            keepalive_timeout=self._keepalive_timeout,
+            use_dns_cache=True,
+            ttl_dns_cache=self._dns_cache_ttl,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector, timeout=self._timeout
+        )
+        self._logger.info(
+            f"Started session for url={self.url} limit_per_host={self._limit_per_host} "
+            f"keepalive_timeout={self._keepalive_timeout} dns_cache_ttl={self._dns_cache_ttl}"
+        )
+
+    async def close(self):
+        """
+        Close the pooled session and all of its connections
+        :return: None
+        """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    @property
+    def json_loads(self) -> Callable[[bytes], Any]:
+        return self._json_loads
+
+    async def _before_request(self):
+        if not self.started:
+            raise RuntimeError(f"Upstream {self.name} has not been started")
+        if self._rate_limiter is not None:
+            waited = await self._rate_limiter.acquire()
+            if waited > 0:
+                self._rate_limit_waits.inc()
+                self._rate_limit_wait_seconds.inc(waited)
+
+    async def get_json(self, params: Dict[Any, Any]) -> Any:
+        """
+        Send a GET request to the upstream over the pooled session, waiting on the upstream's rate limiter
+        :param params: params to pass to the query
+        :return: decoded JSON body of the response (decoded straight from bytes, with orjson if available)
+        """
+        await self._before_request()
+        start_time = time.perf_counter()
+        try:
+            async with self._session.get(self.url, params=params) as response:
+                if response.status >= 400:
+                    self._errors.inc()
+                return self._json_loads(await response.read())
+        except Exception:
+            self._errors.inc()
+            raise
+        finally:
+            self._request_seconds.observe(time.perf_counter() - start_time)
+
+    async def iter_content(
+        self, params: Dict[Any, Any], chunk_size: int = 65536
+    ) -> AsyncIterator[bytes]:
+        """
+        Streaming version of get_json: send a GET request and yield the response body as it arrives,
+        so large bodies never have to be held in memory at once
+        :param params: params to pass to the query
+        :param chunk_size: maximum number of bytes per chunk
+        :return: async iterator of body chunks
+        """
+        await self._before_request()
+        start_time = time.perf_counter()
+        try:
+            async with self._session.get(self.url, params=params) as response:
+                if response.status >= 400:
+                    self._errors.inc()
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    yield chunk
+        except Exception:
+            self._errors.inc()
+            raise
+        finally:
+            self._request_seconds.observe(time.perf_counter() - start_time)
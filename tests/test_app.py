@@ -0,0 +1,148 @@
+import asyncio
+import json
+
+import pytest
+import pytest_asyncio
+from aiohttp.test_utils import TestClient, TestServer
+
+from src.app import create_app, run_tracker
+from src.fee_store import hash_to_key
+from src.transaction_fee_tracker import TransactionFeeTracker
+
+TXN_HASH = "0x" + "ab" * 32
+UNKNOWN_TXN_HASH = "0x" + "cd" * 32
+
+
+class FakeTracker:
+
+    def __init__(self, fail_backfill=False):
+        self.fail_backfill = fail_backfill
+        self.backfill_done = asyncio.Event()
+        self.calls = []
+
+    async def startup_polling(self):
+        self.calls.append("startup_polling")
+        await self.backfill_done.wait()
+        if self.fail_backfill:
+            raise Exception("no prices")
+
+    async def poll(self):
+        self.calls.append("poll")
+
+    def coros(self):
+        return [self.poll()]
+
+
+@pytest_asyncio.fixture
+async def client():
+    web_app = create_app()
+    transaction_fee_tracker = TransactionFeeTracker(
+        "fake_api_key", metrics=web_app["metrics"]
+    )
+    transaction_fee_tracker._fee_store.put_many(
+        [(hash_to_key(TXN_HASH), 1.5 * 10**18, 10, 1000)]
+    )
+    transaction_fee_tracker._price_table.extend([(1000000, 1.0)])
+    transaction_fee_tracker._latest_block_seen = 10
+    web_app.on_startup.clear()
+    web_app.on_shutdown.clear()
+    web_app["transaction_fee_tracker"] = transaction_fee_tracker
+    web_app["max_batch_size"] = 3
+    async with TestClient(TestServer(web_app)) as client:
+        yield client
+
+
+class TestApp:
+
+    @pytest.mark.asyncio
+    async def test_transaction_fee(self, client):
+        response = await client.get("/transaction_fee", params={"txn_hash": TXN_HASH})
+        assert response.status == 200
+        assert await response.json() == {"message": 1.5}
+
+        response = await client.get("/transaction_fee", params={"txn_hash": "0x1"})
+        assert response.status == 400
+
+        response = await client.get("/transaction_fee")
+        assert response.status == 400
+
+    @pytest.mark.asyncio
+    async def test_transaction_fees(self, client):
+        response = await client.post(
+            "/transaction_fees", json=[TXN_HASH.upper(), "0x1", "wrong_hash"]
+        )
+        assert response.status == 200
+        assert await response.json() == {"message": [1.5, None, None]}
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "body", ['{"txn_hash": "0x1"}', "[1, 2]", "not json", '["1", "2", "3", "4"]']
+    )
+    async def test_transaction_fees_bad_request(self, client, body):
+        response = await client.post("/transaction_fees", data=body)
+        assert response.status == 400
+
+    @pytest.mark.asyncio
+    async def test_transaction_fees_export(self, client):
+        response = await client.get(
+            "/transaction_fees/export", params={"from_block": 5, "to_block": 10}
+        )
+        assert response.status == 200
+        assert response.content_type == "application/x-ndjson"
+        lines = (await response.text()).splitlines()
+        assert [json.loads(line) for line in lines] == [
+            {
+                "txn_hash": TXN_HASH,
+                "transaction_fee": 1.5,
+                "block_number": 10,
+                "timestamp": 1000,
+            }
+        ]
+
+        response = await client.get(
+            "/transaction_fees/export", params={"from_timestamp": 1001}
+        )
+        assert response.status == 200
+        assert await response.text() == ""
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("params", [{}, {"from_block": "abc"}])
+    async def test_transaction_fees_export_bad_request(self, client, params):
+        response = await client.get("/transaction_fees/export", params=params)
+        assert response.status == 400
+
+    @pytest.mark.asyncio
+    async def test_metrics(self, client):
+        await client.get("/transaction_fee", params={"txn_hash": TXN_HASH})
+        for _ in range(2):
+            await client.get("/transaction_fee", params={"txn_hash": UNKNOWN_TXN_HASH})
+        await client.post("/transaction_fees", json=[TXN_HASH, "0x2"])
+        client.app["transaction_fee_tracker"]._head_block = 15
+
+        response = await client.get("/metrics")
+        assert response.status == 200
+        assert response.content_type == "text/plain"
+        lines = set((await response.text()).splitlines())
+        assert 'txfee_http_request_seconds_count{route="/transaction_fee"} 3' in lines
+        assert 'txfee_http_request_seconds_count{route="/transaction_fees"} 1' in lines
+        assert 'txfee_lookups_total{result="hit"} 2' in lines
+        assert 'txfee_lookups_total{result="miss"} 3' in lines
+        assert "txfee_negative_cache_hits_total 1" in lines
+        assert "txfee_negative_cache_misses_total 1" in lines
+        assert "txfee_negative_cache_entries 1" in lines
+        assert "txfee_store_entries 1" in lines
+        assert "txfee_ingestion_lag_blocks 5" in lines
+        assert "# TYPE txfee_upstream_request_seconds histogram" in lines
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("fail_backfill", [False, True])
+    async def test_run_tracker_polls_after_backfill(self, fail_backfill):
+        web_app = create_app()
+        tracker = FakeTracker(fail_backfill)
+        task = asyncio.create_task(run_tracker(web_app, tracker, True))
+        await asyncio.sleep(0)
+        # Still backfilling, polling has not started
+        assert tracker.calls == ["startup_polling"]
+        tracker.backfill_done.set()
+        await asyncio.wait_for(task, 1)
+        assert tracker.calls == ["startup_polling", "poll"]
@@ -0,0 +1,132 @@
+import asyncio
+import time
+from typing import List, Tuple
+
+import pytest
+
+from src.backfill import Backfiller, partition_block_range
+
+
+class TestPartitionBlockRange:
+
+    @pytest.mark.parametrize(
+        "start_block, end_block, chunk_size, expected_ranges",
+        [
+            (0, 9, 5, [(0, 4), (5, 9)]),
+            (0, 10, 5, [(0, 4), (5, 9), (10, 10)]),
+            (3, 3, 5, [(3, 3)]),
+            (5, 4, 5, []),
+        ],
+    )
+    def test_partition_block_range(
+        self, start_block, end_block, chunk_size, expected_ranges
+    ):
+        assert (
+            partition_block_range(start_block, end_block, chunk_size) == expected_ranges
+        )
+
+    def test_partition_block_range_bad_chunk_size(self):
+        with pytest.raises(ValueError):
+            partition_block_range(0, 10, 0)
+
+
+class TestBackfiller:
+
+    @pytest.mark.asyncio
+    async def test_run_ingests_every_block(self):
+        ingested = []
+
+        async def fetch(start_block: int, end_block: int):
+            return list(range(start_block, end_block + 1))
+
+        backfiller = Backfiller(fetch, ingested.extend, chunk_size=7, concurrency=3)
+        assert await backfiller.run(10, 100) == []
+        assert sorted(ingested) == list(range(10, 101))
+
+    @pytest.mark.asyncio
+    async def test_run_splits_capped_ranges(self):
+        ingested = []
+        requested: List[Tuple[int, int]] = []
+
+        async def fetch(start_block: int, end_block: int):
+            requested.append((start_block, end_block))
+            return list(range(start_block, end_block + 1))[:4]
+
+        backfiller = Backfiller(fetch, ingested.extend, chunk_size=10, max_results=4)
+        assert await backfiller.run(0, 9) == []
+        assert sorted(ingested) == list(range(10))
+        assert (0, 9) in requested
+
+    @pytest.mark.asyncio
+    async def test_run_continues_past_failed_chunk(self):
+        ingested = []
+        attempts = []
+
+        async def fetch(start_block: int, end_block: int):
+            if start_block == 5:
+                attempts.append(start_block)
+                return "Max rate limit reached"
+            return list(range(start_block, end_block + 1))
+
+        backfiller = Backfiller(
+            fetch, ingested.extend, chunk_size=5, max_retries=2, retry_backoff=0
+        )
+        assert await backfiller.run(0, 14) == [(5, 9)]
+        assert sorted(ingested) == list(range(5)) + list(range(10, 15))
+        assert len(attempts) == 3
+
+    @pytest.mark.asyncio
+    async def test_run_backs_off_between_retries(self):
+        attempt_times = []
+
+        async def fetch(start_block: int, end_block: int):
+            attempt_times.append(time.monotonic())
+            return "Max rate limit reached"
+
+        backfiller = Backfiller(
+            fetch, list, chunk_size=5, max_retries=2, retry_backoff=0.02
+        )
+        assert await backfiller.run(0, 4) == [(0, 4)]
+        assert len(attempt_times) == 3
+        assert attempt_times[1] - attempt_times[0] >= 0.02
+        assert attempt_times[2] - attempt_times[1] >= 0.04
+
+    @pytest.mark.asyncio
+    async def test_run_with_streaming_fetch(self):
+        ingested = []
+        requested: List[Tuple[int, int]] = []
+
+        async def fetch(start_block: int, end_block: int):
+            requested.append((start_block, end_block))
+            transactions = list(range(start_block, end_block + 1))[:4]
+            ingested.extend(transactions)
+            return len(transactions)
+
+        backfiller = Backfiller(fetch, None, chunk_size=10, max_results=4)
+        assert await backfiller.run(0, 9) == []
+        assert set(ingested) == set(range(10))
+        assert (0, 9) in requested
+
+    @pytest.mark.asyncio
+    async def test_run_with_shared_limiter(self):
+        limiter = asyncio.Semaphore(2)
+        in_flight = 0
+        max_in_flight = 0
+
+        async def fetch(start_block: int, end_block: int):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0)
+            in_flight -= 1
+            return []
+
+        backfillers = [
+            Backfiller(fetch, list, chunk_size=1, concurrency=4, limiter=limiter)
+            for _ in range(3)
+        ]
+        results = await asyncio.gather(
+            *(backfiller.run(0, 9) for backfiller in backfillers)
+        )
+        assert results == [[], [], []]
+        assert max_in_flight == 2
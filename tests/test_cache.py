@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from src.cache import LRUCache, NegativeCache, SingleFlight
+
+
+class TestLRUCache:
+
+    def test_invalid_max_size(self):
+        with pytest.raises(ValueError):
+            LRUCache(0)
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        assert cache.get("a") == 1
+        cache.put("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        assert len(cache) == 2
+
+
+class TestNegativeCache:
+
+    def test_invalid_max_size(self):
+        with pytest.raises(ValueError):
+            NegativeCache(0, 60)
+
+    def test_valid_until_block(self):
+        cache = NegativeCache(10, 60)
+        cache.put("a", 100)
+        cache.put("b")
+        assert cache.contains("a", 100)
+        assert cache.contains("b", 100)
+        assert not cache.contains("c", 100)
+        assert not cache.contains("a", 101)
+        assert cache.contains("b", 101)
+        assert len(cache) == 1
+        assert cache.hits == 3
+        assert cache.misses == 2
+        assert cache.hit_rate == 3 / 5
+
+    def test_invalidate(self):
+        cache = NegativeCache(10, 60)
+        cache.put("a", 100)
+        cache.put("b", 101)
+        cache.put("c")
+        cache.invalidate(101)
+        assert len(cache) == 2
+        assert not cache.contains("a", 100)
+
+    def test_ttl(self):
+        cache = NegativeCache(10, 0)
+        cache.put("a")
+        assert not cache.contains("a", 0)
+
+    def test_max_size(self):
+        cache = NegativeCache(2, 60)
+        cache.put("a")
+        cache.put("b")
+        cache.put("c")
+        assert not cache.contains("a", 0)
+        assert cache.contains("b", 0)
+        assert cache.contains("c", 0)
+
+
+class TestSingleFlight:
+
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_are_shared(self):
+        single_flight = SingleFlight()
+        num_calls = 0
+
+        async def fetch():
+            nonlocal num_calls
+            num_calls += 1
+            await asyncio.sleep(0.01)
+            return num_calls
+
+        results = await asyncio.gather(
+            *[single_flight.do("key", fetch) for _ in range(5)],
+            single_flight.do("other_key", fetch),
+        )
+        assert num_calls == 2
+        assert results[:5] == [results[0]] * 5
+        assert len(single_flight) == 0
+
+        assert await single_flight.do("key", fetch) == 3
+
+    @pytest.mark.asyncio
+    async def test_exceptions_are_shared(self):
+        single_flight = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            raise ValueError("upstream failed")
+
+        results = await asyncio.gather(
+            single_flight.do("key", fetch),
+            single_flight.do("key", fetch),
+            return_exceptions=True,
+        )
+        assert all(isinstance(result, ValueError) for result in results)
@@ -0,0 +1,48 @@
+import pytest
+
+from src.checkpoint import BackfillCheckpoint
+
+
+class TestBackfillCheckpoint:
+
+    @pytest.mark.parametrize(
+        "completed_ranges, expected_ranges",
+        [
+            ([(0, 9)], [(0, 9)]),
+            ([(0, 9), (10, 19)], [(0, 19)]),
+            ([(10, 19), (0, 9)], [(0, 19)]),
+            ([(0, 9), (20, 29)], [(0, 9), (20, 29)]),
+            ([(0, 9), (20, 29), (5, 24)], [(0, 29)]),
+        ],
+    )
+    def test_mark_completed(self, completed_ranges, expected_ranges):
+        checkpoint = BackfillCheckpoint("checkpoint.json", 0)
+        for block_range in completed_ranges:
+            checkpoint.mark_completed(block_range)
+        assert checkpoint.completed_ranges == expected_ranges
+
+    @pytest.mark.parametrize(
+        "completed_ranges, end_block, expected_ranges",
+        [
+            ([], 100, [(10, 100)]),
+            ([(10, 100)], 100, []),
+            ([(10, 50)], 100, [(51, 100)]),
+            ([(20, 50)], 100, [(10, 19), (51, 100)]),
+            ([(20, 30), (40, 50)], 45, [(10, 19), (31, 39)]),
+            ([(20, 30), (200, 300)], 100, [(10, 19), (31, 100)]),
+        ],
+    )
+    def test_remaining(self, completed_ranges, end_block, expected_ranges):
+        checkpoint = BackfillCheckpoint("checkpoint.json", 10, 0, completed_ranges)
+        assert checkpoint.remaining(end_block) == expected_ranges
+
+    def test_save_and_load(self, tmp_path):
+        path = str(tmp_path / "checkpoint.json")
+        assert BackfillCheckpoint.load(path) is None
+        checkpoint = BackfillCheckpoint(path, 10, 5, [(10, 20), (30, 40)])
+        checkpoint.save()
+
+        checkpoint = BackfillCheckpoint.load(path)
+        assert checkpoint.start_block == 10
+        assert checkpoint.latest_block_seen == 5
+        assert checkpoint.completed_ranges == [(10, 20), (30, 40)]
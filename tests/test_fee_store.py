@@ -0,0 +1,359 @@
+import asyncio
+import struct
+
+import numpy as np
+import pytest
+
+from src.fee_store import (
+    HASH_KEY_DTYPE,
+    InMemoryFeeStore,
+    SqliteFeeStore,
+    create_fee_store,
+    hash_to_key,
+    key_to_hash,
+)
+
+KEY_1 = (1).to_bytes(32, "big")
+KEY_2 = (2).to_bytes(32, "big")
+KEY_3 = (3).to_bytes(32, "big")
+KEY_4 = (4).to_bytes(32, "big")
+TS = 1000
+
+
+@pytest.mark.parametrize(
+    "txn_hash, expected_key",
+    [
+        ("0x" + "ab" * 32, bytes([0xAB] * 32)),
+        ("0X" + "AB" * 32, bytes([0xAB] * 32)),
+        ("ab" * 32, bytes([0xAB] * 32)),
+        ("0x" + "12345".zfill(64), bytes(29) + bytes([0x01, 0x23, 0x45])),
+        ("0x12345", None),
+        ("0x" + "ab" * 31, None),
+        ("0x" + "ab" * 33, None),
+        ("wrong_hash", None),
+        ("0x" + "ab " * 21 + "a", None),
+        ("0x" + "ab" * 31 + "  ", None),
+        ("ab" * 30 + " ab ", None),
+        ("0x" + "zz" * 32, None),
+        ("", None),
+        ("0x", None),
+    ],
+)
+def test_hash_to_key(txn_hash, expected_key):
+    assert hash_to_key(txn_hash) == expected_key
+
+
+def test_key_to_hash():
+    txn_hash = "0x" + "ab" * 32
+    assert key_to_hash(hash_to_key(txn_hash.upper().replace("0X", "0x"))) == txn_hash
+
+
+class TestFeeStore:
+
+    @pytest.fixture(params=["memory", "sqlite"])
+    def fee_store(self, request, tmp_path):
+        if request.param == "memory":
+            fee_store = InMemoryFeeStore()
+        else:
+            fee_store = SqliteFeeStore(str(tmp_path / "fees.sqlite"))
+        yield fee_store
+        fee_store.close()
+
+    def test_empty(self, fee_store):
+        assert fee_store.get(KEY_1) is None
+        assert fee_store.latest_block() == 0
+        assert len(fee_store) == 0
+        assert fee_store.bytes_per_entry() == 0
+
+    def test_put_many(self, fee_store):
+        fee_store.put_many(
+            [(KEY_1, 1.5, 10, 1000), (KEY_2, 2.5, 12, 1000), (KEY_3, 3.5, None, 1000)]
+        )
+        fee_store.put_many([(KEY_1, 4.5, 11, 1000)])
+        assert fee_store.get(KEY_1) == (4.5, TS)
+        assert fee_store.get(KEY_3) == (3.5, TS)
+        assert fee_store.get(KEY_4) is None
+        assert len(fee_store) == 3
+        assert fee_store.bytes_per_entry() > 0
+
+    def test_put_columns(self, fee_store):
+        trailing_zero_key = bytes([0xAB] * 31) + bytes(1)
+        fee_store.put_columns(
+            np.array([KEY_1, trailing_zero_key], dtype=HASH_KEY_DTYPE),
+            np.array([1.5, 2.5]),
+            np.array([10, 12]),
+            np.array([1000, 1001]),
+        )
+        assert fee_store.get(KEY_1) == (1.5, TS)
+        assert fee_store.get(trailing_zero_key) == (2.5, 1001)
+        assert len(fee_store) == 2
+
+    def test_len_counts_new_keys_only(self, fee_store):
+        assert len(fee_store) == 0
+        fee_store.put_many(
+            [(KEY_1, 1.5, 10, 1000), (KEY_2, 2.5, 12, 1000), (KEY_1, 3.5, 13, 1000)]
+        )
+        assert len(fee_store) == 2
+        fee_store.put_columns(
+            np.array([KEY_2, KEY_3, KEY_3], dtype=HASH_KEY_DTYPE),
+            np.array([1.5, 2.5, 3.5]),
+            np.array([10, 12, 13]),
+            np.array([1000, 1001, 1002]),
+        )
+        assert len(fee_store) == 3
+        fee_store.persist(13)
+        fee_store.put_many([(KEY_3, 1.5, 14, 1000), (KEY_4, 2.5, 14, 1000)])
+        assert len(fee_store) == 4
+
+    def test_latest_block_is_last_persisted_block(self, fee_store):
+        # e.g. concurrent backfill chunks, with blocks 11 to 19 still missing
+        fee_store.put_many([(KEY_1, 1.5, 10, 1000), (KEY_2, 2.5, 20, 1000)])
+        assert fee_store.latest_block() == 0
+        fee_store.persist(10)
+        assert fee_store.latest_block() == 10
+
+    def test_sqlite_persists_across_restarts(self, tmp_path):
+        path = str(tmp_path / "fees.sqlite")
+        fee_store = SqliteFeeStore(path)
+        fee_store.put_many([(KEY_1, 1.5, 10, 1000), (KEY_2, 2.5, 20, 1000)])
+        fee_store.close()
+
+        fee_store = SqliteFeeStore(path)
+        assert fee_store.get(KEY_1) == (1.5, TS)
+        assert fee_store.latest_block() == 0
+        fee_store.persist(10)
+        fee_store.close()
+
+        fee_store = SqliteFeeStore(path)
+        assert fee_store.latest_block() == 10
+        fee_store.close()
+
+    def test_create_fee_store(self, tmp_path):
+        assert isinstance(create_fee_store(None), InMemoryFeeStore)
+        fee_store = create_fee_store(
+            {"backend": "sqlite", "path": str(tmp_path / "fees.sqlite")}
+        )
+        assert isinstance(fee_store, SqliteFeeStore)
+        fee_store.close()
+        with pytest.raises(Exception):
+            create_fee_store({"backend": "redis"})
+
+
+class TestInMemoryFeeStore:
+
+    def test_compact_merges_delta_into_segment(self):
+        fee_store = InMemoryFeeStore(delta_max_entries=3)
+        fee_store.put_many([(KEY_3, 3.5, 3, 1000), (KEY_1, 1.5, 1, 1000)])
+        assert len(fee_store._hashes) == 0
+        fee_store.put_many([(KEY_2, 2.5, 2, 1000)])
+        assert len(fee_store._hashes) == 3
+        assert len(fee_store._delta) == 0
+        assert list(fee_store._hashes) == sorted(fee_store._hashes)
+
+        fee_store.put_many([(KEY_2, 4.5, 4, 1000), (KEY_4, 5.5, 5, 1000)])
+        assert fee_store.get(KEY_2) == (4.5, TS)
+        assert len(fee_store) == 4
+        fee_store.compact()
+        assert fee_store.get(KEY_1) == (1.5, TS)
+        assert fee_store.get(KEY_2) == (4.5, TS)
+        assert fee_store.get(KEY_3) == (3.5, TS)
+        assert fee_store.get(KEY_4) == (5.5, TS)
+        assert len(fee_store) == 4
+
+    @pytest.mark.asyncio
+    async def test_compact_in_background_on_event_loop(self):
+        fee_store = InMemoryFeeStore(delta_max_entries=3)
+        fee_store.put_many([(KEY_3, 3.5, 3, 1000), (KEY_1, 1.5, 1, 1000)])
+        fee_store.put_many([(KEY_2, 2.5, 2, 1000)])
+        # The full delta is frozen and merged on a worker thread, lookups keep being served meanwhile
+        assert len(fee_store._delta) == 0
+        fee_store.put_many([(KEY_2, 4.5, 4, 1000), (KEY_4, 5.5, 5, 1000)])
+        assert fee_store.get(KEY_1) == (1.5, TS)
+        assert fee_store.get(KEY_2) == (4.5, TS)
+        assert fee_store.get_many([KEY_2, KEY_3]) == [(4.5, TS), (3.5, TS)]
+        assert len(fee_store) == 4
+        for _ in range(100):
+            if fee_store._compaction is None:
+                break
+            await asyncio.sleep(0.01)
+        assert fee_store._compaction is None
+        assert len(fee_store._frozen_delta) == 0
+        assert list(fee_store._hashes) == [KEY_1, KEY_2, KEY_3]
+        assert fee_store.get(KEY_2) == (4.5, TS)
+        assert len(fee_store) == 4
+        fee_store.close()
+
+    @pytest.mark.asyncio
+    async def test_len_across_compactions(self):
+        rng = np.random.default_rng(0)
+        fee_store = InMemoryFeeStore(delta_max_entries=7)
+        keys = set()
+        for _ in range(200):
+            batch = [
+                int(key).to_bytes(32, "big")
+                for key in rng.integers(0, 100, rng.integers(1, 5))
+            ]
+            fee_store.put_many([(key, 1.5, 1, 1000) for key in batch])
+            keys.update(batch)
+            assert len(fee_store) == len(keys)
+            if rng.random() < 0.3:
+                # Let background compactions finish, sometimes
+                await asyncio.sleep(0.001)
+        fee_store.compact()
+        assert len(fee_store) == len(fee_store._hashes) == len(keys)
+        fee_store.close()
+
+    def test_keys_with_trailing_zero_bytes(self):
+        key = bytes([0xAB] * 30) + bytes(2)
+        shorter_key = bytes([0xAB] * 31) + bytes(1)
+        fee_store = InMemoryFeeStore(delta_max_entries=1)
+        fee_store.put_many([(key, 1.5, 1, 1000)])
+        assert fee_store.get(key) == (1.5, TS)
+        assert fee_store.get(shorter_key) is None
+        assert fee_store.get(bytes([0xAB] * 30) + bytes([0, 1])) is None
+
+    def test_segment_is_smaller_than_delta(self):
+        records = [(i.to_bytes(32, "big"), float(i), i, i) for i in range(10000)]
+        fee_store = InMemoryFeeStore(delta_max_entries=len(records) + 1)
+        fee_store.put_many(records)
+        delta_bytes_per_entry = fee_store.bytes_per_entry()
+        fee_store.compact()
+        assert fee_store.bytes_per_entry() < delta_bytes_per_entry / 2
+
+    @pytest.mark.asyncio
+    async def test_persist_async_with_compaction_in_flight(self, tmp_path):
+        path = str(tmp_path / "fees.snapshot")
+        fee_store = InMemoryFeeStore(snapshot_path=path, delta_max_entries=3)
+        fee_store.put_many([(KEY_1, 1.5, 10, 1000), (KEY_2, 2.5, 11, 1000)])
+        fee_store.put_many([(KEY_3, 3.5, 12, 1000)])
+        fee_store.put_many([(KEY_1, 4.5, 13, 1000), (KEY_4, 5.5, 14, 1000)])
+        assert fee_store._compaction is not None
+        await fee_store.persist_async(15)
+        assert fee_store._compaction is None
+        assert len(fee_store._delta) == len(fee_store._frozen_delta) == 0
+        fee_store.close()
+
+        fee_store = InMemoryFeeStore(snapshot_path=path)
+        assert fee_store.latest_block() == 15
+        assert fee_store.get(KEY_1) == (4.5, TS)
+        assert fee_store.get(KEY_4) == (5.5, TS)
+        assert len(fee_store) == 4
+
+    @pytest.mark.asyncio
+    async def test_iter_range_does_not_compact(self):
+        fee_store = InMemoryFeeStore(delta_max_entries=3)
+        fee_store.put_many([(KEY_1, 1.5, 10, 1000), (KEY_2, 2.5, 11, 1000)])
+        fee_store.put_many([(KEY_3, 3.5, 12, 1000)])
+        fee_store.put_many([(KEY_2, 4.5, 13, 1000), (KEY_4, 5.5, 14, 1000)])
+        compaction = fee_store._compaction
+        records = [
+            record
+            for batch in fee_store.iter_range(from_block=11, batch_size=2)
+            for record in batch
+        ]
+        # The segment, frozen delta and delta are read as they are, without waiting for the merge
+        assert fee_store._compaction is compaction
+        assert len(fee_store._delta) == 2
+        assert sorted(records) == [
+            (KEY_2, 4.5, 13, 1000),
+            (KEY_3, 3.5, 12, 1000),
+            (KEY_4, 5.5, 14, 1000),
+        ]
+        fee_store.close()
+
+    def test_ignores_usd_fee_snapshot(self, tmp_path):
+        path = tmp_path / "fees.snapshot"
+        path.write_bytes(
+            struct.pack("<8sIIQQ", b"TXFEESNP", 2, 0, 1, 20)
+            + KEY_1
+            + np.array([1.5]).tobytes()
+            + np.array([10]).tobytes()
+            + np.array([TS]).tobytes()
+        )
+        fee_store = InMemoryFeeStore(snapshot_path=str(path))
+        assert len(fee_store) == 0
+        assert fee_store.latest_block() == 0
+
+    def test_snapshot_round_trip(self, tmp_path):
+        path = str(tmp_path / "fees.snapshot")
+        fee_store = InMemoryFeeStore(snapshot_path=path)
+        fee_store.put_many([(KEY_1, 1.5, 10, 1000), (KEY_2, 2.5, 12, 1000)])
+        fee_store.persist(15)
+
+        fee_store = InMemoryFeeStore(snapshot_path=path)
+        assert fee_store.latest_block() == 15
+        assert fee_store.get(KEY_1) == (1.5, TS)
+        assert fee_store.get(KEY_2) == (2.5, TS)
+        fee_store.put_many([(KEY_1, 4.5, 16, 1000), (KEY_3, 3.5, 17, 1000)])
+        fee_store.compact()
+        assert fee_store.get(KEY_1) == (4.5, TS)
+        assert fee_store.get(KEY_3) == (3.5, TS)
+        assert len(fee_store) == 3
+
+
+class TestGetMany:
+
+    @pytest.fixture(params=["memory", "sqlite"])
+    def fee_store(self, request, tmp_path):
+        if request.param == "memory":
+            fee_store = InMemoryFeeStore(delta_max_entries=3)
+        else:
+            fee_store = SqliteFeeStore(str(tmp_path / "fees.sqlite"))
+        yield fee_store
+        fee_store.close()
+
+    def test_get_many(self, fee_store):
+        assert fee_store.get_many([KEY_1, None]) == [None, None]
+        fee_store.put_many(
+            [(KEY_1, 1.5, 1, 1000), (KEY_2, 2.5, 2, 1000), (KEY_3, 3.5, 3, 1000)]
+        )
+        fee_store.put_many([(KEY_2, 4.5, 4, 1000)])
+        assert fee_store.get_many([KEY_3, KEY_4, None, KEY_2, KEY_1, KEY_3]) == [
+            (3.5, TS),
+            None,
+            None,
+            (4.5, TS),
+            (1.5, TS),
+            (3.5, TS),
+        ]
+
+
+class TestIterRange:
+
+    @pytest.fixture(params=["memory", "sqlite"])
+    def fee_store(self, request, tmp_path):
+        if request.param == "memory":
+            fee_store = InMemoryFeeStore(delta_max_entries=4)
+        else:
+            fee_store = SqliteFeeStore(str(tmp_path / "fees.sqlite"))
+        fee_store.put_many(
+            [
+                (KEY_1, 1.5, 10, 1000),
+                (KEY_2, 2.5, 11, 1010),
+                (KEY_3, 3.5, 12, 1020),
+                (KEY_4, 4.5, 13, 1030),
+            ]
+        )
+        fee_store.put_many([((5).to_bytes(32, "big"), 5.5, 14, 1040)])
+        yield fee_store
+        fee_store.close()
+
+    @pytest.mark.parametrize(
+        "bounds, expected_fees",
+        [
+            ({}, [1.5, 2.5, 3.5, 4.5, 5.5]),
+            ({"from_block": 12}, [3.5, 4.5, 5.5]),
+            ({"from_block": 11, "to_block": 13}, [2.5, 3.5, 4.5]),
+            ({"to_timestamp": 1010}, [1.5, 2.5]),
+            ({"from_block": 11, "to_timestamp": 1025}, [2.5, 3.5]),
+            ({"from_block": 20}, []),
+        ],
+    )
+    def test_iter_range(self, fee_store, bounds, expected_fees):
+        batches = list(fee_store.iter_range(**bounds, batch_size=2))
+        assert all(0 < len(batch) <= 2 for batch in batches)
+        records = sorted(record for batch in batches for record in batch)
+        assert [record[1] for record in records] == expected_fees
+        for key, gas_cost, block_number, timestamp in records:
+            assert fee_store.get(key) == (gas_cost, timestamp)
+            assert timestamp == 1000 + (block_number - 10) * 10
@@ -0,0 +1,40 @@
+import pytest
+
+from src.fee_store import hash_to_key
+from src.ingest import hashes_to_keys, transfers_to_columns
+from src.records import TokenTransfer
+
+HASH_1 = "0x" + "12345".zfill(64)
+HASH_2 = "0x" + "abcde".zfill(64)
+
+
+@pytest.mark.parametrize(
+    "txn_hashes",
+    [
+        ["0x" + "ab" * 32, "0X" + "CD" * 31 + "00"],
+        ["0x" + "12345".zfill(64), "abcde".zfill(64)],
+        ["0x" + "ab" * 32, "0X" + "12345".zfill(64)],
+    ],
+)
+def test_hashes_to_keys(txn_hashes):
+    keys = hashes_to_keys(txn_hashes)
+    assert keys.tobytes() == b"".join(hash_to_key(h) for h in txn_hashes)
+
+
+@pytest.mark.parametrize("txn_hash", [None, "wrong_hash", "0x12345", "0x" + "zz" * 32])
+def test_hashes_to_keys_invalid(txn_hash):
+    with pytest.raises(Exception):
+        hashes_to_keys(["0x" + "ab" * 32, txn_hash])
+
+
+def test_transfers_to_columns():
+    columns = transfers_to_columns(
+        [
+            TokenTransfer(HASH_1, 12376729, 1620250931, 100, 10**18),
+            TokenTransfer(HASH_2, 0, 5, 10**17, 1000),
+        ]
+    )
+    assert columns.keys.tobytes() == hash_to_key(HASH_1) + hash_to_key(HASH_2)
+    assert columns.gas_costs.tolist() == [100 * 10**18, 100 * 10**18]
+    assert columns.timestamps.tolist() == [1620250931, 5]
+    assert columns.blocks.tolist() == [12376729, 0]
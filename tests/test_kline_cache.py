@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from src.kline_cache import KlineCache
+
+
+class TestKlineCache:
+
+    def test_round_trip(self, tmp_path):
+        path = str(tmp_path / "klines" / "ETHUSDT_1m.klines")
+        kline_cache = KlineCache(path, 60000)
+        times, prices = kline_cache.load()
+        assert len(times) == 0 and len(prices) == 0
+        assert kline_cache.last_time is None
+
+        kline_cache.append(np.array([60000, 120000]), np.array([1.5, 2.5]))
+        kline_cache.append(np.array([120000, 180000]), np.array([3.5, 4.5]))
+        assert kline_cache.last_time == 180000
+
+        kline_cache = KlineCache(path, 60000)
+        times, prices = kline_cache.load()
+        assert times.tolist() == [60000, 120000, 180000]
+        assert prices.tolist() == [1.5, 2.5, 4.5]
+        assert kline_cache.last_time == 180000
+
+    def test_drops_partial_record(self, tmp_path):
+        path = tmp_path / "ETHUSDT_1m.klines"
+        kline_cache = KlineCache(str(path), 60000)
+        kline_cache.append(np.array([60000, 120000]), np.array([1.5, 2.5]))
+        path.write_bytes(path.read_bytes()[:-4])
+
+        kline_cache = KlineCache(str(path), 60000)
+        times, prices = kline_cache.load()
+        assert times.tolist() == [60000]
+        kline_cache.append(np.array([120000]), np.array([3.5]))
+        times, prices = KlineCache(str(path), 60000).load()
+        assert times.tolist() == [60000, 120000]
+        assert prices.tolist() == [1.5, 3.5]
+
+    @pytest.mark.parametrize(
+        "contents", [b"TXKL", b"NOTKLINES" * 4, b"TXKLINES" + bytes(16)]
+    )
+    def test_bad_file(self, tmp_path, contents):
+        path = tmp_path / "ETHUSDT_1m.klines"
+        path.write_bytes(contents)
+        with pytest.raises(ValueError):
+            KlineCache(str(path), 60000).load()
+
+    def test_interval_mismatch(self, tmp_path):
+        path = str(tmp_path / "ETHUSDT_1m.klines")
+        KlineCache(path, 60000).append(np.array([60000]), np.array([1.5]))
+        with pytest.raises(ValueError):
+            KlineCache(path, 86400000).load()
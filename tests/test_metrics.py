@@ -0,0 +1,44 @@
+import pytest
+
+from src.metrics import MetricsRegistry
+
+
+class TestMetricsRegistry:
+
+    def test_render(self):
+        metrics = MetricsRegistry()
+        counter = metrics.counter("requests", "Requests", ("route",))
+        counter.labels("/a").inc()
+        counter.labels("/a").inc(2)
+        counter.labels('/"b"').inc()
+        gauge = metrics.gauge("entries", "Entries")
+        metrics.add_collector(lambda: gauge.set(1.5))
+        histogram = metrics.histogram("latency", "Latency", buckets=(0.1, 1))
+        for value in (0.05, 0.1, 0.5, 5):
+            histogram.observe(value)
+
+        assert metrics.render().splitlines() == [
+            "# HELP requests Requests",
+            "# TYPE requests counter",
+            'requests_total{route="/a"} 3',
+            'requests_total{route="/\\"b\\""} 1',
+            "# HELP entries Entries",
+            "# TYPE entries gauge",
+            "entries 1.5",
+            "# HELP latency Latency",
+            "# TYPE latency histogram",
+            'latency_bucket{le="0.1"} 2',
+            'latency_bucket{le="1"} 3',
+            'latency_bucket{le="+Inf"} 4',
+            "latency_sum 5.65",
+            "latency_count 4",
+        ]
+
+    def test_register_returns_existing_metric(self):
+        metrics = MetricsRegistry()
+        counter = metrics.counter("requests", "Requests", ("route",))
+        assert metrics.counter("requests", "Requests", ("route",)) is counter
+        with pytest.raises(ValueError):
+            metrics.gauge("requests", "Requests")
+        with pytest.raises(ValueError):
+            counter.labels("/a", "extra")
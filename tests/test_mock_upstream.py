@@ -0,0 +1,169 @@
+import datetime
+import time
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from src.mock_upstream import create_mock_upstream_app, synthetic_price
+from src.transaction_fee_tracker import TransactionFeeTracker
+
+POOL_ADDRESS = "0x88e6A0c2dDD26FEEb64F039a2c41296FcB3f5640"
+TOKEN_ADDRESS = "0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2"
+START_BLOCK = 12376729
+
+
+def mock_config(**kwargs):
+    config = {
+        "start_block": START_BLOCK,
+        "initial_blocks": 50,
+        "transfers_per_block": 3,
+    }
+    config.update(kwargs)
+    return config
+
+
+def tokentx_params(**kwargs):
+    params = {
+        "module": "account",
+        "action": "tokentx",
+        "contractaddress": TOKEN_ADDRESS,
+        "address": POOL_ADDRESS,
+        "startblock": str(START_BLOCK),
+        "sort": "asc",
+    }
+    params.update(kwargs)
+    return params
+
+
+class TestMockUpstream:
+
+    @pytest.mark.asyncio
+    async def test_get_block_by_time(self):
+        async with TestClient(
+            TestServer(create_mock_upstream_app(mock_config()))
+        ) as client:
+            response = await client.get(
+                "/api",
+                params={
+                    "action": "getblocknobytime",
+                    "timestamp": str(int(time.time())),
+                },
+            )
+            body = await response.json()
+            assert body["status"] == "1"
+            assert START_BLOCK + 49 <= int(body["result"]) <= START_BLOCK + 51
+
+    @pytest.mark.asyncio
+    async def test_tokentx_pages(self):
+        async with TestClient(
+            TestServer(create_mock_upstream_app(mock_config()))
+        ) as client:
+            response = await client.get(
+                "/api", params=tokentx_params(endblock=str(START_BLOCK + 9))
+            )
+            transfers = (await response.json())["result"]
+            assert transfers
+            blocks = [int(transfer["blockNumber"]) for transfer in transfers]
+            assert blocks == sorted(blocks)
+            assert START_BLOCK <= blocks[0] and blocks[-1] <= START_BLOCK + 9
+            assert {"hash", "timeStamp", "gasPrice", "gasUsed"} <= set(transfers[0])
+
+            # Same chain on every request, paged with page and offset
+            response = await client.get(
+                "/api",
+                params=tokentx_params(
+                    endblock=str(START_BLOCK + 9), page="2", offset="2"
+                ),
+            )
+            assert (await response.json())["result"] == transfers[2:4]
+
+    @pytest.mark.asyncio
+    async def test_tokentx_result_cap(self):
+        web_app = create_mock_upstream_app(mock_config(max_results=5))
+        async with TestClient(TestServer(web_app)) as client:
+            response = await client.get("/api", params=tokentx_params(offset="5"))
+            assert len((await response.json())["result"]) == 5
+            response = await client.get(
+                "/api", params=tokentx_params(page="2", offset="5")
+            )
+            body = await response.json()
+            assert body["status"] == "0"
+            assert body["message"].startswith("Result window is too large")
+            response = await client.get(
+                "/api", params=tokentx_params(startblock=str(START_BLOCK + 10**6))
+            )
+            assert (await response.json())["message"] == "No transactions found"
+
+    @pytest.mark.asyncio
+    async def test_rate_limit(self):
+        web_app = create_mock_upstream_app(mock_config(rate_limit=0.001, burst=1))
+        async with TestClient(TestServer(web_app)) as client:
+            response = await client.get("/api", params=tokentx_params())
+            assert (await response.json())["status"] == "1"
+            response = await client.get("/api", params=tokentx_params())
+            body = await response.json()
+            assert body["status"] == "0"
+            assert body["result"].startswith("Max rate limit reached")
+            response = await client.get("/api/v3/klines", params={"interval": "1m"})
+            assert response.status == 429
+            stats = await (await client.get("/stats")).json()
+            assert stats["requests"] == {"tokentx": 2, "klines": 1}
+
+    @pytest.mark.asyncio
+    async def test_klines(self):
+        async with TestClient(
+            TestServer(create_mock_upstream_app(mock_config()))
+        ) as client:
+            start_time = 1620000000000
+            response = await client.get(
+                "/api/v3/klines",
+                params={
+                    "symbol": "ETHUSDT",
+                    "interval": "1m",
+                    "startTime": str(start_time),
+                    "endTime": str(start_time + 10 * 60000),
+                    "limit": "5",
+                },
+            )
+            klines = await response.json()
+            assert [kline[0] for kline in klines] == [
+                start_time + i * 60000 for i in range(5)
+            ]
+            assert float(klines[0][1]) == synthetic_price(start_time)
+
+    @pytest.mark.asyncio
+    async def test_tracker_end_to_end(self):
+        web_app = create_mock_upstream_app(mock_config())
+        async with TestServer(web_app) as server:
+            start_time = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+            tracker = TransactionFeeTracker(
+                "FAKE_API_KEY",
+                config={
+                    "pools": [
+                        {
+                            "name": "test",
+                            "address": POOL_ADDRESS,
+                            "token_address": TOKEN_ADDRESS,
+                            "start_block": START_BLOCK,
+                        }
+                    ],
+                    "backfill": {"chunk_size": 10, "max_results": 20},
+                    "prices": {"start_time": start_time.isoformat()},
+                    "upstreams": {
+                        "etherscan": {"url": str(server.make_url("/api"))},
+                        "binance": {"url": str(server.make_url("/api/v3/klines"))},
+                    },
+                },
+            )
+            await tracker.start()
+            try:
+                await tracker.startup_polling()
+            finally:
+                await tracker.close()
+            chain = web_app["mock_upstream"]._chain(POOL_ADDRESS)
+            transfers = list(chain.transfers(START_BLOCK, tracker._latest_block_seen))
+            assert len(tracker._fee_store) == len(transfers)
+            assert all(
+                tracker.get_transaction_fee(transfer.txn_hash) is not None
+                for transfer in transfers
+            )
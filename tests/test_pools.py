@@ -0,0 +1,38 @@
+import pytest
+
+from src.pools import DEFAULT_POOL, Pool, pools_from_config
+
+
+class TestPoolsFromConfig:
+
+    def test_default_pool(self):
+        assert pools_from_config(None, 100) == [DEFAULT_POOL._replace(start_block=100)]
+
+    def test_pools(self):
+        pools = pools_from_config(
+            [
+                {"name": "a", "address": "0x1", "token_address": "0x2"},
+                {
+                    "name": "b",
+                    "address": "0x3",
+                    "token_address": "0x4",
+                    "start_block": 7,
+                },
+            ],
+            5,
+        )
+        assert pools == [Pool("a", "0x1", "0x2", 5), Pool("b", "0x3", "0x4", 7)]
+
+    @pytest.mark.parametrize(
+        "pool_configs",
+        [
+            [{"name": "a", "address": "0x1"}],
+            [
+                {"name": "a", "address": "0x1", "token_address": "0x2"},
+                {"name": "a", "address": "0x3", "token_address": "0x4"},
+            ],
+        ],
+    )
+    def test_bad_pools(self, pool_configs):
+        with pytest.raises(Exception):
+            pools_from_config(pool_configs)
@@ -0,0 +1,36 @@
+import numpy as np
+
+from src.prices import PriceTable
+
+
+class TestPriceTable:
+
+    def test_empty(self):
+        price_table = PriceTable()
+        assert len(price_table) == 0
+        assert price_table.price_at(1) is None
+        assert price_table.prices_at(np.array([1])) is None
+
+    def test_price_at(self):
+        price_table = PriceTable([(1000, 1.0), (2000, 2.0), (3000, 3.0)])
+        assert [price_table.price_at(timestamp) for timestamp in range(5)] == [
+            1.0,
+            1.0,
+            2.0,
+            3.0,
+            3.0,
+        ]
+        assert price_table.prices_at(np.arange(5)).tolist() == [
+            1.0,
+            1.0,
+            2.0,
+            3.0,
+            3.0,
+        ]
+
+    def test_extend_replaces_overlapping_candles(self):
+        price_table = PriceTable([(1000, 1.0), (2000, 2.0)])
+        price_table.extend([(2000, 2.5), (3000, 3.0)])
+        assert len(price_table) == 3
+        assert price_table.price_at(2) == 2.5
+        assert price_table.price_at(3) == 3.0
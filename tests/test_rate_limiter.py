@@ -0,0 +1,40 @@
+import time
+
+import pytest
+
+from src.rate_limiter import TokenBucket, token_bucket_from_config
+
+
+class TestTokenBucket:
+
+    def test_invalid_rate(self):
+        with pytest.raises(ValueError):
+            TokenBucket(0)
+
+    def test_from_config(self):
+        assert token_bucket_from_config(None) is None
+        assert token_bucket_from_config({"burst": 3}) is None
+        bucket = token_bucket_from_config({"rate_limit": 5, "burst": 3})
+        assert bucket.rate == 5
+        assert bucket.burst == 3
+
+    @pytest.mark.asyncio
+    async def test_burst_is_not_throttled(self):
+        bucket = TokenBucket(1, burst=5)
+        for _ in range(5):
+            assert await bucket.acquire() == 0
+
+    @pytest.mark.asyncio
+    async def test_acquire_is_paced_at_rate(self):
+        bucket = TokenBucket(50, burst=1)
+        start = time.monotonic()
+        for _ in range(6):
+            await bucket.acquire()
+        # First token comes from the burst, the remaining 5 are paced at 50/s
+        assert time.monotonic() - start >= 5 / 50 * 0.9
+
+    def test_try_acquire(self):
+        bucket = TokenBucket(0.001, burst=2)
+        assert bucket.try_acquire()
+        assert bucket.try_acquire()
+        assert not bucket.try_acquire()
@@ -0,0 +1,57 @@
+import pytest
+
+from src.records import (
+    TokenTransfer,
+    decode_token_transfer,
+    decode_token_transfers,
+    decode_klines,
+)
+
+
+def test_decode_token_transfers():
+    transfers = decode_token_transfers(
+        [
+            {
+                "hash": "0x12345",
+                "gasPrice": "100",
+                "gasUsed": 10**18,
+                "timeStamp": "1620250931",
+                "blockNumber": "12376729",
+                "tokenSymbol": "WETH",
+            },
+            {"hash": "0xabcde", "gasPrice": 10**17, "gasUsed": "1000", "timeStamp": 5},
+        ]
+    )
+    assert transfers == [
+        TokenTransfer("0x12345", 12376729, 1620250931, 100, 10**18),
+        TokenTransfer("0xabcde", 0, 5, 10**17, 1000),
+    ]
+    assert not hasattr(transfers[0], "__dict__")
+
+
+@pytest.mark.parametrize(
+    "txn_hash, gas_price, gas_used, timestamp",
+    [
+        (None, 1, 1, 1),
+        ("0x12345", None, 1, 1),
+        ("0x12345", 1, None, 1),
+        ("0x12345", "10a10", 1, 1),
+        ("0x12345", 1, 1, None),
+    ],
+)
+def test_decode_token_transfer_bad_messages(txn_hash, gas_price, gas_used, timestamp):
+    with pytest.raises(Exception):
+        decode_token_transfer(
+            {
+                "hash": txn_hash,
+                "gasPrice": gas_price,
+                "gasUsed": gas_used,
+                "timeStamp": timestamp,
+            }
+        )
+
+
+def test_decode_klines():
+    assert decode_klines(
+        [[1000, "1.5", "2.0", "1.0", "1.8", "100.0", 1999], [2000, "1.8"]]
+    ) == [(1000, 1.5), (2000, 1.8)]
@@ -0,0 +1,44 @@
+import json
+
+import pytest
+
+from src import serialization
+from src.serialization import create_json_serializer
+
+ORJSON = pytest.param(
+    "orjson",
+    marks=pytest.mark.skipif(
+        serialization.orjson is None, reason="orjson is not installed"
+    ),
+)
+
+
+class TestJsonSerializer:
+
+    @pytest.mark.parametrize("backend", ["auto", ORJSON, "json"])
+    def test_response(self, backend):
+        json_serializer = create_json_serializer(backend)
+        response = json_serializer.response({"message": [1.5, None]}, status=400)
+        assert response.status == 400
+        assert response.content_type == "application/json"
+        assert json.loads(response.body) == {"message": [1.5, None]}
+        assert json_serializer.loads(b'{"a": [1]}') == {"a": [1]}
+
+    @pytest.mark.parametrize("backend", [ORJSON, "json"])
+    def test_dumps_lines(self, backend):
+        json_serializer = create_json_serializer(backend)
+        lines = json_serializer.dumps_lines([{"a": 1}, {"b": 2.5}])
+        assert [json.loads(line) for line in lines.splitlines()] == [
+            {"a": 1},
+            {"b": 2.5},
+        ]
+
+    def test_fallback_without_orjson(self, monkeypatch):
+        monkeypatch.setattr(serialization, "orjson", None)
+        assert create_json_serializer().name == "json"
+        with pytest.raises(Exception):
+            create_json_serializer("orjson")
+
+    def test_unknown_backend(self):
+        with pytest.raises(Exception):
+            create_json_serializer("ujson")
@@ -0,0 +1,78 @@
+import struct
+
+import numpy as np
+import pytest
+
+from src.snapshot import read_snapshot, write_snapshot
+
+
+class TestSnapshot:
+
+    def test_round_trip(self, tmp_path):
+        path = str(tmp_path / "fees.snapshot")
+        hashes = np.array(
+            [bytes([1] * 32), bytes([2] * 31) + bytes(1), bytes([3] * 32)],
+            dtype="S32",
+        )
+        gas_costs = np.array([1.5, 2.5, 3.5])
+        blocks = np.array([10, 11, 12])
+        timestamps = np.array([1000, 1001, 1002])
+        write_snapshot(path, hashes, gas_costs, blocks, timestamps, 20)
+
+        snapshot = read_snapshot(path)
+        assert snapshot.last_block == 20
+        assert snapshot.version == 3
+        assert list(snapshot.hashes) == list(hashes)
+        assert list(snapshot.gas_costs) == [1.5, 2.5, 3.5]
+        assert list(snapshot.blocks) == [10, 11, 12]
+        assert list(snapshot.timestamps) == [1000, 1001, 1002]
+        assert not snapshot.gas_costs.flags.writeable
+
+    def test_read_version_1(self, tmp_path):
+        path = tmp_path / "fees.snapshot"
+        path.write_bytes(
+            struct.pack("<8sIIQQ", b"TXFEESNP", 1, 0, 1, 20)
+            + bytes([1] * 32)
+            + np.array([1.5]).tobytes()
+            + np.array([10]).tobytes()
+        )
+        snapshot = read_snapshot(str(path))
+        assert snapshot.last_block == 20
+        assert snapshot.version == 1
+        assert list(snapshot.gas_costs) == [1.5]
+        assert list(snapshot.blocks) == [10]
+        assert list(snapshot.timestamps) == [0]
+
+    def test_empty(self, tmp_path):
+        path = str(tmp_path / "fees.snapshot")
+        write_snapshot(
+            path,
+            np.empty(0, dtype="S32"),
+            np.empty(0),
+            np.empty(0, dtype=int),
+            np.empty(0, dtype=int),
+            5,
+        )
+        snapshot = read_snapshot(path)
+        assert snapshot.last_block == 5
+        assert len(snapshot.hashes) == 0
+
+    def test_mismatched_columns(self, tmp_path):
+        with pytest.raises(ValueError):
+            write_snapshot(
+                str(tmp_path / "fees.snapshot"),
+                np.empty(1, dtype="S32"),
+                np.empty(2),
+                np.empty(1, dtype=int),
+                np.empty(1, dtype=int),
+                5,
+            )
+
+    @pytest.mark.parametrize(
+        "contents", [b"", b"NOTASNAPSHOT" * 4, b"TXFEESNP" + bytes(24) + b"extra"]
+    )
+    def test_bad_file(self, tmp_path, contents):
+        path = tmp_path / "fees.snapshot"
+        path.write_bytes(contents)
+        with pytest.raises(ValueError):
+            read_snapshot(str(path))
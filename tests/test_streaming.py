@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from src.streaming import JsonArrayStreamDecoder
+
+
+def feed_all(decoder: JsonArrayStreamDecoder, body: bytes, chunk_size: int):
+    elements = []
+    for i in range(0, len(body), chunk_size):
+        elements.extend(decoder.feed(body[i : i + chunk_size]))
+    decoder.close()
+    return elements
+
+
+class TestJsonArrayStreamDecoder:
+
+    @pytest.mark.parametrize("chunk_size", [1, 3, 64, 100000])
+    def test_decodes_every_element(self, chunk_size):
+        result = [
+            {"hash": f"0x{i}", "tokenName": "W},{ETH]" if i % 2 else "WETH"}
+            for i in range(20)
+        ]
+        result.append({"nested": {"a": [1, {"b": "}]"}]}})
+        body = json.dumps(
+            {"status": "1", "message": "OK", "result": result}, indent=1
+        ).encode()
+        decoder = JsonArrayStreamDecoder("result")
+        assert feed_all(decoder, body, chunk_size) == result
+        assert decoder.is_array
+
+    def test_elements_returned_as_they_complete(self):
+        decoder = JsonArrayStreamDecoder("result")
+        assert decoder.feed(b'{"result": [{"a": 1}, {"a"') == [{"a": 1}]
+        assert decoder.feed(b": 2}") == []
+        assert decoder.feed(b"]}") == [{"a": 2}]
+        decoder.close()
+
+    def test_empty_array(self):
+        decoder = JsonArrayStreamDecoder("result")
+        assert feed_all(decoder, b'{"status":"0","result":[]}', 2) == []
+        assert decoder.is_array
+
+    def test_non_array_value(self):
+        decoder = JsonArrayStreamDecoder("result")
+        body = b'{"status":"0","message":"NOTOK","result":"Max rate limit reached"}'
+        assert feed_all(decoder, body, 5) == []
+        assert decoder.is_array is False
+        assert decoder.value == "Max rate limit reached"
+
+    @pytest.mark.parametrize(
+        "body", [b'{"status":"1","result":[{"a":1},{"a"', b'{"status":"1"}']
+    )
+    def test_truncated_body(self, body):
+        decoder = JsonArrayStreamDecoder("result")
+        decoder.feed(body)
+        with pytest.raises(ValueError):
+            decoder.close()
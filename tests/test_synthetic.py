@@ -0,0 +1,44 @@
+from src.fee_store import hash_to_key
+from src.synthetic import SyntheticChain, random_hashes
+
+
+class TestSyntheticChain:
+
+    def test_blocks_are_deterministic(self):
+        chain = SyntheticChain(seed=1, start_block=100, transfers_per_block=5)
+        assert chain.block_transfers(105) == SyntheticChain(
+            seed=1, start_block=100, transfers_per_block=5
+        ).block_transfers(105)
+        assert chain.block_transfers(105) != SyntheticChain(
+            seed=2, start_block=100, transfers_per_block=5
+        ).block_transfers(105)
+        assert chain.block_transfers(99) == []
+
+    def test_transfers(self):
+        chain = SyntheticChain(
+            start_block=100, start_timestamp=1000, block_time=10, transfers_per_block=5
+        )
+        transfers = list(chain.transfers(100, 109))
+        assert [transfer.block_number for transfer in transfers] == sorted(
+            transfer.block_number for transfer in transfers
+        )
+        assert all(
+            transfer.timestamp == 1000 + (transfer.block_number - 100) * 10
+            and hash_to_key(transfer.txn_hash) is not None
+            for transfer in transfers
+        )
+        assert chain.block_at(1019) == 101
+        assert chain.block_at(0) == 100
+
+    def test_pages(self):
+        chain = SyntheticChain(transfers_per_block=5)
+        pages = list(chain.pages(1003, page_size=100))
+        assert sum(len(page) for page in pages) == 1003
+        assert all(len(page) >= 100 for page in pages[:-1])
+        txn_hashes = [transfer.txn_hash for page in pages for transfer in page]
+        assert len(set(txn_hashes)) == 1003
+
+    def test_random_hashes(self):
+        txn_hashes = random_hashes(10)
+        assert txn_hashes == random_hashes(10)
+        assert all(hash_to_key(txn_hash) is not None for txn_hash in txn_hashes)
@@ -1,10 +1,20 @@
+import asyncio
 import datetime
-from typing import Dict, Any, Optional, List
+import json
+import os
+from typing import Dict, Any, Optional, List, AsyncIterator
 
 import pytest
 
+from src.checkpoint import BackfillCheckpoint
+from src.fee_store import InMemoryFeeStore, hash_to_key
+from src.records import decode_token_transfers
 from src.transaction_fee_tracker import TransactionFeeTracker
 
+HASH_1 = "0x" + "12345".zfill(64)
+HASH_2 = "0x" + "abcde".zfill(64)
+HASH_3 = "0x" + "1".zfill(64)
+
 
 class MockTransactionFeeTracker(TransactionFeeTracker):
     _responses = []
@@ -18,23 +28,33 @@ class MockTransactionFeeTracker(TransactionFeeTracker):
     ) -> Optional[Dict[Any, Any]]:
         ret = self._responses[self._num_api_calls]
         self._num_api_calls += 1
+        await asyncio.sleep(0)
         return ret
 
+    async def _iter_response_chunks(
+        self, url, params: Dict[Any, Any]
+    ) -> AsyncIterator[bytes]:
+        body = json.dumps(self._responses[self._num_api_calls]).encode()
+        self._num_api_calls += 1
+        for i in range(0, len(body), 16):
+            await asyncio.sleep(0)
+            yield body[i : i + 16]
+
 
 class TestTransactionFeeTracker:
 
     def test_get_transaction_fee_empty(self):
         transaction_fee_tracker = MockTransactionFeeTracker("fake_api_key")
-        actual_txn_fee = transaction_fee_tracker.get_transaction_fee("0x12345")
+        actual_txn_fee = transaction_fee_tracker.get_transaction_fee(HASH_1)
         assert actual_txn_fee is None
 
     @pytest.mark.parametrize(
         "gas_price, gas_used, txn_hash",
         [
-            (None, 10**18, "0x12345"),
-            (1, None, "12345"),
+            (None, 10**18, HASH_1),
+            (1, None, HASH_1[2:]),
             (1, -(10**18), None),
-            ("10a10", 10**18, "0x12345"),
+            ("10a10", 10**18, HASH_1),
         ],
     )
     def test_parse_historical_transactions_with_bad_messages(
@@ -43,12 +63,14 @@ class TestTransactionFeeTracker:
         transaction_fee_tracker = MockTransactionFeeTracker("fake_api_key")
         with pytest.raises(Exception):
             transaction_fee_tracker._parse_historical_transactions(
-                [{"gasPrice": gas_price, "gasUsed": gas_used, "hash": txn_hash}]
+                decode_token_transfers(
+                    [{"gasPrice": gas_price, "gasUsed": gas_used, "hash": txn_hash}]
+                )
             )
 
     @pytest.mark.parametrize(
         "gas_price, gas_used, txn_hash, expected_txn_fee",
-        [("100", 10**18, "0x12345", 100), (10**17, "1000", "0x12345", 100)],
+        [("100", 10**18, HASH_1, 100), (10**17, "1000", HASH_1, 100)],
     )
     def test_parse_historical_transactions_with_non_integer_types(
         self, gas_price, gas_used, txn_hash, expected_txn_fee
@@ -60,14 +82,16 @@ class TestTransactionFeeTracker:
         transaction_fee_tracker._latest_price = 1
         transaction_fee_tracker._latest_block_seen = 100
         transaction_fee_tracker._parse_historical_transactions(
-            [
-                {
-                    "gasPrice": gas_price,
-                    "gasUsed": gas_used,
-                    "hash": txn_hash,
-                    "timeStamp": 1620250931,
-                }
-            ]
+            decode_token_transfers(
+                [
+                    {
+                        "gasPrice": gas_price,
+                        "gasUsed": gas_used,
+                        "hash": txn_hash,
+                        "timeStamp": 1620250931,
+                    }
+                ]
+            )
         )
         actual_txn_fee = transaction_fee_tracker.get_transaction_fee(txn_hash)
         assert expected_txn_fee == actual_txn_fee
@@ -102,9 +126,9 @@ class TestTransactionFeeTracker:
     @pytest.mark.parametrize(
         "gas_price, gas_used, txn_hash, expected_txn_fee",
         [
-            (100, 10**18, "0x12345", 100),
-            (-1, 10**18, "12345", -1),
-            (1, -(10**18), "abcde", -1),
+            (100, 10**18, HASH_1, 100),
+            (-1, 10**18, HASH_1[2:], -1),
+            (1, -(10**18), HASH_2[2:], -1),
         ],
     )
     async def test_get_transaction_fee(
@@ -137,3 +161,889 @@ class TestTransactionFeeTracker:
         assert actual_txn_fee == expected_txn_fee
         actual_txn_fee = transaction_fee_tracker.get_transaction_fee("wrong_hash")
         assert actual_txn_fee is None
+
+    @pytest.mark.asyncio
+    async def test_stream_historical_transactions(self):
+        transaction_fee_tracker = MockTransactionFeeTracker(
+            "fake_api_key", config={"streaming": {"enabled": True, "batch_size": 2}}
+        )
+        transaction_fee_tracker._latest_price = 1
+        response = {
+            "status": "1",
+            "result": [
+                {
+                    "gasPrice": "100",
+                    "gasUsed": str(10**16 * (i + 1)),
+                    "hash": f"0x{i:064x}",
+                    "timeStamp": "1620250931",
+                    "tokenName": "W}ETH",
+                }
+                for i in range(5)
+            ],
+        }
+        transaction_fee_tracker.set_request_responses(
+            [response, {"result": 100}, response]
+        )
+        batches = []
+        assert (
+            await transaction_fee_tracker.stream_historical_transactions(
+                batches.append, 100, 0
+            )
+            == 5
+        )
+        assert [len(batch) for batch in batches] == [2, 2, 1]
+        assert batches[0][0].txn_hash == f"0x{0:064x}"
+
+        await transaction_fee_tracker.poll_transactions()
+        assert transaction_fee_tracker._latest_block_seen == 100
+        assert [
+            transaction_fee_tracker.get_transaction_fee(f"0x{i:064x}") for i in range(5)
+        ] == [1, 2, 3, 4, 5]
+
+    @pytest.mark.asyncio
+    async def test_poll_transactions_streaming_error(self):
+        transaction_fee_tracker = MockTransactionFeeTracker(
+            "fake_api_key", config={"streaming": {"enabled": True}}
+        )
+        transaction_fee_tracker.set_request_responses(
+            [
+                {"result": 100},
+                {"status": "0", "result": "Max rate limit reached"},
+            ]
+        )
+        await transaction_fee_tracker.poll_transactions()
+        assert transaction_fee_tracker._num_api_calls == 2
+        assert transaction_fee_tracker._latest_block_seen == 0
+
+    @pytest.mark.asyncio
+    async def test_iter_transactions_paginates_past_result_cap(self, monkeypatch):
+        transaction_fee_tracker = MockTransactionFeeTracker(
+            "fake_api_key", config={"backfill": {"max_results": 3}}
+        )
+        requested_start_blocks = []
+        make_get_request = transaction_fee_tracker._make_get_request
+
+        async def record_get_request(url, params):
+            requested_start_blocks.append(params["startblock"])
+            assert params["offset"] == 3
+            return await make_get_request(url, params)
+
+        monkeypatch.setattr(
+            transaction_fee_tracker, "_make_get_request", record_get_request
+        )
+
+        def page(*transfers):
+            return {
+                "result": [
+                    {
+                        "blockNumber": block,
+                        "hash": txn_hash,
+                        "timeStamp": 1620250931,
+                        "gasPrice": 1,
+                        "gasUsed": 1,
+                    }
+                    for block, txn_hash in transfers
+                ]
+            }
+
+        transaction_fee_tracker.set_request_responses(
+            [
+                page((10, "0xa"), (11, "0xb"), (11, "0xc")),
+                page((11, "0xb"), (11, "0xc"), (12, "0xd")),
+                page((12, "0xd"), (13, "0xe")),
+            ]
+        )
+        txn_hashes = []
+        async for transfer in transaction_fee_tracker.iter_transactions(10, 20):
+            txn_hashes.append(transfer.txn_hash)
+            if transfer.txn_hash == "0xa":
+                # The next page is fetched while the current one is consumed
+                await asyncio.sleep(0)
+                assert transaction_fee_tracker._num_api_calls == 2
+        assert txn_hashes == ["0xa", "0xb", "0xc", "0xd", "0xe"]
+        assert requested_start_blocks == [10, 11, 12]
+
+    @pytest.mark.asyncio
+    async def test_stream_ingest_transactions_paginates_past_result_cap(
+        self, monkeypatch
+    ):
+        transaction_fee_tracker = MockTransactionFeeTracker(
+            "fake_api_key",
+            config={
+                "backfill": {"max_results": 3},
+                "streaming": {"enabled": True, "batch_size": 2},
+            },
+        )
+        requested_start_blocks = []
+        iter_response_chunks = transaction_fee_tracker._iter_response_chunks
+
+        def record_iter_response_chunks(url, params):
+            requested_start_blocks.append(params["startblock"])
+            return iter_response_chunks(url, params)
+
+        monkeypatch.setattr(
+            transaction_fee_tracker,
+            "_iter_response_chunks",
+            record_iter_response_chunks,
+        )
+        ingested = []
+        parse_historical_transactions = (
+            transaction_fee_tracker._parse_historical_transactions
+        )
+
+        def record_parse_historical_transactions(transactions):
+            ingested.append([transfer.txn_hash for transfer in transactions])
+            parse_historical_transactions(transactions)
+
+        monkeypatch.setattr(
+            transaction_fee_tracker,
+            "_parse_historical_transactions",
+            record_parse_historical_transactions,
+        )
+        hashes = {name: f"0x{name * 64}" for name in "abcde"}
+
+        def page(*transfers):
+            return {
+                "result": [
+                    {
+                        "blockNumber": block,
+                        "hash": hashes[name],
+                        "timeStamp": 1620250931,
+                        "gasPrice": 1,
+                        "gasUsed": 1,
+                    }
+                    for block, name in transfers
+                ]
+            }
+
+        transaction_fee_tracker.set_request_responses(
+            [
+                page((10, "a"), (11, "b"), (11, "c")),
+                page((11, "b"), (11, "c"), (12, "d")),
+                page((12, "d"), (13, "e")),
+            ]
+        )
+        assert await transaction_fee_tracker._ingest_transactions(10, 20) == 5
+        assert requested_start_blocks == [10, 11, 12]
+        # Ingested batch by batch, skipping the transfers already ingested from the previous page
+        assert ingested == [
+            [hashes["a"], hashes["b"]],
+            [hashes["c"]],
+            [hashes["d"]],
+            [hashes["e"]],
+        ]
+
+    @pytest.mark.asyncio
+    async def test_iter_transactions_block_over_result_cap(self):
+        transaction_fee_tracker = MockTransactionFeeTracker(
+            "fake_api_key", config={"backfill": {"max_results": 2}}
+        )
+        transfer = {"blockNumber": 5, "timeStamp": 1, "gasPrice": 1, "gasUsed": 1}
+        transaction_fee_tracker.set_request_responses(
+            [
+                {"result": [{**transfer, "hash": "0xa"}, {**transfer, "hash": "0xb"}]},
+                {"result": []},
+                {"result": "Max rate limit reached"},
+            ]
+        )
+        pages = [
+            page async for page in transaction_fee_tracker.iter_transaction_pages(5, 6)
+        ]
+        assert [len(page) for page in pages] == [2]
+        assert transaction_fee_tracker._num_api_calls == 2
+        with pytest.raises(Exception):
+            async for _ in transaction_fee_tracker.iter_transactions(5, 6):
+                pass
+
+    @pytest.mark.asyncio
+    async def test_poll_transactions_backfills_large_gap(self, monkeypatch):
+        transaction_fee_tracker = MockTransactionFeeTracker(
+            "fake_api_key",
+            config={
+                "pools": [
+                    {
+                        "name": "a",
+                        "address": "0xpoola",
+                        "token_address": "0xtoken",
+                        "start_block": 100,
+                    }
+                ],
+                "backfill": {"chunk_size": 50, "max_retries": 0, "retry_backoff": 0},
+            },
+        )
+        requested_block_ranges = []
+
+        async def get_historical_transactions(
+            up_until_block=None, start_block=None, pool=None
+        ):
+            requested_block_ranges.append((start_block, up_until_block))
+            if start_block == 150:
+                return
+            return []
+
+        monkeypatch.setattr(
+            transaction_fee_tracker,
+            "get_historical_transactions",
+            get_historical_transactions,
+        )
+        transaction_fee_tracker.set_request_responses([{"result": 220}])
+        await transaction_fee_tracker.poll_transactions()
+
+        # From the pool's start block, in chunks, with the failed chunk kept aside instead of failing the poll
+        assert sorted(requested_block_ranges) == [(100, 149), (150, 199), (200, 220)]
+        assert transaction_fee_tracker._latest_block_seen == 220
+        assert transaction_fee_tracker._failed_ranges == {"a": [(150, 199)]}
+        assert transaction_fee_tracker._get_durable_block() == 149
+
+    @pytest.mark.asyncio
+    async def test_poll_transactions_multiple_pools(self, monkeypatch):
+        transaction_fee_tracker = MockTransactionFeeTracker(
+            "fake_api_key",
+            config={
+                "pools": [
+                    {"name": "a", "address": "0xpoola", "token_address": "0xtoken"},
+                    {"name": "b", "address": "0xpoolb", "token_address": "0xtoken"},
+                ]
+            },
+        )
+        transaction_fee_tracker._latest_price = 1
+        requested = []
+        failing_pools = set()
+
+        async def make_get_request(url, params):
+            await asyncio.sleep(0)
+            requested.append(params.get("address", params["action"]))
+            if params["action"] == "getblocknobytime":
+                return {"result": 100}
+            if params["address"] in failing_pools:
+                return {"result": "Max rate limit reached"}
+            transfer = {
+                "hash": "0x" + params["address"][-1] * 64,
+                "gasPrice": 10**9,
+                "gasUsed": 10**9,
+                "timeStamp": 1620250931,
+                "blockNumber": 90,
+            }
+            return {"result": [transfer]}
+
+        monkeypatch.setattr(
+            transaction_fee_tracker, "_make_get_request", make_get_request
+        )
+        failing_pools.add("0xpoolb")
+        await transaction_fee_tracker.poll_transactions()
+        assert requested == ["getblocknobytime", "0xpoola", "0xpoolb"]
+        assert transaction_fee_tracker._latest_block_seen == 0
+
+        failing_pools.clear()
+        requested.clear()
+        await transaction_fee_tracker.poll_transactions()
+        assert requested == ["getblocknobytime", "0xpoola", "0xpoolb"]
+        assert transaction_fee_tracker._latest_block_seen == 100
+        assert transaction_fee_tracker.get_transaction_fee("0x" + "a" * 64) == 1
+        assert transaction_fee_tracker.get_transaction_fee("0x" + "b" * 64) == 1
+
+    def test_checkpoint_path_per_pool(self, tmp_path):
+        checkpoint_path = str(tmp_path / "checkpoint.json")
+        pools = [
+            {"name": "a", "address": "0x1", "token_address": "0x2"},
+            {"name": "b", "address": "0x3", "token_address": "0x2"},
+        ]
+        transaction_fee_tracker = MockTransactionFeeTracker(
+            "fake_api_key",
+            config={"pools": pools, "backfill": {"checkpoint_path": checkpoint_path}},
+        )
+        assert [
+            transaction_fee_tracker._get_checkpoint_path(pool)
+            for pool in transaction_fee_tracker._pools
+        ] == [str(tmp_path / "checkpoint_a.json"), str(tmp_path / "checkpoint_b.json")]
+        transaction_fee_tracker = MockTransactionFeeTracker(
+            "fake_api_key",
+            config={
+                "pools": pools[:1],
+                "backfill": {"checkpoint_path": checkpoint_path},
+            },
+        )
+        assert transaction_fee_tracker._get_checkpoint_path(
+            transaction_fee_tracker._pools[0]
+        ) == str(tmp_path / "checkpoint_a.json")
+
+    def test_get_transaction_fee_priced_at_lookup(self):
+        transaction_fee_tracker = MockTransactionFeeTracker("fake_api_key")
+        transaction_fee_tracker._latest_block_seen = 100
+        transaction_fee_tracker._parse_historical_transactions(
+            decode_token_transfers(
+                [
+                    {
+                        "gasPrice": 10**9,
+                        "gasUsed": 10**9,
+                        "hash": HASH_1,
+                        "timeStamp": 1620250931,
+                    }
+                ]
+            )
+        )
+        assert transaction_fee_tracker.get_transaction_fee(HASH_1) is None
+        transaction_fee_tracker._price_table.extend([(1620259200000, 4.0)])
+        assert transaction_fee_tracker.get_transaction_fee(HASH_1) == 4
+        transaction_fee_tracker._price_table.extend([(1620259200000, 5.0)])
+        assert transaction_fee_tracker.get_transaction_fee(HASH_1) == 5
+        assert transaction_fee_tracker.get_transaction_fees([HASH_1, HASH_3]) == [
+            5,
+            None,
+        ]
+
+    @pytest.mark.asyncio
+    async def test_startup_polling(self, monkeypatch):
+        async def get_eth_prices(start_time, end_time):
+            return [(1620172800000, 2.0), (1620259200000, 4.0)]
+
+        transaction_fee_tracker = MockTransactionFeeTracker(
+            "fake_api_key", config={"backfill": {"chunk_size": 1000}}
+        )
+        monkeypatch.setattr(transaction_fee_tracker, "get_eth_prices", get_eth_prices)
+        transaction_fee_tracker.set_request_responses(
+            [
+                {"result": 100},
+                {
+                    "result": [
+                        {
+                            "gasPrice": 10**9,
+                            "gasUsed": 10**9,
+                            "hash": HASH_2.upper(),
+                            "timeStamp": 1620250931,
+                            "blockNumber": 50,
+                        }
+                    ]
+                },
+            ]
+        )
+        await transaction_fee_tracker.startup_polling()
+        assert transaction_fee_tracker._num_api_calls == 2
+        assert transaction_fee_tracker._latest_block_seen == 100
+        assert transaction_fee_tracker.get_transaction_fee(HASH_2) == 4
+
+    @pytest.mark.asyncio
+    async def test_startup_polling_resumes_from_checkpoint(self, monkeypatch, tmp_path):
+        async def get_eth_prices(start_time, end_time):
+            return [(1620259200000, 4.0)]
+
+        checkpoint_path = str(tmp_path / "checkpoint.json")
+        pool_checkpoint_path = str(tmp_path / "checkpoint_usdc_eth_005.json")
+        snapshot_path = str(tmp_path / "fees.snapshot")
+        BackfillCheckpoint(pool_checkpoint_path, 0, 0, [(0, 49)]).save()
+        fee_store = InMemoryFeeStore(snapshot_path=snapshot_path)
+        fee_store.put_many([(hash_to_key(HASH_2), 10**18, 49, 1620250931)])
+        fee_store.persist(49)
+        transaction_fee_tracker = MockTransactionFeeTracker(
+            "fake_api_key",
+            config={
+                "store": {"snapshot_path": snapshot_path},
+                "backfill": {"chunk_size": 1000, "checkpoint_path": checkpoint_path},
+            },
+        )
+        monkeypatch.setattr(transaction_fee_tracker, "get_eth_prices", get_eth_prices)
+        requested_block_ranges = []
+
+        async def get_historical_transactions(
+            up_until_block=None, start_block=None, pool=None
+        ):
+            requested_block_ranges.append((start_block, up_until_block))
+            return []
+
+        monkeypatch.setattr(
+            transaction_fee_tracker,
+            "get_historical_transactions",
+            get_historical_transactions,
+        )
+        transaction_fee_tracker.set_request_responses([{"result": 100}])
+        await transaction_fee_tracker.startup_polling()
+
+        assert requested_block_ranges == [(50, 100)]
+        checkpoint = BackfillCheckpoint.load(pool_checkpoint_path)
+        assert checkpoint.completed_ranges == [(0, 100)]
+        assert checkpoint.latest_block_seen == 100
+        assert transaction_fee_tracker.get_transaction_fee(HASH_2) == 4
+
+    @pytest.mark.asyncio
+    async def test_startup_polling_backfills_new_pool(self, monkeypatch, tmp_path):
+        async def get_eth_prices(start_time, end_time):
+            return [(1620259200000, 4.0)]
+
+        checkpoint_path = str(tmp_path / "checkpoint.json")
+        snapshot_path = str(tmp_path / "fees.snapshot")
+        # Pool a was the only pool and was backfilled up to block 100, at the unsuffixed checkpoint path of
+        # older versions. Pool b was added to the config since
+        BackfillCheckpoint(checkpoint_path, 0, 100, [(0, 100)]).save()
+        fee_store = InMemoryFeeStore(snapshot_path=snapshot_path)
+        fee_store.put_many([(hash_to_key(HASH_2), 10**18, 49, 1620250931)])
+        fee_store.persist(100)
+        transaction_fee_tracker = MockTransactionFeeTracker(
+            "fake_api_key",
+            config={
+                "pools": [
+                    {"name": "a", "address": "0xpoola", "token_address": "0xtoken"},
+                    {
+                        "name": "b",
+                        "address": "0xpoolb",
+                        "token_address": "0xtoken",
+                        "start_block": 20,
+                    },
+                ],
+                "store": {"snapshot_path": snapshot_path},
+                "backfill": {"chunk_size": 1000, "checkpoint_path": checkpoint_path},
+            },
+        )
+        assert transaction_fee_tracker._latest_block_seen == 100
+        monkeypatch.setattr(transaction_fee_tracker, "get_eth_prices", get_eth_prices)
+        requested_block_ranges = []
+
+        async def get_historical_transactions(
+            up_until_block=None, start_block=None, pool=None
+        ):
+            requested_block_ranges.append((pool.name, start_block, up_until_block))
+            return []
+
+        monkeypatch.setattr(
+            transaction_fee_tracker,
+            "get_historical_transactions",
+            get_historical_transactions,
+        )
+        transaction_fee_tracker.set_request_responses([{"result": 150}])
+        await transaction_fee_tracker.startup_polling()
+
+        assert sorted(requested_block_ranges) == [("a", 101, 150), ("b", 20, 150)]
+        assert not os.path.exists(checkpoint_path)
+        checkpoint = BackfillCheckpoint.load(str(tmp_path / "checkpoint_a.json"))
+        assert checkpoint.completed_ranges == [(0, 150)]
+        checkpoint = BackfillCheckpoint.load(str(tmp_path / "checkpoint_b.json"))
+        assert checkpoint.completed_ranges == [(20, 150)]
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("backend", ["memory", "sqlite"])
+    async def test_startup_polling_without_checkpoint_resumes_from_store(
+        self, monkeypatch, tmp_path, backend
+    ):
+        async def get_eth_prices(start_time, end_time):
+            return [(1620259200000, 4.0)]
+
+        store_config = {
+            "backend": backend,
+            "path": str(tmp_path / "fees.sqlite"),
+            "snapshot_path": str(tmp_path / "fees.snapshot"),
+        }
+        requested_block_ranges = []
+
+        async def get_historical_transactions(
+            up_until_block=None, start_block=None, pool=None
+        ):
+            requested_block_ranges.append((start_block, up_until_block))
+            return []
+
+        for latest_block in (100, 150):
+            transaction_fee_tracker = MockTransactionFeeTracker(
+                "fake_api_key",
+                config={"store": store_config, "backfill": {"chunk_size": 1000}},
+            )
+            monkeypatch.setattr(
+                transaction_fee_tracker, "get_eth_prices", get_eth_prices
+            )
+            monkeypatch.setattr(
+                transaction_fee_tracker,
+                "get_historical_transactions",
+                get_historical_transactions,
+            )
+            transaction_fee_tracker.set_request_responses([{"result": latest_block}])
+            await transaction_fee_tracker.startup_polling()
+            await transaction_fee_tracker.close()
+        # The restart only fetches the blocks since the last block persisted
+        assert requested_block_ranges == [(0, 100), (100, 150)]
+
+    @pytest.mark.asyncio
+    async def test_startup_polling_retries_failed_ranges(self, monkeypatch):
+        async def get_eth_prices(start_time, end_time):
+            return [(1620259200000, 4.0)]
+
+        transaction_fee_tracker = MockTransactionFeeTracker(
+            "fake_api_key",
+            config={
+                "backfill": {"chunk_size": 50, "max_retries": 1, "retry_backoff": 0}
+            },
+        )
+        monkeypatch.setattr(transaction_fee_tracker, "get_eth_prices", get_eth_prices)
+        fail = True
+        requested_block_ranges = []
+
+        async def get_historical_transactions(
+            up_until_block=None, start_block=None, pool=None
+        ):
+            requested_block_ranges.append((start_block, up_until_block))
+            if start_block == 50 and fail:
+                return
+            return []
+
+        monkeypatch.setattr(
+            transaction_fee_tracker,
+            "get_historical_transactions",
+            get_historical_transactions,
+        )
+        transaction_fee_tracker.set_request_responses([{"result": 149}])
+        await transaction_fee_tracker.startup_polling()
+
+        assert transaction_fee_tracker._latest_block_seen == 149
+        assert transaction_fee_tracker._failed_ranges == {"usdc_eth_005": [(50, 99)]}
+        assert transaction_fee_tracker._get_durable_block() == 49
+
+        fail = False
+        requested_block_ranges.clear()
+        await transaction_fee_tracker.retry_failed_ranges()
+        assert requested_block_ranges == [(50, 99)]
+        assert transaction_fee_tracker._failed_ranges == {}
+        assert transaction_fee_tracker._get_durable_block() == 149
+
+    @pytest.mark.asyncio
+    async def test_startup_polling_cancels_backfills_when_prices_fail(
+        self, monkeypatch
+    ):
+        async def get_eth_prices(start_time, end_time):
+            raise Exception("Unable to get ETH prices")
+
+        transaction_fee_tracker = MockTransactionFeeTracker(
+            "fake_api_key",
+            config={
+                "backfill": {"chunk_size": 1000},
+                "prices": {"max_retries": 1, "retry_backoff": 0},
+            },
+        )
+        monkeypatch.setattr(transaction_fee_tracker, "get_eth_prices", get_eth_prices)
+        cancelled = []
+
+        async def get_historical_transactions(
+            up_until_block=None, start_block=None, pool=None
+        ):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(start_block)
+                raise
+
+        monkeypatch.setattr(
+            transaction_fee_tracker,
+            "get_historical_transactions",
+            get_historical_transactions,
+        )
+        transaction_fee_tracker.set_request_responses([{"result": 100}])
+        with pytest.raises(Exception, match="Unable to get ETH prices"):
+            await asyncio.wait_for(transaction_fee_tracker.startup_polling(), 1)
+        assert cancelled == [0]
+
+    def test_get_price_windows(self):
+        transaction_fee_tracker = MockTransactionFeeTracker("fake_api_key")
+        start_time = datetime.datetime(2021, 5, 1)
+        windows = transaction_fee_tracker._get_price_windows(
+            start_time, start_time + datetime.timedelta(minutes=2500)
+        )
+        assert windows == [
+            (start_time, start_time + datetime.timedelta(minutes=999)),
+            (
+                start_time + datetime.timedelta(minutes=1000),
+                start_time + datetime.timedelta(minutes=1999),
+            ),
+            (
+                start_time + datetime.timedelta(minutes=2000),
+                start_time + datetime.timedelta(minutes=2500),
+            ),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_load_eth_prices(self):
+        transaction_fee_tracker = MockTransactionFeeTracker("fake_api_key")
+        start_time = datetime.datetime(2021, 5, 1)
+        start_ms = int(start_time.timestamp() * 1000)
+        transaction_fee_tracker.set_request_responses(
+            [
+                [[start_ms + i * 60000, str(i)] for i in range(window, window + 1000)]
+                for window in (0, 1000, 2000)
+            ]
+        )
+        await transaction_fee_tracker.load_eth_prices(
+            start_time, start_time + datetime.timedelta(minutes=2999)
+        )
+        assert transaction_fee_tracker._num_api_calls == 3
+        assert len(transaction_fee_tracker._price_table) == 3000
+        assert transaction_fee_tracker._price_table.price_at(start_ms // 1000 + 90) == 2
+        assert transaction_fee_tracker._latest_price == 2999
+
+        requested_start_times = []
+
+        async def get_eth_prices(start_time, end_time):
+            requested_start_times.append(start_time)
+            return [(start_ms + 2999 * 60000, 3000.5), (start_ms + 3000 * 60000, 5.0)]
+
+        transaction_fee_tracker.get_eth_prices = get_eth_prices
+        await transaction_fee_tracker.poll_eth_prices()
+        # Every window from the last candle up to now, fetched concurrently
+        assert min(requested_start_times) == start_time + datetime.timedelta(
+            minutes=2999
+        )
+        assert len(requested_start_times) == len(set(requested_start_times))
+        assert len(transaction_fee_tracker._price_table) == 3001
+        assert (
+            transaction_fee_tracker._price_table.price_at(start_ms // 1000 + 2999 * 60)
+            == 3000.5
+        )
+        assert transaction_fee_tracker._latest_price == 5
+
+    @pytest.mark.asyncio
+    async def test_load_eth_prices_cancels_windows_on_failure(self):
+        transaction_fee_tracker = MockTransactionFeeTracker(
+            "fake_api_key",
+            config={"prices": {"concurrency": 4, "max_retries": 0}},
+        )
+        start_time = datetime.datetime(2021, 5, 1)
+        cancelled = []
+
+        async def get_eth_prices(window_start_time, window_end_time):
+            if window_start_time == start_time:
+                raise Exception("Unable to get ETH prices")
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(window_start_time)
+                raise
+
+        transaction_fee_tracker.get_eth_prices = get_eth_prices
+        with pytest.raises(Exception, match="Unable to get ETH prices"):
+            await asyncio.wait_for(
+                transaction_fee_tracker.load_eth_prices(
+                    start_time, start_time + datetime.timedelta(minutes=9999)
+                ),
+                1,
+            )
+        # The windows in flight are cancelled, and the queued ones (10 windows in all) are never fetched
+        assert 0 < len(cancelled) <= 4
+        await asyncio.sleep(0.01)
+        assert 0 < len(cancelled) <= 4
+        assert len(transaction_fee_tracker._price_table) == 0
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("max_retries", [1, 2])
+    async def test_load_eth_prices_retries_failed_windows(self, max_retries):
+        transaction_fee_tracker = MockTransactionFeeTracker(
+            "fake_api_key",
+            config={"prices": {"max_retries": max_retries, "retry_backoff": 0}},
+        )
+        start_time = datetime.datetime(2021, 5, 1)
+        start_ms = int(start_time.timestamp() * 1000)
+        transaction_fee_tracker.set_request_responses(
+            [
+                None,
+                {"code": -1003, "msg": "Too many requests"},
+                [[start_ms + i * 60000, str(i)] for i in range(10)],
+            ]
+        )
+        load = transaction_fee_tracker.load_eth_prices(
+            start_time, start_time + datetime.timedelta(minutes=9)
+        )
+        if max_retries == 1:
+            with pytest.raises(Exception, match="Unable to get ETH prices"):
+                await load
+            assert transaction_fee_tracker._num_api_calls == 2
+            assert len(transaction_fee_tracker._price_table) == 0
+            return
+        await load
+        assert transaction_fee_tracker._num_api_calls == 3
+        assert len(transaction_fee_tracker._price_table) == 10
+
+    @pytest.mark.asyncio
+    async def test_load_eth_prices_from_kline_cache(self, tmp_path):
+        config = {"prices": {"interval": "1d", "cache_dir": str(tmp_path)}}
+        start_time = datetime.datetime(2021, 5, 1)
+        start_ms = int(start_time.timestamp() * 1000)
+        day_ms = 86400000
+        transaction_fee_tracker = MockTransactionFeeTracker(
+            "fake_api_key", config=config
+        )
+        transaction_fee_tracker.set_request_responses(
+            [[[start_ms + i * day_ms, str(i)] for i in range(3)]]
+        )
+        await transaction_fee_tracker.load_eth_prices(
+            start_time, start_time + datetime.timedelta(days=2)
+        )
+        assert transaction_fee_tracker._num_api_calls == 1
+
+        transaction_fee_tracker = MockTransactionFeeTracker(
+            "fake_api_key", config=config
+        )
+        assert len(transaction_fee_tracker._price_table) == 3
+        assert transaction_fee_tracker._latest_price == 2
+        assert transaction_fee_tracker._get_eth_prices_start_time() == (
+            start_time + datetime.timedelta(days=2)
+        )
+
+    def test_load_checkpoint_discarded_for_empty_fee_store(self, tmp_path):
+        checkpoint_path = str(tmp_path / "checkpoint.json")
+        BackfillCheckpoint(
+            str(tmp_path / "checkpoint_usdc_eth_005.json"), 0, 0, [(0, 49)]
+        ).save()
+        transaction_fee_tracker = MockTransactionFeeTracker(
+            "fake_api_key",
+            config={
+                "store": {"snapshot_path": str(tmp_path / "fees.snapshot")},
+                "backfill": {"checkpoint_path": checkpoint_path},
+            },
+        )
+        checkpoint = transaction_fee_tracker._load_checkpoint(0)
+        assert checkpoint.completed_ranges == []
+
+    @pytest.mark.asyncio
+    async def test_lookup_transaction_fee_lazy(self):
+        transaction_fee_tracker = MockTransactionFeeTracker(
+            "fake_api_key", config={"lazy": {"enabled": True, "cache_size": 10}}
+        )
+        transaction_fee_tracker.set_request_responses(
+            [
+                {
+                    "result": {
+                        "blockNumber": hex(100),
+                        "gasUsed": hex(10**9),
+                        "effectiveGasPrice": hex(10**9),
+                        "logs": [
+                            {"address": "0x88e6a0c2ddd26feeb64f039a2c41296fcb3f5640"}
+                        ],
+                    }
+                },
+                {"result": {"timestamp": hex(1620250931)}},
+                [[1620259200000, "4"]],
+            ]
+        )
+        txn_fees = await asyncio.gather(
+            *[
+                transaction_fee_tracker.lookup_transaction_fee(HASH_2.upper())
+                for _ in range(3)
+            ]
+        )
+        assert txn_fees == [4, 4, 4]
+        assert transaction_fee_tracker._num_api_calls == 3
+        assert await transaction_fee_tracker.lookup_transaction_fee(HASH_2) == 4
+        assert transaction_fee_tracker._num_api_calls == 3
+
+    @pytest.mark.asyncio
+    async def test_lookup_transaction_fee_lazy_not_in_pool(self):
+        transaction_fee_tracker = MockTransactionFeeTracker(
+            "fake_api_key", config={"lazy": {"enabled": True}}
+        )
+        transaction_fee_tracker.set_request_responses(
+            [
+                {
+                    "result": {
+                        "blockNumber": hex(100),
+                        "gasUsed": hex(10**9),
+                        "effectiveGasPrice": hex(10**9),
+                        "logs": [{"address": "0x1234"}],
+                    }
+                },
+                {"result": None},
+            ]
+        )
+        assert await transaction_fee_tracker.lookup_transaction_fee(HASH_2) is None
+        assert await transaction_fee_tracker.lookup_transaction_fee(HASH_2) is None
+        assert transaction_fee_tracker._num_api_calls == 1
+        assert transaction_fee_tracker._negative_cache.hits == 1
+
+        # Unknown transactions may still be mined, so they are only cached until new blocks are seen
+        assert await transaction_fee_tracker.lookup_transaction_fee(HASH_1) is None
+        assert transaction_fee_tracker._num_api_calls == 2
+        assert await transaction_fee_tracker.lookup_transaction_fee(HASH_1) is None
+        assert transaction_fee_tracker._num_api_calls == 2
+        transaction_fee_tracker._latest_block_seen = 1
+        transaction_fee_tracker.set_request_responses(
+            transaction_fee_tracker._responses + [{"result": None}]
+        )
+        assert await transaction_fee_tracker.lookup_transaction_fee(HASH_1) is None
+        assert transaction_fee_tracker._num_api_calls == 3
+        assert await transaction_fee_tracker.lookup_transaction_fee(HASH_2) is None
+        assert transaction_fee_tracker._num_api_calls == 3
+
+    @pytest.mark.asyncio
+    async def test_lookup_transaction_fee_lazy_error_payloads(self):
+        transaction_fee_tracker = MockTransactionFeeTracker(
+            "fake_api_key", config={"lazy": {"enabled": True}}
+        )
+        receipt = {
+            "result": {
+                "blockNumber": hex(100),
+                "gasUsed": hex(10**9),
+                "effectiveGasPrice": hex(10**9),
+                "logs": [{"address": "0x88e6a0c2ddd26feeb64f039a2c41296fcb3f5640"}],
+            }
+        }
+        transaction_fee_tracker.set_request_responses(
+            [
+                {"status": "0", "message": "NOTOK", "result": "Max rate limit reached"},
+                receipt,
+                {"result": {"timestamp": hex(1620250931)}},
+                {"code": -1003, "msg": "Too many requests"},
+                receipt,
+                {"result": {"timestamp": hex(1620250931)}},
+                None,
+                receipt,
+                {"result": {"timestamp": hex(1620250931)}},
+                [[1620259200000, "4"]],
+            ]
+        )
+        # Failed fetches are neither cached nor negative cached, so every lookup goes upstream again
+        for num_api_calls in (1, 4, 7):
+            assert await transaction_fee_tracker.lookup_transaction_fee(HASH_2) is None
+            assert transaction_fee_tracker._num_api_calls == num_api_calls
+            assert len(transaction_fee_tracker._negative_cache) == 0
+            assert len(transaction_fee_tracker._lazy_cache) == 0
+        assert await transaction_fee_tracker.lookup_transaction_fee(HASH_2) == 4
+        assert transaction_fee_tracker._num_api_calls == 10
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("txn_hash", ["", "0x", "0x1", HASH_1[:-1]])
+    async def test_lookup_transaction_fee_lazy_truncated_hash(self, txn_hash):
+        transaction_fee_tracker = MockTransactionFeeTracker(
+            "fake_api_key", config={"lazy": {"enabled": True}}
+        )
+        assert await transaction_fee_tracker.lookup_transaction_fee(txn_hash) is None
+        assert transaction_fee_tracker._num_api_calls == 0
+        assert len(transaction_fee_tracker._negative_cache) == 0
+
+    @pytest.mark.asyncio
+    async def test_lookup_transaction_fee_not_lazy(self):
+        transaction_fee_tracker = MockTransactionFeeTracker("fake_api_key")
+        assert await transaction_fee_tracker.lookup_transaction_fee(HASH_2) is None
+        assert transaction_fee_tracker._num_api_calls == 0
+
+    @pytest.mark.asyncio
+    async def test_get_transaction_fee_negative_cache(self):
+        transaction_fee_tracker = MockTransactionFeeTracker("fake_api_key")
+        transaction_fee_tracker._latest_price_last_updated = (
+            datetime.datetime.fromtimestamp(1709049600)
+        )
+        transaction_fee_tracker._latest_price = 1
+        transaction_fee_tracker._latest_block_seen = 100
+        assert transaction_fee_tracker.get_transaction_fee(HASH_1) is None
+        assert transaction_fee_tracker.get_transaction_fee(HASH_1) is None
+        assert transaction_fee_tracker._negative_cache.hits == 1
+        assert transaction_fee_tracker._negative_cache.misses == 1
+
+        transaction_fee_tracker.set_request_responses(
+            [
+                {"result": 101},
+                {
+                    "result": [
+                        {
+                            "gasPrice": 100,
+                            "gasUsed": 10**18,
+                            "hash": HASH_1,
+                            "timeStamp": 1620250931,
+                        }
+                    ]
+                },
+            ]
+        )
+        await transaction_fee_tracker.poll_transactions()
+        assert len(transaction_fee_tracker._negative_cache) == 0
+        assert transaction_fee_tracker.get_transaction_fee(HASH_1) == 100
@@ -0,0 +1,78 @@
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from src.metrics import MetricsRegistry
+from src.upstream import UpstreamClient
+
+
+class TestUpstreamClient:
+
+    @pytest.mark.asyncio
+    async def test_get_json_before_start(self):
+        upstream = UpstreamClient("test", "http://localhost")
+        with pytest.raises(RuntimeError):
+            await upstream.get_json({})
+
+    @pytest.mark.asyncio
+    async def test_get_json_reuses_session(self):
+        async def handler(req: web.Request):
+            return web.json_response({"result": req.query.get("value")})
+
+        web_app = web.Application()
+        web_app.add_routes([web.get("/api", handler)])
+        async with TestServer(web_app) as server:
+            upstream = UpstreamClient(
+                "test", str(server.make_url("/api")), {"limit_per_host": 2}
+            )
+            await upstream.start()
+            session = upstream._session
+            assert await upstream.get_json({"value": "1"}) == {"result": "1"}
+            assert await upstream.get_json({"value": "2"}) == {"result": "2"}
+            assert upstream._session is session
+            await upstream.close()
+            assert not upstream.started
+
+    @pytest.mark.asyncio
+    async def test_iter_content(self):
+        body = b'{"result": [' + b",".join([b'{"a": 1}'] * 1000) + b"]}"
+
+        async def handler(req: web.Request):
+            return web.Response(body=body, content_type="application/json")
+
+        web_app = web.Application()
+        web_app.add_routes([web.get("/api", handler)])
+        async with TestServer(web_app) as server:
+            upstream = UpstreamClient("test", str(server.make_url("/api")))
+            await upstream.start()
+            chunks = [chunk async for chunk in upstream.iter_content({}, 1024)]
+            assert max(len(chunk) for chunk in chunks) <= 1024
+            assert b"".join(chunks) == body
+            await upstream.close()
+
+    @pytest.mark.asyncio
+    async def test_metrics(self):
+        async def handler(req: web.Request):
+            if req.query.get("fail"):
+                return web.json_response({}, status=500)
+            return web.json_response({"result": 1})
+
+        web_app = web.Application()
+        web_app.add_routes([web.get("/api", handler)])
+        async with TestServer(web_app) as server:
+            metrics = MetricsRegistry()
+            upstream = UpstreamClient(
+                "test",
+                str(server.make_url("/api")),
+                {"rate_limit": 50, "burst": 1},
+                metrics=metrics,
+            )
+            await upstream.start()
+            await upstream.get_json({})
+            await upstream.get_json({"fail": "1"})
+            await upstream.close()
+            host = server.make_url("/api").host
+        lines = set(metrics.render().splitlines())
+        assert f'txfee_upstream_request_seconds_count{{host="{host}"}} 2' in lines
+        assert f'txfee_upstream_errors_total{{host="{host}"}} 1' in lines
+        assert f'txfee_upstream_rate_limit_waits_total{{host="{host}"}} 1' in lines